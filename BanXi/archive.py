@@ -0,0 +1,167 @@
+"""
+已完成记录归档
+
+已完成的任务和已兑换的奖励在完成超过 ARCHIVE_AFTER_DAYS 天后，从 tasks / rewards
+移动到 tasks_archive / rewards_archive。每批只移动 ARCHIVE_BATCH_SIZE 行并单独提交，
+写锁只持有很短的时间，可以放在后台定期执行；界面刷新读取的表始终只有近期的数据。
+
+归档后的记录保留原来的ID，可以通过 get_archived_tasks / get_archived_rewards 分页查看。
+分库布局下定时任务逐个打开每个用户库归档，不只是当前用户的。
+"""
+
+import time
+
+import db
+
+ARCHIVE_AFTER_DAYS = 30  # 完成多少天后归档
+ARCHIVE_BATCH_SIZE = 500  # 每批移动的行数
+ARCHIVE_PAUSE = 0.01  # 批与批之间让出写锁的时间（秒）
+
+# 可归档的表：原表 -> (归档表, 移动的列)
+ARCHIVE_TABLES = {
+    "tasks": ("tasks_archive", "id, user_id, name, xp_reward, platinum_reward, created_at"),
+    "rewards": ("rewards_archive", "id, user_id, name, price, currency_type, created_at"),
+}
+
+
+def _archive_batch(conn, table, cutoff, batch_size):
+    """移动一批完成时间早于 cutoff 的记录，返回移动的行数"""
+    archive_table, columns = ARCHIVE_TABLES[table]
+    # 旧数据没有记录完成时间，按创建时间计算
+    ids = [row[0] for row in conn.execute(f"""
+        SELECT id FROM {table}
+        WHERE completed=1 AND COALESCE(completed_at, created_at) < ?
+        ORDER BY id LIMIT ?
+    """, (cutoff, batch_size))]
+    if not ids:
+        return 0
+
+    placeholders = ",".join("?" * len(ids))
+    conn.execute(f"""
+        INSERT OR REPLACE INTO {archive_table}({columns}, completed_at)
+        SELECT {columns}, COALESCE(completed_at, created_at) FROM {table} WHERE id IN ({placeholders})
+    """, ids)
+    conn.execute(f"DELETE FROM {table} WHERE id IN ({placeholders})", ids)
+    return len(ids)
+
+
+def archive_completed(older_than_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE, progress=None,
+                      conn=None):
+    """
+    分批归档已完成的任务和已兑换的奖励
+
+    参数:
+        older_than_days (float): 完成超过多少天的记录才归档
+        batch_size (int): 每批移动的行数，每批单独提交
+        progress (callable, optional): 每批之后调用 progress(表名, 已移动行数)，返回 False 时停止
+        conn (sqlite3.Connection, optional): 要归档的库的连接，默认为当前线程的长连接；
+            传入的连接由调用方关闭
+
+    返回:
+        dict: 每个表移动的行数
+    """
+    pooled = conn is None
+    if pooled:
+        conn = db.get_db_connection()
+    cutoff = conn.execute("SELECT datetime('now', ?)", (f"{-older_than_days} days",)).fetchone()[0]
+    moved = {table: 0 for table in ARCHIVE_TABLES}
+    try:
+        for table in ARCHIVE_TABLES:
+            while True:
+                count = _archive_batch(conn, table, cutoff, batch_size)
+                conn.commit()
+                moved[table] += count
+                if count < batch_size:
+                    break
+                if progress is not None and progress(table, moved[table]) is False:
+                    return moved
+                time.sleep(ARCHIVE_PAUSE)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if pooled:
+            conn.close()
+    return moved
+
+
+def run_scheduled_archive():
+    """定时任务调用：归档到期的记录，有移动时打印数量"""
+    if db.SHARD_DIR is None:
+        moved = archive_completed()
+    else:
+        # 公共库中没有任务和奖励，逐个打开用户库归档，不影响连接池 ATTACH 的当前用户
+        import shards
+        moved = {table: 0 for table in ARCHIVE_TABLES}
+        for path in shards.list_shard_files().values():
+            conn = shards.connect(path)
+            try:
+                for table, count in archive_completed(conn=conn).items():
+                    moved[table] += count
+            finally:
+                conn.close()
+    if any(moved.values()):
+        print(f"已归档 {moved['tasks']} 个已完成任务、{moved['rewards']} 个已兑换奖励")
+    return moved
+
+
+def _fetch_archived(table, columns, user_id, before=None, limit=db.PAGE_SIZE):
+    """按ID从新到旧分页读取归档记录，返回 (行, 下一页的游标)"""
+    query = f"SELECT {columns} FROM {table} WHERE user_id=?"
+    params = [user_id]
+    if before is not None:
+        query += " AND id<?"
+        params.append(before)
+    query += " ORDER BY id DESC LIMIT ?"
+    params.append(limit + 1)
+
+    conn = db.get_db_connection()
+    rows = conn.execute(query, params).fetchall()
+    conn.close()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, rows[-1]["id"]
+
+
+def get_archived_tasks(user_id, before=None, limit=db.PAGE_SIZE):
+    """
+    分页获取已归档的任务，最新的在前
+
+    参数:
+        user_id (int): 用户ID
+        before (int, optional): 上一页返回的游标
+        limit (int): 每页条数
+
+    返回:
+        tuple: (任务列表, 下一页的游标)，每项为 (id, name, xp_reward, platinum_reward, completed_at)
+    """
+    return _fetch_archived("tasks_archive", "id, name, xp_reward, platinum_reward, completed_at",
+                           user_id, before, limit)
+
+
+def get_archived_rewards(user_id, before=None, limit=db.PAGE_SIZE):
+    """
+    分页获取已归档的奖励，最新的在前
+
+    返回:
+        tuple: (奖励列表, 下一页的游标)，每项为 (id, name, price, currency_type, completed_at)
+    """
+    return _fetch_archived("rewards_archive", "id, name, price, currency_type, completed_at",
+                           user_id, before, limit)
+
+
+def get_archive_counts(user_id):
+    """
+    获取某个用户已归档的任务数和奖励数
+
+    返回:
+        dict: tasks / rewards 的数量
+    """
+    conn = db.get_db_connection()
+    counts = {
+        table: conn.execute(f"SELECT COUNT(*) FROM {archive_table} WHERE user_id=?", (user_id,)).fetchone()[0]
+        for table, (archive_table, _) in ARCHIVE_TABLES.items()
+    }
+    conn.close()
+    return counts
@@ -0,0 +1,246 @@
+"""
+在线备份与恢复
+
+使用 SQLite 的备份接口（sqlite3.Connection.backup）在程序运行时复制数据库：
+每次只复制 BACKUP_PAGES 页，步骤之间让出数据库锁，其他连接的读写不会被长时间阻塞。
+备份先写入临时文件，完成后再改名为正式文件名，目录中只会出现完整的备份；
+超过 KEEP_BACKUPS 份的旧备份会被删除。
+
+恢复时先把备份复制到数据库旁边的临时文件并校验，再关闭连接池，用 os.replace 一次替换数据库文件。
+其他线程（例如维护线程）还打开着数据库时不替换，界面在恢复前先暂停维护并等它交还连接；
+分库布局下公共库和各用户库的备份不是同一时刻的快照，不支持恢复。
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+import db
+
+BACKUP_DIR_NAME = "backups"  # 备份目录，位于数据库文件所在目录下
+BACKUP_PAGES = 256  # 每一步复制的页数
+BACKUP_SLEEP = 0.005  # 每一步之间让出锁的时间（秒）
+KEEP_BACKUPS = 10  # 保留的备份数量
+BACKUP_INTERVAL = 6 * 60 * 60  # 定时备份的间隔（秒）
+
+# 备份和恢复不能同时进行：恢复会替换备份正在读取的文件
+_backup_lock = threading.RLock()
+
+
+def get_backup_dir():
+    """返回当前数据库对应的备份目录"""
+    return os.path.join(os.path.dirname(os.path.abspath(db.DB_FILE)), BACKUP_DIR_NAME)
+
+
+def _backup_prefix(source_file=None):
+    """备份文件名前缀，取数据库文件名（不含扩展名）"""
+    return os.path.splitext(os.path.basename(source_file or db.DB_FILE))[0] + "-"
+
+
+def list_backups(backup_dir=None, source_file=None):
+    """
+    列出已有的备份，最新的在前
+
+    参数:
+        source_file (str, optional): 列出哪个数据库文件的备份，默认为 DB_FILE
+
+    返回:
+        list: 备份文件的完整路径
+    """
+    backup_dir = backup_dir or get_backup_dir()
+    if not os.path.isdir(backup_dir):
+        return []
+    prefix = _backup_prefix(source_file)
+    names = [name for name in os.listdir(backup_dir)
+             if name.startswith(prefix) and name.endswith(".db")]
+    # 文件名中的时间戳按字典序即按时间排序
+    return [os.path.join(backup_dir, name) for name in sorted(names, reverse=True)]
+
+
+def rotate_backups(backup_dir=None, keep=KEEP_BACKUPS, source_file=None):
+    """
+    删除超出保留数量的旧备份
+
+    返回:
+        list: 被删除的文件路径
+    """
+    removed = []
+    for path in list_backups(backup_dir, source_file)[keep:]:
+        try:
+            os.remove(path)
+            removed.append(path)
+        except OSError as e:
+            print(f"删除旧备份失败: {path} ({e})")
+    return removed
+
+
+def _copy_database(source, dest_path, pages, progress):
+    """用备份接口把 source 连接的数据库分步复制到 dest_path，返回总页数"""
+    state = {"total": 0}
+
+    def on_step(status, remaining, total):
+        state["total"] = total
+        if progress is not None:
+            progress(total - remaining, total)
+        time.sleep(BACKUP_SLEEP)
+
+    dest = sqlite3.connect(dest_path)
+    try:
+        source.backup(dest, pages=pages, progress=on_step)
+        # 复制结果沿用源库的 WAL 标记，改回普通日志模式，让备份是一个独立的文件
+        dest.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        dest.close()
+    return state["total"]
+
+
+def _unique_backup_path(backup_dir, source_file=None):
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    prefix = _backup_prefix(source_file)
+    path = os.path.join(backup_dir, f"{prefix}{stamp}.db")
+    n = 1
+    while os.path.exists(path):
+        path = os.path.join(backup_dir, f"{prefix}{stamp}-{n}.db")
+        n += 1
+    return path
+
+
+def create_backup(backup_dir=None, pages=BACKUP_PAGES, progress=None, keep=KEEP_BACKUPS, source_file=None):
+    """
+    在线备份当前数据库
+
+    参数:
+        backup_dir (str, optional): 备份目录，默认为数据库旁边的 backups 目录
+        pages (int): 每一步复制的页数
+        progress (callable, optional): 进度回调 progress(已复制页数, 总页数)
+        keep (int): 保留的备份数量
+        source_file (str, optional): 要备份的数据库文件，默认为 DB_FILE（分库布局下可传入用户库）
+
+    返回:
+        dict: 操作结果，成功时包含备份路径和页数
+    """
+    source_file = source_file or db.DB_FILE
+    if not os.path.exists(source_file):
+        return {"success": False, "reason": "database_not_found"}
+
+    backup_dir = backup_dir or get_backup_dir()
+    os.makedirs(backup_dir, exist_ok=True)
+
+    with _backup_lock:
+        path = _unique_backup_path(backup_dir, source_file)
+        tmp_path = path + ".tmp"
+        # 单独的连接作为备份源，不占用也不受连接池影响
+        source = sqlite3.connect(source_file)
+        try:
+            # 在源连接上保持一个读事务：WAL 模式下各步骤读取同一个快照，
+            # 其他连接在步骤之间的写入不会让备份从头开始，也不会被备份阻塞
+            source.execute("BEGIN")
+            source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            total = _copy_database(source, tmp_path, pages, progress)
+            os.replace(tmp_path, path)
+        except (sqlite3.Error, OSError) as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return {"success": False, "reason": f"backup_error: {e}"}
+        finally:
+            source.close()
+
+    removed = rotate_backups(backup_dir, keep, source_file)
+    return {"success": True, "path": path, "pages": total, "removed": removed}
+
+
+def backup_due(backup_dir=None, interval=BACKUP_INTERVAL):
+    """距离最近一次备份是否已超过 interval 秒（没有备份时也返回True）"""
+    backups = list_backups(backup_dir)
+    if not backups:
+        return True
+    return time.time() - os.path.getmtime(backups[0]) >= interval
+
+
+def run_scheduled_backup(backup_dir=None, interval=BACKUP_INTERVAL):
+    """
+    定时任务调用：到期才备份
+
+    返回:
+        dict: create_backup 的结果，未到期返回None
+    """
+    if db.is_memory_database():
+        return None  # 内存数据库只在退出时按 flush_to 写回，不做定时备份
+    if not backup_due(backup_dir, interval):
+        return None
+    res = create_backup(backup_dir)
+    if res["success"]:
+        print(f"已自动备份数据库: {res['path']}")
+    else:
+        print(f"自动备份失败: {res['reason']}")
+    if db.SHARD_DIR is not None:
+        # 分库布局下每个用户库单独备份，各自保留 KEEP_BACKUPS 份
+        import shards
+        for path in shards.list_shard_files().values():
+            shard_res = create_backup(backup_dir, source_file=path)
+            if not shard_res["success"]:
+                print(f"自动备份失败: {path} {shard_res['reason']}")
+    return res
+
+
+def restore_backup(path, pages=BACKUP_PAGES, progress=None):
+    """
+    用备份替换当前数据库
+
+    替换前会先备份一次当前数据库；备份文件校验不通过、开启了分库布局，
+    或者其他线程还打开着数据库时不做任何改动
+
+    参数:
+        path (str): 备份文件路径
+        pages (int): 每一步复制的页数
+        progress (callable, optional): 进度回调 progress(已复制页数, 总页数)
+
+    返回:
+        dict: 操作结果，成功时包含替换前的备份路径
+    """
+    if not os.path.exists(path):
+        return {"success": False, "reason": "backup_not_found"}
+    if db.is_memory_database():
+        return {"success": False, "reason": "memory_database"}
+    if db.SHARD_DIR is not None:
+        return {"success": False, "reason": "shards_enabled"}
+
+    with _backup_lock:
+        # 复制到数据库所在目录，保证 os.replace 在同一文件系统内原子完成
+        tmp_path = db.DB_FILE + ".restore"
+        try:
+            source = sqlite3.connect(path)
+            try:
+                ok = source.execute("PRAGMA quick_check").fetchone()[0] == "ok"
+                if ok:
+                    _copy_database(source, tmp_path, pages, progress)
+            finally:
+                source.close()
+        except sqlite3.Error as e:
+            ok = False
+            print(f"读取备份失败: {e}")
+        if not ok:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return {"success": False, "reason": "invalid_backup"}
+
+        # 替换前保留一份当前数据（要在复制之后做，轮换可能删掉正在恢复的旧备份）
+        safety = create_backup() if os.path.exists(db.DB_FILE) else None
+        if safety is not None and not safety["success"]:
+            os.remove(tmp_path)
+            return {"success": False, "reason": safety["reason"]}
+
+        # 关闭连接池后旧文件的 WAL 已写回主文件，残留的附属文件不能留给新文件；
+        # 其他线程还开着旧文件时不能替换（见 db.close_db_connections）
+        if db.close_db_connections():
+            os.remove(tmp_path)
+            return {"success": False, "reason": "database_busy"}
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(db.DB_FILE + suffix):
+                os.remove(db.DB_FILE + suffix)
+        os.replace(tmp_path, db.DB_FILE)
+
+    # 备份可能来自旧版本，补齐迁移
+    db.init_db(storage="file")
+    return {"success": True, "previous_backup": safety["path"] if safety else None}
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+列表查询索引基准测试脚本
+在临时数据库中写入 10 万级数据，对比有无 migrations.MANAGED_INDEXES 时的查询计划和耗时
+
+用法: python bench_indexes.py [行数]
+      BANXI_STORAGE=memory python bench_indexes.py [行数]  # 在内存数据库中运行，排除磁盘的影响
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import db
+import migrations
+
+# 被测查询：(名称, SQL)，参数统一为 (user_id,)
+QUERIES = [
+    ("get_tasks",
+     "SELECT id, name, xp_reward, platinum_reward, completed FROM tasks WHERE user_id=? ORDER BY completed, id"),
+    ("get_rewards",
+     "SELECT id, name, price, currency_type, completed FROM rewards WHERE user_id=? ORDER BY completed, id"),
+    ("get_repeat_tasks",
+     "SELECT id, name, xp_reward, platinum_reward, max_completions, current_completions, completed "
+     "FROM repeat_tasks WHERE user_id=? ORDER BY completed, id"),
+    ("get_user_gacha_records",
+     "SELECT gr.draw_time, gi.name, gi.star, gi.description FROM gacha_records gr "
+     "JOIN gacha_items gi ON gr.item_id = gi.id WHERE gr.user_id=? ORDER BY gr.id DESC LIMIT 20"),
+]
+
+
+def populate(conn, rows, users=20):
+    """按表写入 rows 行测试数据，数据平均分布在 users 个用户上"""
+    rnd = random.Random(42)
+    user_ids = list(range(1, users + 1))
+    conn.executemany("INSERT OR IGNORE INTO users(id, name) VALUES(?, ?)",
+                     [(uid, f"bench{uid}") for uid in user_ids])
+    conn.executemany(
+        "INSERT INTO tasks(user_id, name, xp_reward, completed) VALUES(?,?,?,?)",
+        ((rnd.choice(user_ids), f"任务{i}", 50, rnd.random() < 0.9) for i in range(rows)))
+    conn.executemany(
+        "INSERT INTO rewards(user_id, name, price, completed) VALUES(?,?,?,?)",
+        ((rnd.choice(user_ids), f"奖励{i}", 100, rnd.random() < 0.9) for i in range(rows)))
+    conn.executemany(
+        "INSERT INTO repeat_tasks(user_id, name, xp_reward, max_completions, completed) VALUES(?,?,?,?,?)",
+        ((rnd.choice(user_ids), f"重复{i}", 50, 0, rnd.random() < 0.5) for i in range(rows)))
+    item_ids = [row[0] for row in conn.execute("SELECT id FROM gacha_items")]
+    conn.executemany(
+        "INSERT INTO gacha_records(user_id, item_id) VALUES(?,?)",
+        ((rnd.choice(user_ids), rnd.choice(item_ids)) for _ in range(rows)))
+    conn.commit()
+
+
+def drop_managed_indexes(conn):
+    for name, _table, _sql in migrations.MANAGED_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    conn.commit()
+
+
+def run_queries(conn, label, repeat=20):
+    """打印每个查询的执行计划和平均耗时"""
+    print(f"--- {label} ---")
+    for name, sql in QUERIES:
+        plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, (1,))]
+        start = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute(sql, (1,)).fetchall()
+        elapsed = (time.perf_counter() - start) / repeat * 1000
+        uses_temp_btree = any("TEMP B-TREE" in step for step in plan)
+        print(f"{name:<24} {elapsed:8.2f} ms  temp b-tree: {'是' if uses_temp_btree else '否'}")
+        for step in plan:
+            print(f"    {step}")
+    print()
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 120000
+    workdir = tempfile.mkdtemp(prefix="banxi_bench_")
+    db.DB_FILE = os.path.join(workdir, "bench.db")
+
+    db.init_db()
+
+    conn = db.get_db_connection()
+    print(f"写入测试数据：每张表 {rows} 行 ...")
+    populate(conn, rows)
+    conn.execute("ANALYZE")
+
+    drop_managed_indexes(conn)
+    run_queries(conn, "无索引")
+
+    migrations.create_indexes(conn)
+    conn.commit()
+    conn.execute("ANALYZE")
+    run_queries(conn, "MANAGED_INDEXES")
+
+    db.close_db_connections()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+"""pytest 配置：每个测试结束后清理 testing.py 创建的临时数据库和临时目录"""
+
+import pytest
+
+import testing
+
+
+@pytest.fixture(autouse=True)
+def _clean_temp_database():
+    yield
+    testing.cleanup()
@@ -1,146 +1,552 @@
 import atexit
-import random
 import sqlite3
 import os
+import threading
+from collections import namedtuple
 from datetime import time
 
+import ledger
+import reward_engine
+
 DB_FILE = "data.db"
 
+# 存储配置：每个新连接都会按此执行 PRAGMA，可通过 configure_storage() 调整
+DEFAULT_STORAGE_PROFILE = {
+    "journal_mode": "WAL",        # 读写互不阻塞，提交时只追加 WAL
+    "synchronous": "NORMAL",      # WAL 模式下只在检查点时 fsync
+    "busy_timeout": 5000,         # 遇到写锁时最多等待 5 秒（毫秒）
+    "cache_size": -16000,         # 页缓存约 16MB（负数表示 KiB）
+    "mmap_size": 64 * 1024 * 1024,  # 64MB 内存映射读取
+    "temp_store": "MEMORY",       # 临时表和排序使用内存
+}
+STORAGE_PROFILE = dict(DEFAULT_STORAGE_PROFILE)
+# 分库布局下公共库和用户库改用回滚日志：同时写两个文件的事务（如改余额同时记账）
+# 由 SQLite 的 super-journal 保证一起提交或一起回滚，WAL 模式下只能保证各自文件内的原子性
+SHARD_STORAGE_OVERRIDES = {
+    "journal_mode": "DELETE",
+    "synchronous": "FULL",        # 回滚日志模式下 NORMAL 断电时可能损坏数据库
+}
+OPTIMIZE_ON_CLOSE = True  # 关闭连接前执行 PRAGMA optimize
+
+# 按用户分库（见 shards.py）：每个用户一个文件所在的目录，None 表示所有用户共用 DB_FILE
+SHARD_DIR = None
+SHARD_SCHEMA = "shard"  # 当前用户的文件 ATTACH 时使用的库名
+_shard_state = {"user_id": None}
+
+# 内存数据库（见 use_memory_database）：DB_FILE 为 memdb 的 URI，本进程的所有连接共享同一个库
+MEMORY_URI_PREFIX = "file:/banxi-memory-"
+_memory_state = {"keeper": None, "db_file": None, "flush_to": None, "previous": None, "count": 0}
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    连接池中的长连接
 
-def get_db_connection():
+    调用方沿用"取连接 → 执行 → close()"的写法即可：close() 只会回滚
+    未提交的事务并把连接留给当前线程复用，真正的关闭由 close_db_connections() 完成，
+    而且只由创建连接的线程执行（见 close_db_connections）
+
+    事务中对用户数据的修改先暂存在连接上，commit() 成功后才写入用户快照缓存，
+    rollback() 时直接丢弃
     """
-    获取数据库连接，确保线程安全
 
-    返回:
-        sqlite3.Connection: 数据库连接对象
+    staged_users = None  # user_id -> UserSnapshot，None 表示用户已删除
+    data_version = None  # 上次检查时的 PRAGMA data_version
+    shard_user = None  # 分库布局下当前 ATTACH 的用户库
+    pool_data_version = None  # 奖池缓存上次检查时的 PRAGMA data_version（见 gacha_pool.py）
+    owner = None  # 创建并使用这个连接的线程
+
+    def commit(self):
+        # 提交和发布快照放在同一把锁里，保证缓存中的快照按提交顺序更新
+        with _user_cache_lock:
+            super().commit()
+            staged, self.staged_users = self.staged_users, None
+            if staged:
+                for user_id, snapshot in staged.items():
+                    if snapshot is None:
+                        _user_cache.pop(user_id, None)
+                    else:
+                        _user_cache[user_id] = snapshot
+
+    def rollback(self):
+        self.staged_users = None
+        super().rollback()
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def close_for_real(self):
+        if self.in_transaction:
+            self.rollback()
+        super().close()
+
+
+CONNECTION_FACTORY = PooledConnection  # 开启 profiler 统计时替换为 profiler.ProfiledConnection
+
+
+# 用户快照缓存：user_id -> UserSnapshot
+# 本进程的写入在提交时直接更新缓存；其他进程改动数据库文件时通过 PRAGMA data_version 发现并清空
+class UserSnapshot(namedtuple("UserSnapshot", "id name xp level coins platinum_coins")):
+    """不可变的用户数据快照，可以像元组一样解包，也可以像 sqlite3.Row 一样按列名取值"""
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return getattr(self, key)
+        return super().__getitem__(key)
+
+    def keys(self):
+        return list(self._fields)
+
+
+_user_cache = {}
+_user_cache_lock = threading.RLock()
+_user_cache_state = {"db_file": None, "complete": False}  # complete: 缓存中是否是全部用户
+
+
+def invalidate_user_cache():
+    """清空用户快照缓存，下次读取时重新查询数据库"""
+    with _user_cache_lock:
+        _user_cache.clear()
+        _user_cache_state["complete"] = False
+
+
+def _check_user_cache(conn):
+    """
+    读取缓存前检查数据库是否被其他连接改动过
+
+    PRAGMA data_version 只在其他连接（包括其他进程）提交后变化，本连接自己的提交不会改变它；
+    新连接第一次检查时无法得知之前的变化，同样清空缓存
+    """
+    version = conn.execute("PRAGMA data_version").fetchone()[0]
+    with _user_cache_lock:
+        if _user_cache_state["db_file"] != DB_FILE:
+            _user_cache_state["db_file"] = DB_FILE
+            invalidate_user_cache()
+        elif conn.data_version != version:
+            invalidate_user_cache()
+        conn.data_version = version
+
+
+def _stage_user(conn, user_id, snapshot):
+    """在连接上暂存用户快照，提交后写入缓存（非连接池连接直接忽略）"""
+    if isinstance(conn, PooledConnection):
+        if conn.staged_users is None:
+            conn.staged_users = {}
+        conn.staged_users[user_id] = snapshot
+
+
+# 连接池：每个线程持有一个长连接，所有连接登记在 _pool_connections 中以便退出时统一关闭
+# 其他线程的连接在 close_db_connections() 之后移到 _stale_connections，由所属线程下次取连接时关闭
+# 按线程ID而不是 threading.local 记录：Qt 线程池的线程每次回调 Python 都是新的线程状态，
+# threading.local 中的数据在任务之间会丢失
+_pool_threads = {}  # 线程ID -> (连接池代数, DB_FILE, 连接)
+_pool_lock = threading.Lock()
+_pool_connections = []
+_stale_connections = []
+_pool_generation = 0
+
+
+def storage_profile():
+    """当前布局下新连接使用的存储配置：STORAGE_PROFILE，分库布局下再叠加 SHARD_STORAGE_OVERRIDES"""
+    if SHARD_DIR is None:
+        return STORAGE_PROFILE
+    return {**STORAGE_PROFILE, **SHARD_STORAGE_OVERRIDES}
+
+
+def apply_storage_profile(conn, profile=None):
+    """
+    按存储配置对连接执行 PRAGMA
+
+    参数:
+        conn (sqlite3.Connection): 数据库连接
+        profile (dict, optional): 存储配置，默认使用 storage_profile()
+    """
+    profile = storage_profile() if profile is None else profile
+    for pragma, value in profile.items():
+        if value is None:
+            continue
+        conn.execute(f"PRAGMA {pragma}={value}").fetchall()
+
+
+def configure_storage(**overrides):
+    """
+    调整存储配置并让之后的连接使用新配置
+
+    例如 configure_storage(synchronous="FULL", mmap_size=0)；
+    传入 None 表示不设置该 PRAGMA，保留 SQLite 默认值
     """
-    conn = sqlite3.connect(DB_FILE)
+    unknown = set(overrides) - set(DEFAULT_STORAGE_PROFILE)
+    if unknown:
+        raise ValueError(f"未知的存储配置项: {', '.join(sorted(unknown))}")
+    STORAGE_PROFILE.update(overrides)
+    close_db_connections()
+
+
+def _open_connection():
+    """创建一个新的长连接，连接级别的设置只在这里执行一次"""
+    # check_same_thread=False 仅用于退出时（或所属线程已结束后）由其他线程关闭，日常使用仍是一线程一连接
+    conn = sqlite3.connect(DB_FILE, factory=CONNECTION_FACTORY, check_same_thread=False,
+                           uri=is_memory_database())
     conn.row_factory = sqlite3.Row  # 启用行工厂，支持字典式访问
+    apply_storage_profile(conn)
+    # 外键约束按连接开启：删除用户时由 ON DELETE CASCADE 删除其所有数据
+    conn.execute("PRAGMA foreign_keys=ON")
+    # 预热：读取一次 schema，让后续查询直接命中已解析的表结构和页缓存
+    conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
     return conn
 
 
-def init_db():
+def get_db_connection():
     """
-    初始化数据库及所有表结构
+    获取当前线程的数据库长连接
 
-    创建用户表、任务表、商店表，并初始化默认用户
+    每个线程第一次调用时创建连接，之后一直复用同一个连接；
+    连接在 DB_FILE 变化或 close_db_connections() 之后由本线程关闭并重建
 
     返回:
-        bool: 是否是新创建的数据库文件
+        PooledConnection: 数据库连接对象
     """
-    created = not os.path.exists(DB_FILE)
-    conn = get_db_connection()
-    c = conn.cursor()
+    cached = _pool_threads.get(threading.get_ident())
+    if cached is not None:
+        generation, db_file, conn = cached
+        if generation == _pool_generation and db_file == DB_FILE:
+            _sync_shard(conn)
+            return conn
+        # DB_FILE 被切换或连接池已关闭，旧连接不再使用
+        _release(conn)
+
+    conn = _open_connection()
+    conn.owner = threading.current_thread()
+    with _pool_lock:
+        _pool_connections.append(conn)
+        _pool_threads[threading.get_ident()] = (_pool_generation, DB_FILE, conn)
+    _sync_shard(conn)
+    return conn
 
-    # 用户表：存储用户基本信息
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS users(
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT UNIQUE,           -- 用户名，唯一
-        xp INTEGER DEFAULT 0,       -- 经验值
-        level INTEGER DEFAULT 1,    -- 等级
-        coins INTEGER DEFAULT 0,    -- 金币数量
-        platinum_coins INTEGER DEFAULT 0  -- 铂金币数量
-    )
-    """)
-
-    # 任务表：存储单次任务信息
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS tasks(
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER,            -- 关联用户ID
-        name TEXT,                  -- 任务名称
-        xp_reward INTEGER,          -- 经验奖励
-        platinum_reward INTEGER DEFAULT 0,  -- 铂金币奖励
-        completed INTEGER DEFAULT 0,-- 完成状态：0未完成，1已完成
-        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY(user_id) REFERENCES users(id)
-    )
-    """)
-
-    # 商店表：存储可兑换奖励
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS rewards(
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER,            -- 关联用户ID
-        name TEXT,                  -- 奖励名称
-        price INTEGER,              -- 所需金币/铂金币
-        currency_type TEXT DEFAULT 'coins',  -- 货币类型：'coins'(金币) 或 'platinum'(铂金币)
-        completed INTEGER DEFAULT 0,-- 兑换状态：0未兑换，1已兑换
-        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY(user_id) REFERENCES users(id)
-    )
-    """)
 
-    conn.commit()
+def use_user_shard(user_id):
+    """
+    分库布局下切换当前用户：之后各线程取连接时把该用户的文件 ATTACH 上去
+
+    要与数据库操作按顺序执行（界面中交给 db_worker），切换之前排队的操作仍使用原来的用户库
+    """
+    _shard_state["user_id"] = user_id
+
+
+def get_active_shard():
+    """分库布局下当前使用的用户ID"""
+    return _shard_state["user_id"]
+
+
+def _sync_shard(conn):
+    """让连接 ATTACH 的用户库与当前用户一致；事务进行中不能 DETACH，留到下次取连接时再切换"""
+    target = _shard_state["user_id"] if SHARD_DIR is not None else None
+    if conn.shard_user == target or conn.in_transaction:
+        return
+    if conn.shard_user is not None:
+        try:
+            conn.execute(f"DETACH DATABASE {SHARD_SCHEMA}")
+        except sqlite3.OperationalError:
+            return  # 还有没读完的查询占用着用户库
+        conn.shard_user = None
+    if target is not None:
+        import shards
+        shards.attach(conn, target)
+        conn.shard_user = target
+
+
+def check_shard_user(conn, user_id):
+    """
+    分库布局下确认连接 ATTACH 的是该用户的用户库，否则账本等用户库的写入会落到其他用户的文件中
 
-    # 迁移：为现有用户添加 platinum_coins 列（如果不存在）
+    参数:
+        conn (sqlite3.Connection): 要写入的连接
+        user_id (int): 被修改的用户ID
+
+    异常:
+        ValueError: 分库布局下该用户不是连接当前使用的用户，要先 use_user_shard() 切换
+    """
+    if SHARD_DIR is not None and conn.shard_user != user_id:
+        raise ValueError(f"分库布局下只能修改当前用户的数据（当前 {conn.shard_user}，要修改 {user_id}），"
+                         "请先 use_user_shard() 切换用户")
+
+
+def _close_connection(conn):
     try:
-        c.execute("SELECT platinum_coins FROM users LIMIT 1")
-    except sqlite3.OperationalError:
-        # 列不存在，需要添加
-        c.execute("ALTER TABLE users ADD COLUMN platinum_coins INTEGER DEFAULT 0")
-        conn.commit()
-        print("已添加 platinum_coins 列到 users 表")
+        if conn.in_transaction:
+            conn.rollback()
+        if OPTIMIZE_ON_CLOSE:
+            conn.execute("PRAGMA optimize")
+        conn.close_for_real()
+    except sqlite3.Error:
+        pass
+
+
+def _release(conn):
+    """把连接从连接池中移除并关闭（由所属线程调用）"""
+    with _pool_lock:
+        for registry in (_pool_connections, _stale_connections):
+            if conn in registry:
+                registry.remove(conn)
+    _close_connection(conn)
 
-    # 迁移：为现有任务添加 platinum_reward 列（如果不存在）
+
+def release_thread_connection():
+    """关闭当前线程的长连接，下次 get_db_connection() 时重新创建；后台线程空闲前调用，交还文件句柄"""
+    with _pool_lock:
+        cached = _pool_threads.pop(threading.get_ident(), None)
+    if cached is not None:
+        _release(cached[2])
+
+
+def close_db_connections():
+    """
+    关闭连接池中所有线程的连接
+
+    连接只能由所属线程关闭：当前线程和已结束线程的连接立即关闭，
+    其他线程的连接标记为失效，由该线程下一次调用 get_db_connection() 时关闭并重建，
+    不会在它执行到一半时被回滚。之后再调用 get_db_connection() 都会得到新的连接
+
+    删除或替换数据库文件之前调用，并确认返回 0：其他线程还打开着旧文件时，
+    它们关闭连接时会按文件名清理 WAL，可能删掉新文件的 WAL
+
+    返回:
+        int: 其他线程中还没有关闭的连接数
+    """
+    global _pool_generation
+    current = threading.current_thread()
+    with _pool_lock:
+        _pool_generation += 1
+        _stale_connections.extend(_pool_connections)
+        _pool_connections.clear()
+        closing = [conn for conn in _stale_connections if conn.owner is current or not conn.owner.is_alive()]
+        for conn in closing:
+            _stale_connections.remove(conn)
+            if conn.owner is not current:
+                _pool_threads.pop(conn.owner.ident, None)
+        remaining = len(_stale_connections)
+
+    for conn in closing:
+        _close_connection(conn)
+
+    # 数据库文件可能随后被删除或替换
+    invalidate_user_cache()
+    return remaining
+
+
+def _close_all_connections():
+    """程序退出时关闭所有连接，此时各后台线程已经结束"""
+    close_db_connections()
+    with _pool_lock:
+        connections = list(_stale_connections)
+        _stale_connections.clear()
+    for conn in connections:
+        _close_connection(conn)
+
+
+atexit.register(_close_all_connections)
+
+
+def is_memory_database():
+    """DB_FILE 是否指向内存数据库"""
+    return DB_FILE.startswith(MEMORY_URI_PREFIX)
+
+
+def use_memory_database(seed=None, flush_to=None):
+    """
+    让 DB_FILE 指向一个新的内存数据库，之前的内存数据库（如果有）被丢弃
+
+    内存数据库由一个常驻连接保持，连接池关闭重建时数据不会丢失；
+    测试、演示和基准测试在内存中运行，不读写磁盘上的 data.db，每次都从同样的初始状态开始
+
+    参数:
+        seed (str, optional): 用备份 API 把该数据库文件的内容复制进来，文件不存在时忽略
+        flush_to (str, optional): 程序退出或切换到其他数据库时把内容写回该文件
+
+    返回:
+        str: 内存数据库的 URI
+    """
+    global DB_FILE
+    close_memory_database()
+    _memory_state["count"] += 1
+    uri = f"{MEMORY_URI_PREFIX}{os.getpid()}-{_memory_state['count']}?vfs=memdb"
+    keeper = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    if seed and os.path.exists(seed):
+        _load_seed(keeper, seed)
+    _memory_state.update(keeper=keeper, db_file=uri, flush_to=flush_to, previous=DB_FILE)
+    DB_FILE = uri
+    return uri
+
+
+def _load_seed(keeper, path):
+    """用备份 API 把数据库文件的内容复制进内存数据库"""
+    source = sqlite3.connect(path)
     try:
-        c.execute("SELECT platinum_reward FROM tasks LIMIT 1")
-    except sqlite3.OperationalError:
-        c.execute("ALTER TABLE tasks ADD COLUMN platinum_reward INTEGER DEFAULT 0")
-        conn.commit()
-        print("已添加 platinum_reward 列到 tasks 表")
+        image = bytearray(source.serialize())
+    finally:
+        source.close()
+    if not image:
+        return
+    # 文件头第 18、19 字节为 2 表示 WAL 模式，memdb 不支持 WAL，要改回 1 才能打开；
+    # 先在私有的内存库中改好，再用备份 API 复制到共享的内存数据库
+    image[18:20] = b"\x01\x01"
+    staging = sqlite3.connect(":memory:")
+    try:
+        staging.deserialize(bytes(image))
+        staging.backup(keeper)
+    finally:
+        staging.close()
+
+
+def flush_memory_database(path=None):
+    """
+    用备份 API 把内存数据库的内容写入文件（覆盖原有内容）
+
+    参数:
+        path (str, optional): 目标文件，默认为 use_memory_database() 的 flush_to
 
-    # 迁移：为现有奖励添加 currency_type 列（如果不存在）
+    返回:
+        bool: 是否写入
+    """
+    path = path or _memory_state["flush_to"]
+    keeper = _memory_state["keeper"]
+    if keeper is None or not path:
+        return False
+    dest = sqlite3.connect(path)
     try:
-        c.execute("SELECT currency_type FROM rewards LIMIT 1")
-    except sqlite3.OperationalError:
-        c.execute("ALTER TABLE rewards ADD COLUMN currency_type TEXT DEFAULT 'coins'")
-        conn.commit()
-        print("已添加 currency_type 列到 rewards 表")
-
-    # 初始化默认用户
-    for uname in ["玖", "未"]:
-        c.execute("SELECT id FROM users WHERE name=?", (uname,))
-        if c.fetchone() is None:
-            c.execute("INSERT INTO users(name, xp, level, coins, platinum_coins) VALUES(?,?,?,?,?)",
-                      (uname, 0, 1, 0, 0))
-    conn.commit()
+        keeper.backup(dest)
+    finally:
+        dest.close()
+    return True
+
+
+def close_memory_database(flush=True):
+    """
+    丢弃当前的内存数据库，flush 为 True 且设置了 flush_to 时先写回文件
+
+    DB_FILE 仍指向该内存数据库时恢复为 use_memory_database() 之前的值
+    """
+    global DB_FILE
+    keeper = _memory_state["keeper"]
+    if keeper is None:
+        return
+    if DB_FILE == _memory_state["db_file"]:
+        close_db_connections()
+        DB_FILE = _memory_state["previous"]
+    if flush and _memory_state["flush_to"]:
+        flush_memory_database()
+        print(f"内存数据库已写回: {_memory_state['flush_to']}")
+    keeper.close()
+    _memory_state.update(keeper=None, db_file=None, flush_to=None, previous=None)
+
+
+atexit.register(close_memory_database)
+
+
+def init_db(storage=None, seed=None, flush_to=None):
+    """
+    初始化数据库及所有表结构
+
+    执行 migrations 中尚未应用的迁移：创建所有表和索引，并初始化默认用户、
+    默认重复任务和默认奖池
+
+    参数:
+        storage (str, optional): "file" 使用 DB_FILE 指向的文件，"memory" 改用新的内存数据库；
+            默认读取环境变量 BANXI_STORAGE，未设置时为 "file"。DB_FILE 已是内存数据库时直接使用
+        seed (str, optional): 内存数据库的初始内容，默认读取环境变量 BANXI_MEMORY_SEED
+        flush_to (str, optional): 退出时把内存数据库写回的文件，默认读取环境变量 BANXI_MEMORY_FLUSH
+
+    返回:
+        bool: 是否是新创建的数据库文件
+    """
+    storage = storage or os.environ.get("BANXI_STORAGE") or "file"
+    if storage not in ("file", "memory"):
+        raise ValueError(f"未知的存储方式: {storage}")
+    if SHARD_DIR is not None:
+        # 分库布局由 shards.enable() 创建和升级
+        return not os.path.exists(DB_FILE)
+    if storage == "memory" and not is_memory_database():
+        use_memory_database(seed or os.environ.get("BANXI_MEMORY_SEED"),
+                            flush_to or os.environ.get("BANXI_MEMORY_FLUSH"))
+
+    created = not is_memory_database() and not os.path.exists(DB_FILE)
+    conn = get_db_connection()
+    if is_memory_database():
+        created = conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == 0
+    if created:
+        # 删除数据后可以用 incremental_vacuum() 把空闲页还给文件系统；
+        # 连接已切换到 WAL，要 VACUUM 一次才生效（此时还是空库，很快）
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+
+    # 表结构由迁移统一维护，已是最新版本时只读取一次 user_version
+    from migrations import migrate
+    if migrate(conn):
+        invalidate_user_cache()
+
     conn.close()
     return created
 
 
 def get_users():
     """
-    获取所有用户信息
+    获取所有用户信息（优先读取用户快照缓存）
 
     返回:
-        list: 包含所有用户数据的列表
+        list: 包含所有用户数据的列表，每项为 UserSnapshot，按ID排序
     """
     conn = get_db_connection()
+    _check_user_cache(conn)
+    with _user_cache_lock:
+        if _user_cache_state["complete"]:
+            return sorted(_user_cache.values())
+
     c = conn.cursor()
-    c.execute("SELECT id, name, xp, level, coins, platinum_coins FROM users")
-    rows = c.fetchall()
+    c.execute("SELECT id, name, xp, level, coins, platinum_coins FROM users ORDER BY id")
+    rows = [UserSnapshot(*row) for row in c.fetchall()]
     conn.close()
+
+    with _user_cache_lock:
+        # 查询期间其他连接有提交时不写入缓存，下次重新查询
+        if conn.data_version == conn.execute("PRAGMA data_version").fetchone()[0]:
+            _user_cache.clear()
+            _user_cache.update((row.id, row) for row in rows)
+            _user_cache_state["complete"] = True
     return rows
 
 
 def get_user(user_id):
     """
-    获取指定用户的信息
+    获取指定用户的信息（优先读取用户快照缓存）
 
     参数:
         user_id (int): 用户ID
 
     返回:
-        sqlite3.Row: 用户数据行，找不到返回None
+        UserSnapshot: 用户数据，找不到返回None
     """
     conn = get_db_connection()
+    _check_user_cache(conn)
+    with _user_cache_lock:
+        snapshot = _user_cache.get(user_id)
+        if snapshot is not None or _user_cache_state["complete"]:
+            return snapshot
+
     c = conn.cursor()
     c.execute("SELECT id, name, xp, level, coins, platinum_coins FROM users WHERE id=?", (user_id,))
     row = c.fetchone()
     conn.close()
-    return row
+    if row is None:
+        return None
+
+    snapshot = UserSnapshot(*row)
+    with _user_cache_lock:
+        if conn.data_version == conn.execute("PRAGMA data_version").fetchone()[0]:
+            _user_cache[user_id] = snapshot
+    return snapshot
 
 
 def update_user(user_id, xp=None, level=None, coins=None, platinum_coins=None):
@@ -174,14 +580,107 @@ def update_user(user_id, xp=None, level=None, coins=None, platinum_coins=None):
         params.append(platinum_coins)
 
     if updates:
+        check_shard_user(conn, user_id)
         params.append(user_id)
-        query = f"UPDATE users SET {', '.join(updates)} WHERE id=?"
-        c.execute(query, params)
+        query = (f"UPDATE users SET {', '.join(updates)} WHERE id=? "
+                 "RETURNING id, name, xp, level, coins, platinum_coins")
+        rows = c.execute(query, params).fetchall()
+        if rows:
+            snapshot = UserSnapshot(*rows[0])
+            ledger.record_adjustment(conn, snapshot)
+            _stage_user(conn, user_id, snapshot)
         conn.commit()
 
     conn.close()
 
 
+# 货币变动：每次变动都是一条带余额守卫的 UPDATE ... RETURNING，不在 Python 中读改写余额
+BALANCE_COLUMNS = (("coins", "coins"), ("platinum", "platinum_coins"))  # (参数名, users 表列名)
+
+
+def change_balance(conn, user_id, coins=0, platinum=0, xp=None, level=None,
+                   reason="adjust", ref_id=None, xp_gained=0):
+    """
+    在一条语句中增减用户余额，并在同一事务中追加账本记录（不提交事务）
+
+    负数表示扣除，扣除的货币带 "余额 >= 扣除额" 的守卫条件，余额不足时整条语句不生效，
+    因此并发的多次扣款不会互相覆盖，也不会扣成负数
+
+    参数:
+        conn (sqlite3.Connection): 数据库连接
+        user_id (int): 用户ID
+        coins (int): 金币变动量
+        platinum (int): 铂金币变动量
+        xp (int, optional): 结算后的经验值（直接写入）
+        level (int, optional): 结算后的等级（直接写入）
+        reason (str): 账本记录的变动原因，见 ledger.REASON_LABELS
+        ref_id (int, optional): 关联的任务、奖励等记录ID
+        xp_gained (int): 本次获得的经验，记入账本
+
+    返回:
+        UserSnapshot: 变动后的用户数据 (id, name, xp, level, coins, platinum_coins)，
+                     用户不存在或余额不足时返回None
+
+    异常:
+        ValueError: 分库布局下修改的不是连接当前使用的用户，见 check_shard_user
+    """
+    deltas = {"coins": coins, "platinum": platinum}
+    updates = []
+    params = []
+    guards = []
+    guard_params = []
+
+    for key, column in BALANCE_COLUMNS:
+        delta = deltas[key]
+        if delta:
+            updates.append(f"{column}={column}+?")
+            params.append(delta)
+        if delta < 0:
+            guards.append(f" AND {column}>=?")
+            guard_params.append(-delta)
+    if xp is not None:
+        updates.append("xp=?")
+        params.append(xp)
+    if level is not None:
+        updates.append("level=?")
+        params.append(level)
+
+    if not updates:
+        row = conn.execute("SELECT id, name, xp, level, coins, platinum_coins FROM users WHERE id=?",
+                           (user_id,)).fetchone()
+        return UserSnapshot(*row) if row is not None else None
+
+    check_shard_user(conn, user_id)
+    query = (f"UPDATE users SET {', '.join(updates)} WHERE id=?{''.join(guards)} "
+             "RETURNING id, name, xp, level, coins, platinum_coins")
+    # 取完全部结果，让语句执行结束后再提交
+    rows = conn.execute(query, params + [user_id] + guard_params).fetchall()
+    if not rows:
+        return None
+
+    snapshot = UserSnapshot(*rows[0])
+    ledger.record(conn, snapshot, reason, ref_id, xp_delta=xp_gained, coins_delta=coins, platinum_delta=platinum)
+
+    # 变动后的数据暂存在连接上，提交后直接更新用户快照缓存
+    _stage_user(conn, user_id, snapshot)
+    return snapshot
+
+
+def balance_failure_reason(conn, user_id, coins=0, platinum=0):
+    """
+    change_balance 返回None时判断失败原因
+
+    返回:
+        str: 'user_not_found'、'not_enough_coins' 或 'not_enough_platinum'
+    """
+    u = conn.execute("SELECT coins, platinum_coins FROM users WHERE id=?", (user_id,)).fetchone()
+    if u is None:
+        return "user_not_found"
+    if coins < 0 and u["coins"] < -coins:
+        return "not_enough_coins"
+    return "not_enough_platinum"
+
+
 def add_task(user_id, name, xp_reward, platinum_reward=0):
     """
     为用户添加新任务
@@ -218,108 +717,191 @@ def get_tasks(user_id):
     return rows
 
 
-def complete_task(task_id):
+PAGE_SIZE = 50  # 列表分页时每页的条数
+
+
+def fetch_page(conn, table, columns, user_id, after=None, limit=PAGE_SIZE):
     """
-    完成任务并发放奖励，处理升级逻辑
+    按 (completed, id) 游标分页读取某个用户的列表
+
+    与 OFFSET 分页不同，下一页从上一页最后一行的位置直接在 (user_id, completed, id) 索引上开始，
+    无论前面已经有多少行，每页的读取量都只有 limit 行
 
     参数:
-        task_id (int): 要完成的任务ID
+        conn (sqlite3.Connection): 数据库连接
+        table (str): 表名，需有 user_id、completed、id 列
+        columns (str): 要读取的列，必须包含 id 和 completed
+        user_id (int): 用户ID
+        after (tuple, optional): 上一页返回的游标 (completed, id)，None 表示第一页
+        limit (int): 每页条数
 
     返回:
-        dict: 包含奖励详情和升级信息的字典，失败返回None
+        tuple: (本页的行, 下一页的游标)，没有更多数据时游标为None
+    """
+    base = f"SELECT {columns} FROM {table} WHERE user_id=?"
+    # 多取一行，用来判断是否还有下一页
+    if after is None:
+        rows = conn.execute(base + " ORDER BY completed, id LIMIT ?", (user_id, limit + 1)).fetchall()
+    else:
+        # 行值比较 (completed, id) > (?, ?) 在索引上只能按 completed 定位，
+        # 拆成"同一状态中 id 更大的行"和"之后的状态"两次索引查找
+        completed, last_id = after
+        rows = conn.execute(base + " AND completed=? AND id>? ORDER BY id LIMIT ?",
+                            (user_id, completed, last_id, limit + 1)).fetchall()
+        if len(rows) <= limit:
+            rows += conn.execute(base + " AND completed>? ORDER BY completed, id LIMIT ?",
+                                 (user_id, completed, limit + 1 - len(rows))).fetchall()
+
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, (rows[-1]["completed"], rows[-1]["id"])
+
+
+def get_tasks_page(user_id, after=None, limit=PAGE_SIZE):
+    """
+    分页获取任务，未完成的在前
+
+    参数:
+        user_id (int): 用户ID
+        after (tuple, optional): 上一页返回的游标
+        limit (int): 每页条数
+
+    返回:
+        tuple: (任务列表, 下一页的游标)，列表每项与 get_tasks 相同
     """
     conn = get_db_connection()
-    c = conn.cursor()
+    page = fetch_page(conn, "tasks", "id, name, xp_reward, platinum_reward, completed", user_id, after, limit)
+    conn.close()
+    return page
 
-    # 查询任务信息
-    c.execute("SELECT user_id, xp_reward, platinum_reward, completed FROM tasks WHERE id=?", (task_id,))
-    t = c.fetchone()
-    if t is None:
-        conn.close()
-        return None
 
-    user_id, xp_reward, task_platinum_reward, completed = t
-    if completed:
-        conn.close()
-        return None
+# 批量语句中每条 IN (...) 最多绑定的参数个数，低于 SQLite 默认的变量数上限
+SQL_CHUNK_SIZE = 500
+
 
-    # 标记任务已完成
-    c.execute("UPDATE tasks SET completed=1 WHERE id=?", (task_id,))
+def _settle_user_rewards(conn, user_id, xp_gained, platinum_bonus, ref_id=None):
+    """
+    为一个用户结算经验并发放升级奖励（不提交事务）
+
+    参数:
+        conn (sqlite3.Connection): 数据库连接
+        user_id (int): 用户ID
+        xp_gained (int): 本次获得的总经验
+        platinum_bonus (int): 任务自带的铂金币奖励，与升级奖励的铂金币一起累加
+        ref_id (int, optional): 记入账本的任务ID（只完成一个任务时）
 
-    # 获取用户当前数据
-    c.execute("SELECT xp, level, coins, platinum_coins FROM users WHERE id=?", (user_id,))
-    u = c.fetchone()
+    返回:
+        dict: reward_engine.apply_xp 的结算结果，另含 platinum_gained（含任务奖励）；
+              用户不存在返回None
+    """
+    u = conn.execute("SELECT xp, level FROM users WHERE id=?", (user_id,)).fetchone()
     if u is None:
-        conn.commit()
-        conn.close()
         return None
 
-    cur_xp, level, coins, platinum_coins = u
-    new_xp = cur_xp + xp_reward
-    old_level = level  # 记录原始等级
-
-    # 添加任务完成时的铂金币奖励
-    platinum_coins += task_platinum_reward
-
-    # 计算升级所需经验
-    xp_needed = get_xp_required_for_level(level)
-    gained_coins = 0
-    gained_platinum = task_platinum_reward  # 初始化为任务奖励的铂金币
-    leveled = 0
-    level_up_rewards = []
-
-    # 处理可能的连续升级
-    while new_xp >= xp_needed:
-        new_xp -= xp_needed
-        level += 1
-        leveled += 1
-
-        # 计算升级金币奖励（带随机性）
-        base_reward = xp_needed
-        min_multiplier = 0.8
-        max_multiplier = 1.5
-        random_multiplier = random.uniform(min_multiplier, max_multiplier)
-        reward = int(base_reward * random_multiplier)
-
-        coins += reward
-        gained_coins += reward
-
-        # 每2级奖励1个铂金币
-        if level % 2 == 0:
-            platinum_coins += 1
-            gained_platinum += 1
-
-        # 记录升级详情
-        level_up_rewards.append({
-            "from_level": level - 1,
-            "to_level": level,
-            "base_reward": base_reward,
-            "random_multiplier": round(random_multiplier, 2),
-            "actual_reward": reward,
-            "platinum_reward": 1 if level % 2 == 0 else 0
-        })
-
-        # 计算下一级所需经验
-        xp_needed = get_xp_required_for_level(level)
-
-    # 更新用户数据
-    c.execute("UPDATE users SET xp=?, level=?, coins=?, platinum_coins=? WHERE id=?",
-              (new_xp, level, coins, platinum_coins, user_id))
-    conn.commit()
-    conn.close()
+    cur_xp, level = u
+    outcome = reward_engine.apply_xp(level, cur_xp, xp_gained)
+    outcome["platinum_gained"] += platinum_bonus
+
+    # 经验和等级直接写入，金币和铂金币在 SQL 中累加
+    change_balance(conn, user_id, coins=outcome["coins_gained"], platinum=outcome["platinum_gained"],
+                   xp=outcome["xp"], level=outcome["level"],
+                   reason="task", ref_id=ref_id, xp_gained=xp_gained)
+    return outcome
+
+
+def complete_tasks(task_ids):
+    """
+    批量完成任务并发放奖励
+
+    所有任务在同一个事务中标记完成，每个用户只做一次升级结算，最后只提交一次。
+    已完成或不存在的任务会被跳过
+
+    参数:
+        task_ids (iterable): 要完成的任务ID
+
+    返回:
+        dict: 汇总结果
+            completed_ids: 本次实际完成的任务ID
+            skipped: 被跳过的任务数量
+            results: 每个用户一项，字段与 complete_task 的返回值相同，另含 task_ids
+    """
+    ids = list(dict.fromkeys(task_ids))  # 去重并保持顺序
+    conn = get_db_connection()
+
+    # user_id -> [任务ID列表, 经验合计, 任务铂金币合计]
+    per_user = {}
+    try:
+        for start in range(0, len(ids), SQL_CHUNK_SIZE):
+            chunk = ids[start:start + SQL_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            # 带状态守卫地标记完成，RETURNING 直接取回奖励信息，省去逐个查询
+            rows = conn.execute(
+                "UPDATE tasks SET completed=1, completed_at=CURRENT_TIMESTAMP "
+                f"WHERE id IN ({placeholders}) AND completed=0 "
+                "RETURNING id, user_id, xp_reward, platinum_reward",
+                chunk).fetchall()
+            for task_id, user_id, xp_reward, platinum_reward in rows:
+                entry = per_user.setdefault(user_id, [[], 0, 0])
+                entry[0].append(task_id)
+                entry[1] += xp_reward or 0
+                entry[2] += platinum_reward or 0
+
+        results = []
+        completed_ids = []
+        for user_id, (user_task_ids, xp_gained, platinum_bonus) in per_user.items():
+            user_task_ids.sort()
+            completed_ids.extend(user_task_ids)
+            ref_id = user_task_ids[0] if len(user_task_ids) == 1 else None
+            outcome = _settle_user_rewards(conn, user_id, xp_gained, platinum_bonus, ref_id)
+            if outcome is None:
+                continue
+            results.append({
+                "user_id": user_id,
+                "task_ids": user_task_ids,
+                "xp": xp_gained,
+                "leveled": outcome["leveled"],
+                "coins_gained": outcome["coins_gained"],
+                "platinum_gained": outcome["platinum_gained"],
+                "new_level": outcome["level"],
+                "new_xp": outcome["xp"],
+                "level_up_details": outcome["level_up_details"],
+                "level_up_details_omitted": outcome["level_up_details_omitted"]
+            })
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
 
     return {
-        "user_id": user_id,
-        "xp": xp_reward,
-        "leveled": leveled,
-        "coins_gained": gained_coins,
-        "platinum_gained": gained_platinum,
-        "new_level": level,
-        "new_xp": new_xp,
-        "level_up_details": level_up_rewards
+        "completed_ids": completed_ids,
+        "skipped": len(ids) - len(completed_ids),
+        "results": results
     }
 
 
+def complete_task(task_id):
+    """
+    完成任务并发放奖励，处理升级逻辑
+
+    参数:
+        task_id (int): 要完成的任务ID
+
+    返回:
+        dict: 包含奖励详情和升级信息的字典，失败返回None
+    """
+    results = complete_tasks([task_id])["results"]
+    if not results:
+        return None
+
+    result = results[0]
+    del result["task_ids"]
+    return result
+
+
 # 商店相关函数
 def add_reward(user_id, name, price, currency_type='coins'):
     """
@@ -375,51 +957,45 @@ def redeem_reward(reward_id):
         conn.close()
         return {"success": False, "reason": "already_redeemed"}
 
-    c.execute("SELECT coins, platinum_coins FROM users WHERE id=?", (user_id,))
-    u = c.fetchone()
+    # 标记为已兑换（带状态守卫，避免同一奖励被重复兑换）
+    c.execute("UPDATE rewards SET completed=1, completed_at=CURRENT_TIMESTAMP WHERE id=? AND completed=0",
+              (reward_id,))
+    if c.rowcount == 0:
+        conn.close()
+        return {"success": False, "reason": "already_redeemed"}
+
+    # 根据货币类型扣除金币或铂金币，余额不足时整体回滚
+    currency_type = 'platinum' if currency_type == 'platinum' else 'coins'
+    cost = {currency_type: -price}
+    u = change_balance(conn, user_id, reason="reward", ref_id=reward_id, **cost)
     if u is None:
+        reason = balance_failure_reason(conn, user_id, **cost)
+        conn.rollback()
         conn.close()
-        return {"success": False, "reason": "user_not_found"}
+        return {"success": False, "reason": reason}
 
-    coins, platinum_coins = u
+    conn.commit()
+    conn.close()
 
-    # 根据货币类型检查余额并扣除
-    if currency_type == 'platinum':
-        if platinum_coins < price:
-            conn.close()
-            return {"success": False, "reason": "not_enough_platinum"}
+    return {
+        "success": True,
+        "currency_type": currency_type,
+        "remaining_coins": u["coins"],
+        "remaining_platinum": u["platinum_coins"]
+    }
 
-        # 扣除铂金币
-        new_platinum = platinum_coins - price
-        c.execute("UPDATE rewards SET completed=1 WHERE id=?", (reward_id,))
-        c.execute("UPDATE users SET platinum_coins=? WHERE id=?", (new_platinum, user_id))
-        conn.commit()
-        conn.close()
 
-        return {
-            "success": True,
-            "currency_type": "platinum",
-            "remaining_platinum": new_platinum,
-            "remaining_coins": coins
-        }
-    else:  # 默认为金币
-        if coins < price:
-            conn.close()
-            return {"success": False, "reason": "not_enough_coins"}
-
-        # 扣除金币
-        new_coins = coins - price
-        c.execute("UPDATE rewards SET completed=1 WHERE id=?", (reward_id,))
-        c.execute("UPDATE users SET coins=? WHERE id=?", (new_coins, user_id))
-        conn.commit()
-        conn.close()
+def get_rewards_page(user_id, after=None, limit=PAGE_SIZE):
+    """
+    分页获取奖励，未兑换的在前
 
-        return {
-            "success": True,
-            "currency_type": "coins",
-            "remaining_coins": new_coins,
-            "remaining_platinum": platinum_coins
-        }
+    返回:
+        tuple: (奖励列表, 下一页的游标)，列表每项与 get_rewards 相同
+    """
+    conn = get_db_connection()
+    page = fetch_page(conn, "rewards", "id, name, price, currency_type, completed", user_id, after, limit)
+    conn.close()
+    return page
 
 
 def delete_reward(reward_id):
@@ -445,8 +1021,9 @@ def add_user(name):
     c = conn.cursor()
     try:
         c.execute("INSERT INTO users(name, xp, level, coins, platinum_coins) VALUES(?,?,?,?,?)", (name, 0, 1, 0, 0))
-        conn.commit()
         uid = c.lastrowid
+        _stage_user(conn, uid, UserSnapshot(uid, name, 0, 1, 0, 0))
+        conn.commit()
         conn.close()
         return {"success": True, "id": uid}
     except sqlite3.IntegrityError:
@@ -455,17 +1032,39 @@ def add_user(name):
 
 
 def delete_user(user_id):
-    """删除用户及其相关数据"""
+    """删除用户及其相关数据（任务、奖励、抽卡记录、账本等由外键级联删除），并归还空出的页"""
     conn = get_db_connection()
     c = conn.cursor()
-    c.execute("DELETE FROM tasks WHERE user_id=?", (user_id,))
     c.execute("DELETE FROM users WHERE id=?", (user_id,))
+    _stage_user(conn, user_id, None)
     conn.commit()
     affected = c.rowcount
+    if affected:
+        incremental_vacuum(conn)
     conn.close()
+    if affected and SHARD_DIR is not None:
+        import shards
+        shards.remove_shard(user_id)
     return affected > 0
 
 
+def incremental_vacuum(conn, pages=None):
+    """
+    把空闲页从数据库文件末尾截掉，数据库需为 auto_vacuum=INCREMENTAL，否则不做任何事
+
+    参数:
+        conn (sqlite3.Connection): 不处于事务中的连接
+        pages (int, optional): 最多归还的页数，默认全部
+
+    返回:
+        int: 归还的页数
+    """
+    before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    # execute() 只会执行一步（归还一页），executescript() 才会执行到底
+    conn.executescript("PRAGMA incremental_vacuum" if pages is None else f"PRAGMA incremental_vacuum({int(pages)})")
+    return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
 def clear_data_file_and_reinit():
     """
     彻底清空数据文件并重新初始化系统
@@ -474,8 +1073,29 @@ def clear_data_file_and_reinit():
     """
     try:
         import gc
+        if is_memory_database():
+            # 内存数据库直接换一个新的，退出时仍写回原来的文件
+            flush_to = _memory_state["flush_to"]
+            close_memory_database(flush=False)
+            use_memory_database(flush_to=flush_to)
+            init_db()
+            print("数据库已成功清空并重新初始化")
+            return True
+
+        # 先关闭连接池中的长连接，释放文件句柄；其他线程还开着旧文件时不能删除
+        if close_db_connections():
+            print("清空数据失败: 其他线程仍在使用数据库")
+            return False
         gc.collect()  # 强制垃圾回收释放资源
 
+        if SHARD_DIR is not None:
+            # 分库布局下 init_db() 不会创建公共库，由 shards.reset() 删除整个目录后重新开启
+            import shards
+            if not shards.reset():
+                return False
+            print("数据库已成功清空并重新初始化")
+            return True
+
         if os.path.exists(DB_FILE):
             try:
                 os.remove(DB_FILE)
@@ -504,13 +1124,16 @@ def clear_data_file_and_reinit():
                     print(f"重命名文件也失败: {rename_error}")
                     return False
 
+        # WAL 模式下的附属文件也一并清理
+        for suffix in ("-wal", "-shm"):
+            try:
+                if os.path.exists(DB_FILE + suffix):
+                    os.remove(DB_FILE + suffix)
+            except OSError:
+                pass
+
         # 重新初始化所有系统
         init_db()
-        from repeat_tasks import init_repeat_tasks
-        from gacha_fixed import init_gacha_system
-
-        init_repeat_tasks()
-        init_gacha_system()
 
         print("数据库已成功清空并重新初始化")
         return True
@@ -538,7 +1161,7 @@ def get_xp_required_for_level(level):
     """
     计算指定等级升级所需经验值
 
-    使用线性增长公式：100 + (等级-1) * 19
+    使用线性增长公式：100 + (等级-1) * 19，具体参数见 reward_engine
 
     参数:
         level (int): 当前等级
@@ -546,7 +1169,7 @@ def get_xp_required_for_level(level):
     返回:
         int: 升级所需经验值
     """
-    return int(100 + ((level - 1) * 19))
+    return reward_engine.xp_required_for_level(level)
 
 
 # 铂金币相关函数
@@ -568,27 +1191,15 @@ def exchange_platinum_to_gold(user_id, platinum_amount):
         return {"success": False, "reason": "invalid_amount"}
 
     conn = get_db_connection()
-    c = conn.cursor()
 
-    c.execute("SELECT coins, platinum_coins FROM users WHERE id=?", (user_id,))
-    u = c.fetchone()
+    # 扣除铂金币和增加金币在同一条语句中完成
+    gold_gained = platinum_amount * PLATINUM_TO_GOLD_RATE
+    u = change_balance(conn, user_id, coins=gold_gained, platinum=-platinum_amount, reason="exchange")
     if u is None:
+        reason = balance_failure_reason(conn, user_id, platinum=-platinum_amount)
         conn.close()
-        return {"success": False, "reason": "user_not_found"}
-
-    coins, platinum_coins = u
-
-    if platinum_coins < platinum_amount:
-        conn.close()
-        return {"success": False, "reason": "not_enough_platinum"}
+        return {"success": False, "reason": reason}
 
-    # 执行兑换
-    new_platinum = platinum_coins - platinum_amount
-    gold_gained = platinum_amount * PLATINUM_TO_GOLD_RATE
-    new_coins = coins + gold_gained
-
-    c.execute("UPDATE users SET coins=?, platinum_coins=? WHERE id=?",
-              (new_coins, new_platinum, user_id))
     conn.commit()
     conn.close()
 
@@ -596,8 +1207,8 @@ def exchange_platinum_to_gold(user_id, platinum_amount):
         "success": True,
         "platinum_spent": platinum_amount,
         "gold_gained": gold_gained,
-        "remaining_platinum": new_platinum,
-        "new_gold": new_coins
+        "remaining_platinum": u["platinum_coins"],
+        "new_gold": u["coins"]
     }
 
 
@@ -616,17 +1227,8 @@ def add_platinum_coins(user_id, amount):
         return False
 
     conn = get_db_connection()
-    c = conn.cursor()
-
-    c.execute("SELECT platinum_coins FROM users WHERE id=?", (user_id,))
-    u = c.fetchone()
-    if u is None:
-        conn.close()
-        return False
-
-    new_platinum = u[0] + amount
-    c.execute("UPDATE users SET platinum_coins=? WHERE id=?", (new_platinum, user_id))
+    u = change_balance(conn, user_id, platinum=amount, reason="platinum_grant")
     conn.commit()
     conn.close()
 
-    return True
\ No newline at end of file
+    return u is not None
@@ -0,0 +1,169 @@
+"""
+后台数据库执行器
+
+界面上的所有数据库操作都通过 submit() 交给一个专用的后台线程执行，
+执行结果再通过 Qt 信号回到界面线程调用回调函数，这样即使磁盘很慢、
+或者其他进程正持有写锁，窗口也不会卡住。
+
+后台只有一个线程：操作按提交顺序依次执行，写入之后提交的刷新一定能读到新数据，
+该线程在 db 连接池中也只占用一个长连接。
+
+备份这类耗时较长、又不需要和界面操作排队的维护任务交给另一个执行器
+get_maintenance_worker()，不会挡住后面的日常操作。
+"""
+
+import traceback
+
+from PySide6 import QtCore
+
+
+class _TaskSignals(QtCore.QObject):
+    finished = QtCore.Signal(object)
+    failed = QtCore.Signal(object)
+
+
+class _DbTask(QtCore.QRunnable):
+    """在后台线程中执行一次函数调用"""
+
+    def __init__(self, func, args, kwargs):
+        super().__init__()
+        self.setAutoDelete(False)  # 由 DbWorker 持有引用，回调执行完后再释放
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = _TaskSignals()
+
+    def run(self):
+        try:
+            result = self.func(*self.args, **self.kwargs)
+        except Exception as e:
+            traceback.print_exc()
+            self.signals.failed.emit(e)
+        else:
+            self.signals.finished.emit(result)
+
+
+class DbWorker(QtCore.QObject):
+    """
+    单线程的数据库任务队列
+
+    信号:
+        busy_changed(bool): 有任务排队或执行时为 True，全部完成后为 False
+        progress(object): 后台任务可以通过 report_progress() 发出进度，在界面线程接收
+    """
+
+    busy_changed = QtCore.Signal(bool)
+    progress = QtCore.Signal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._pool = QtCore.QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+        # 线程不过期：每个新线程都会在连接池中新开一个连接，保持同一个线程即可一直复用
+        self._pool.setExpiryTimeout(-1)
+        self._tasks = set()
+
+    def submit(self, func, *args, on_done=None, on_error=None, **kwargs):
+        """
+        在后台线程中执行 func(*args, **kwargs)
+
+        参数:
+            func (callable): 要执行的数据库操作
+            on_done (callable, optional): 成功时在界面线程中以返回值调用
+            on_error (callable, optional): 抛出异常时在界面线程中以异常对象调用，
+                                           默认只打印错误
+        """
+        task = _DbTask(func, args, kwargs)
+        queued = QtCore.Qt.ConnectionType.QueuedConnection
+        task.signals.finished.connect(lambda result: self._finish(task, on_done, result), queued)
+        task.signals.failed.connect(lambda error: self._finish(task, on_error or self._print_error, error), queued)
+
+        self._tasks.add(task)
+        if len(self._tasks) == 1:
+            self.busy_changed.emit(True)
+        self._pool.start(task)
+
+    def report_progress(self, value):
+        """在后台任务中调用，把进度发送到界面线程的 progress 信号"""
+        self.progress.emit(value)
+
+    def is_busy(self):
+        return bool(self._tasks)
+
+    def wait_for_done(self, msecs=-1):
+        """等待已提交的任务全部执行完，退出程序前调用"""
+        return self._pool.waitForDone(msecs)
+
+    def _finish(self, task, callback, value):
+        self._tasks.discard(task)
+        try:
+            if callback is not None:
+                callback(value)
+        finally:
+            if not self._tasks:
+                self.busy_changed.emit(False)
+
+    @staticmethod
+    def _print_error(error):
+        print(f"数据库操作失败: {error}")
+
+
+_worker = None
+_maintenance_worker = None
+
+
+def get_worker():
+    """返回全局共享的 DbWorker，需在创建 QApplication 之后调用"""
+    global _worker
+    if _worker is None:
+        _worker = DbWorker(QtCore.QCoreApplication.instance())
+    return _worker
+
+
+def get_maintenance_worker():
+    """返回执行备份等维护任务的 DbWorker，与 get_worker() 的队列互不阻塞"""
+    global _maintenance_worker
+    if _maintenance_worker is None:
+        _maintenance_worker = DbWorker(QtCore.QCoreApplication.instance())
+    return _maintenance_worker
+
+
+def submit(func, *args, on_done=None, on_error=None, **kwargs):
+    """把数据库操作交给全局 DbWorker 执行，参数同 DbWorker.submit"""
+    get_worker().submit(func, *args, on_done=on_done, on_error=on_error, **kwargs)
+
+
+def wait_for_done(msecs=-1):
+    """等待全局 DbWorker（包括维护任务）上的任务全部完成"""
+    done = True
+    for worker in (_worker, _maintenance_worker):
+        if worker is not None:
+            done = worker.wait_for_done(msecs) and done
+    return done
+
+
+def load_user_snapshot(user_id, limits=None):
+    """
+    一次读取界面刷新所需的全部数据（在后台线程中执行）
+
+    参数:
+        user_id (int): 用户ID
+        limits (dict, optional): 各列表从头读取的条数，键为 tasks / repeat_tasks / rewards，
+                                 默认各读取一页
+
+    返回:
+        dict: 用户信息、最近的抽卡记录，以及单次任务、重复任务和奖励的 (行, 下一页的游标)
+    """
+    import db
+    from repeat_tasks import get_repeat_tasks_page
+    from gacha_fixed import get_user_gacha_records
+
+    limits = limits or {}
+    return {
+        "user_id": user_id,
+        "user": db.get_user(user_id),
+        "tasks": db.get_tasks_page(user_id, limit=limits.get("tasks", db.PAGE_SIZE)),
+        "repeat_tasks": get_repeat_tasks_page(user_id, limit=limits.get("repeat_tasks", db.PAGE_SIZE)),
+        "rewards": db.get_rewards_page(user_id, limit=limits.get("rewards", db.PAGE_SIZE)),
+        "gacha_records": get_user_gacha_records(user_id, 20),
+    }
@@ -361,6 +361,137 @@ class AddRewardDialog(QtWidgets.QDialog):
             currency_type
         )
 
+
+class HistoryDialog(BaseDialog):
+    """
+    历史记录：分页查看已归档的任务和奖励
+    """
+
+    def __init__(self, user_id, parent=None):
+        super().__init__("历史记录", parent)
+        import archive
+        import db_worker
+
+        self.user_id = user_id
+        self.db_worker = db_worker.get_worker()
+        self.resize(480, 520)
+
+        layout = QtWidgets.QVBoxLayout()
+        self.tabs = QtWidgets.QTabWidget()
+        layout.addWidget(self.tabs)
+
+        # 每个标签页：(列表, 加载更多按钮, 读取函数, 格式化函数, 下一页的游标)
+        self.sections = {}
+        self._add_section("tasks", "已完成任务", archive.get_archived_tasks,
+                          lambda row: f"{row['completed_at']}  {row['name']}  "
+                                      f"{row['xp_reward']} XP" +
+                                      (f" + {row['platinum_reward']} 铂金币" if row['platinum_reward'] else ""))
+        self._add_section("rewards", "已兑换奖励", archive.get_archived_rewards,
+                          lambda row: f"{row['completed_at']}  {row['name']}  {row['price']} "
+                                      f"{'铂金币' if row['currency_type'] == 'platinum' else '金币'}")
+
+        self.close_btn = QtWidgets.QPushButton("关闭")
+        self.close_btn.clicked.connect(self.accept)
+        layout.addWidget(self.close_btn)
+        self.setLayout(layout)
+
+        for name in self.sections:
+            self.load_more(name)
+
+    def _add_section(self, name, title, fetch, fmt):
+        page = QtWidgets.QWidget()
+        page_layout = QtWidgets.QVBoxLayout()
+        list_widget = QtWidgets.QListWidget()
+        more_btn = QtWidgets.QPushButton("加载更多")
+        more_btn.setEnabled(False)
+        more_btn.clicked.connect(lambda: self.load_more(name))
+        page_layout.addWidget(list_widget)
+        page_layout.addWidget(more_btn)
+        page.setLayout(page_layout)
+        self.tabs.addTab(page, title)
+        self.sections[name] = {"list": list_widget, "more": more_btn, "fetch": fetch, "format": fmt,
+                               "cursor": None}
+
+    def load_more(self, name):
+        section = self.sections[name]
+        section["more"].setEnabled(False)
+
+        def done(page):
+            rows, cursor = page
+            for row in rows:
+                section["list"].addItem(section["format"](row))
+            if section["list"].count() == 0:
+                section["list"].addItem("暂无记录")
+            section["cursor"] = cursor
+            section["more"].setEnabled(cursor is not None)
+
+        self.db_worker.submit(section["fetch"], self.user_id, section["cursor"], on_done=done)
+
+    def on_enter_pressed(self):
+        pass
+
+
+class ProfilerDialog(BaseDialog):
+    """
+    性能统计面板：显示 profiler 记录的函数、SQL 语句和事务耗时
+    """
+
+    def __init__(self, parent=None):
+        super().__init__("性能统计", parent)
+        self.setModal(False)
+        self.resize(900, 560)
+
+        layout = QtWidgets.QVBoxLayout()
+        self.report_view = QtWidgets.QPlainTextEdit()
+        self.report_view.setReadOnly(True)
+        self.report_view.setLineWrapMode(QtWidgets.QPlainTextEdit.LineWrapMode.NoWrap)
+        self.report_view.setFont(QtGui.QFontDatabase.systemFont(QtGui.QFontDatabase.SystemFont.FixedFont))
+        layout.addWidget(self.report_view)
+
+        btn_layout = QtWidgets.QHBoxLayout()
+        self.refresh_btn = QtWidgets.QPushButton("刷新")
+        self.reset_btn = QtWidgets.QPushButton("清零")
+        self.export_btn = QtWidgets.QPushButton("导出 JSON")
+        self.close_btn = QtWidgets.QPushButton("关闭")
+        btn_layout.addWidget(self.refresh_btn)
+        btn_layout.addWidget(self.reset_btn)
+        btn_layout.addWidget(self.export_btn)
+        btn_layout.addStretch()
+        btn_layout.addWidget(self.close_btn)
+        layout.addLayout(btn_layout)
+        self.setLayout(layout)
+
+        self.refresh_btn.clicked.connect(self.refresh_report)
+        self.reset_btn.clicked.connect(self.reset_report)
+        self.export_btn.clicked.connect(self.export_report)
+        self.close_btn.clicked.connect(self.accept)
+
+        # 打开期间每秒刷新一次
+        self.refresh_timer = QtCore.QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh_report)
+        self.refresh_timer.start(1000)
+        self.refresh_report()
+
+    def refresh_report(self):
+        import profiler
+        scroll = self.report_view.verticalScrollBar().value()
+        self.report_view.setPlainText(profiler.format_report())
+        self.report_view.verticalScrollBar().setValue(scroll)
+
+    def reset_report(self):
+        import profiler
+        profiler.reset()
+        self.refresh_report()
+
+    def export_report(self):
+        import profiler
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "导出统计", "banxi-profile.json", "JSON (*.json)")
+        if path:
+            profiler.dump(path)
+
+    def on_enter_pressed(self):
+        self.refresh_report()
+
 if __name__ == "__main__":
     import sys
     app = QtWidgets.QApplication(sys.argv)
@@ -1,96 +1,103 @@
 import sqlite3
-import random
-from db import get_db_connection
+from db import get_db_connection, change_balance, balance_failure_reason
+import gacha_pool
+import gacha_sampler
 
 # 概率配置常量
 DEFAULT_RATES = {6: 0.02, 5: 0.08, 4: 0.50, 3: 0.40}  # 各星级基础概率
 DEFAULT_REFUND = {6: 1000, 5: 500, 4: 200, 3: 100}  # 重复奖品返还金币
-
-
-def init_gacha_tables():
+SINGLE_DRAW_COST = 600  # 单抽所需金币
+TEN_DRAW_COST = 6000  # 十连所需金币
+PITY_THRESHOLD = 50  # 连续这么多次未出六星后开始增加六星概率
+PITY_STEP = 0.02  # 之后每次未出六星增加的六星概率
+
+# 默认奖池，新数据库初始化时写入：(名称, 星级, 描述)
+DEFAULT_GACHA_ITEMS = [
+    # 六星物品（稀有）
+    ("出去睡觉", 6, "嗯,就是可以立刻找一天和小未出去睡大床"),
+    ("小裙子代金券", 6, "可以最多代200块~"),
+    ("罗小黑的小手办一个", 6, "手办你得到了恭喜你!"),
+
+    # 五星物品（史诗）
+    ("蟹蟹!!!参与!!!", 5, "请你吃螃蟹!哈哈哈哈!!!"),
+    ("请你喝库迪~", 5, "咖啡咖啡咖啡咖啡"),
+    ("罗小黑的小卡片", 5, "很好的小卡片,让你旋转"),
+
+    # 四星物品（稀有）
+    ("谢谢参与!!!", 4, "这个是很认真的蟹蟹参与!!!"),
+    ("谢谢参与!!!", 4, "这个是很认真的蟹蟹参与!!!"),
+    ("谢谢参与!!!", 4, "这个是很认真的蟹蟹参与!!!"),
+    ("谢谢参与!!!", 4, "这个是很认真的蟹蟹参与!!!"),
+    ("谢谢参与!!!", 4, "这个是很认真的蟹蟹参与!!!"),
+
+    # 三星物品（普通）
+    ("谢谢参与", 3, "是的就是蟹蟹参与"),
+    ("谢谢参与", 3, "是的就是蟹蟹参与"),
+    ("谢谢参与", 3, "是的就是蟹蟹参与"),
+    ("谢谢参与", 3, "是的就是蟹蟹参与"),
+    ("谢谢参与", 3, "是的就是蟹蟹参与"),
+]
+
+
+def current_rates(pity_rate, base_rates=None):
     """
-    初始化抽卡系统所需的数据表
-
-    创建奖品表、抽卡记录表和用户统计表
-    """
-    conn = get_db_connection()
-    c = conn.cursor()
-
-    # 奖品表：存储所有可抽到的物品
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS gacha_items(
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,          -- 奖品名称
-        star INTEGER NOT NULL,       -- 星级（3-6星）
-        description TEXT,            -- 奖品描述
-        created_at TEXT DEFAULT CURRENT_TIMESTAMP
-    )
-    """)
-
-    # 抽卡记录表：记录用户每次抽卡结果
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS gacha_records(
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,    -- 用户ID
-        item_id INTEGER NOT NULL,    -- 奖品ID
-        draw_time TEXT DEFAULT CURRENT_TIMESTAMP,  -- 抽卡时间
-        FOREIGN KEY(user_id) REFERENCES users(id),
-        FOREIGN KEY(item_id) REFERENCES gacha_items(id)
-    )
-    """)
-
-    # 用户统计表：用于保底机制计算
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS gacha_stats(
-        user_id INTEGER PRIMARY KEY,
-        no_six_star_count INTEGER DEFAULT 0,  -- 连续未出六星次数
-        pity_rate REAL DEFAULT 0.0,           -- 保底概率加成
-        FOREIGN KEY(user_id) REFERENCES users(id)
-    )
-    """)
-
-    conn.commit()
-
-    # 如果奖池为空，添加默认奖品
-    c.execute("SELECT COUNT(*) FROM gacha_items")
-    count = c.fetchone()[0]
-
-    if count == 0:
-        default_items = [
-            # 六星物品（稀有）
-            ("出去睡觉", 6, "嗯,就是可以立刻找一天和小未出去睡大床"),
-            ("小裙子代金券", 6, "可以最多代200块~"),
-            ("罗小黑的小手办一个", 6, "手办你得到了恭喜你!"),
-
-            # 五星物品（史诗）
-            ("蟹蟹!!!参与!!!", 5, "请你吃螃蟹!哈哈哈哈!!!"),
-            ("请你喝库迪~", 5, "咖啡咖啡咖啡咖啡"),
-            ("罗小黑的小卡片", 5, "很好的小卡片,让你旋转"),
-
-            # 四星物品（稀有）
-            ("谢谢参与!!!", 4, "这个是很认真的蟹蟹参与!!!"),
-            ("谢谢参与!!!", 4, "这个是很认真的蟹蟹参与!!!"),
-            ("谢谢参与!!!", 4, "这个是很认真的蟹蟹参与!!!"),
-            ("谢谢参与!!!", 4, "这个是很认真的蟹蟹参与!!!"),
-            ("谢谢参与!!!", 4, "这个是很认真的蟹蟹参与!!!"),
+    计算含保底加成的各星级实际概率
 
+    六星概率加上保底加成，其余星级按比例缩放使总和为1；
+    加成使六星概率超过1时按1计算，其余星级为0
 
+    参数:
+        pity_rate (float): 保底加成
+        base_rates (dict, optional): 各星级基础概率，默认为 DEFAULT_RATES（模拟器调参时传入候选值）
 
-            # 三星物品（普通）
-            ("谢谢参与", 3, "是的就是蟹蟹参与"),
-            ("谢谢参与", 3, "是的就是蟹蟹参与"),
-            ("谢谢参与", 3, "是的就是蟹蟹参与"),
-            ("谢谢参与", 3, "是的就是蟹蟹参与"),
-            ("谢谢参与", 3, "是的就是蟹蟹参与"),
+    返回:
+        dict: 星级 -> 概率
+    """
+    rates = (DEFAULT_RATES if base_rates is None else base_rates).copy()
+    rates[6] += pity_rate
+    total_other = sum(rates[s] for s in [3, 4, 5])
+    if total_other > 0:
+        scale = (1 - rates[6]) / total_other
+        for star in [3, 4, 5]:
+            rates[star] *= scale
+
+    # 从高星到低星累加，累计值截断在 [0, 1] 内；都没落到时为三星
+    effective = {}
+    cumulative = 0.0
+    for star in [6, 5, 4, 3]:
+        upper = min(1.0, max(0.0, cumulative + rates[star]))
+        effective[star] = upper - min(1.0, max(0.0, cumulative))
+        cumulative += rates[star]
+    effective[3] += 1.0 - min(1.0, max(0.0, cumulative))
+    return effective
+
+
+def next_pity(no_six_star_count, pity_rate, star):
+    """
+    抽到 star 星之后的保底计数和概率加成
 
+    返回:
+        tuple: (连续未出六星次数, 六星概率加成)
+    """
+    if star == 6:
+        # 抽到六星，重置保底
+        return 0, 0.0
+    no_six_star_count += 1
+    if no_six_star_count >= PITY_THRESHOLD:
+        # 连续50次未出六星，增加保底概率
+        pity_rate = min(1.0, pity_rate + PITY_STEP)
+    return no_six_star_count, pity_rate
 
-        ]
 
-        for name, star, desc in default_items:
-            c.execute("INSERT INTO gacha_items(name, star, description) VALUES(?,?,?)",
-                      (name, star, desc))
+def init_gacha_tables():
+    """
+    初始化抽卡系统所需的数据表
 
-    conn.commit()
+    奖品表、抽卡记录表和用户统计表由 migrations 统一创建，
+    这里只确保数据库已是最新版本
+    """
+    from db import init_db
+    init_db()
 
 
 def add_gacha_item(name, star, description=""):
@@ -100,15 +107,12 @@ def add_gacha_item(name, star, description=""):
     c.execute("INSERT INTO gacha_items(name, star, description) VALUES(?,?,?)",
               (name, star, description))
     conn.commit()
+    gacha_pool.invalidate()
 
 
 def get_gacha_items():
-    """获取奖池所有奖品，按星级和ID排序"""
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT id, name, star, description FROM gacha_items ORDER BY star DESC, id")
-    rows = c.fetchall()
-    return rows
+    """获取奖池所有奖品，按星级和ID排序（读取奖池缓存，奖池没有变动时不查询数据库）"""
+    return list(gacha_pool.get_pool().items)
 
 
 def get_user_gacha_stats(user_id):
@@ -147,7 +151,7 @@ def get_user_gacha_records(user_id, limit=10):
         FROM gacha_records gr 
         JOIN gacha_items gi ON gr.item_id = gi.id 
         WHERE gr.user_id=? 
-        ORDER BY gr.draw_time DESC 
+        ORDER BY gr.id DESC 
         LIMIT ?
     """, (user_id, limit))
     rows = c.fetchall()
@@ -158,9 +162,27 @@ def user_owns_item(user_id, item_id):
     """检查用户是否已拥有某个奖品（用于重复判断）"""
     conn = get_db_connection()
     c = conn.cursor()
-    c.execute("SELECT COUNT(*) FROM gacha_records WHERE user_id=? AND item_id=?", (user_id, item_id))
-    count = c.fetchone()[0]
-    return count > 0
+    c.execute("SELECT 1 FROM gacha_inventory WHERE user_id=? AND item_id=?", (user_id, item_id))
+    return c.fetchone() is not None
+
+
+def get_owned_item_ids(conn, user_id):
+    """读取用户已拥有的奖品ID集合（gacha_inventory 按主键前缀扫描）"""
+    return {row[0] for row in conn.execute("SELECT item_id FROM gacha_inventory WHERE user_id=?", (user_id,))}
+
+
+def add_to_inventory(conn, user_id, item_counts):
+    """
+    把抽到的奖品计入 gacha_inventory，与抽卡记录在同一个事务中调用
+
+    参数:
+        item_counts (dict): 奖品ID -> 本次获得的数量
+    """
+    conn.executemany("""
+        INSERT INTO gacha_inventory(user_id, item_id, count, first_drawn_at)
+        VALUES(?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(user_id, item_id) DO UPDATE SET count = count + excluded.count
+    """, [(user_id, item_id, count) for item_id, count in item_counts.items()])
 
 
 def draw_gacha(user_id):
@@ -178,24 +200,14 @@ def draw_gacha(user_id):
         # 开始事务
         conn.execute("BEGIN IMMEDIATE")
 
-        # 检查用户和金币
-        user = conn.execute(
-            "SELECT id, name, xp, level, coins FROM users WHERE id=?",
-            (user_id,)
-        ).fetchone()
-
-        if not user:
-            conn.rollback()
-            return {"success": False, "reason": "user_not_found"}
-
-        coins = user[4]
-        if coins < 600:  # 单抽需要600金币
+        # 扣除金币（余额不足或用户不存在时不扣）
+        user = change_balance(conn, user_id, coins=-SINGLE_DRAW_COST, reason="gacha")
+        if user is None:
+            reason = balance_failure_reason(conn, user_id, coins=-SINGLE_DRAW_COST)
             conn.rollback()
-            return {"success": False, "reason": "not_enough_coins"}
+            return {"success": False, "reason": reason}
 
-        # 扣除金币
-        coins -= 600
-        conn.execute("UPDATE users SET coins=? WHERE id=?", (coins, user_id))
+        coins = user["coins"]
 
         # 获取抽卡统计（保底信息）
         stats = conn.execute(
@@ -208,40 +220,14 @@ def draw_gacha(user_id):
         else:
             no_six_star_count, pity_rate = 0, 0.0
 
-        # 计算当前概率（含保底加成）
-        current_rates = DEFAULT_RATES.copy()
-        current_rates[6] += pity_rate  # 应用保底概率加成
-
-        # 调整概率保持总和为1
-        total_other = sum(current_rates[s] for s in [3, 4, 5])
-        if total_other > 0:
-            scale = (1 - current_rates[6]) / total_other
-            for star in [3, 4, 5]:
-                current_rates[star] *= scale
-
-        # 执行抽卡随机
-        rand_val = random.random()
-        cumulative = 0
-        selected_star = 3  # 默认三星
-
-        # 从高星到低星判断
-        for star in [6, 5, 4, 3]:
-            cumulative += current_rates[star]
-            if rand_val <= cumulative:
-                selected_star = star
-                break
-
-        # 从对应星级的奖品中随机选择
-        items = conn.execute(
-            "SELECT id, name, description FROM gacha_items WHERE star=?",
-            (selected_star,)
-        ).fetchall()
-
-        if not items:
+        # 按当前保底加成抽取星级和奖品（采样器缓存了奖池，不查询数据库）
+        sampler = gacha_sampler.get_sampler(conn, current_rates)
+        selected_star, selected_item = sampler.draw(pity_rate)
+
+        if selected_item is None:
             conn.rollback()
             return {"success": False, "reason": "no_items_in_star"}
 
-        selected_item = random.choice(items)
         item_id, item_name, item_desc = selected_item
 
         # 记录抽卡结果
@@ -251,16 +237,7 @@ def draw_gacha(user_id):
         )
 
         # 更新保底统计
-        new_count = no_six_star_count + 1
-        new_pity = pity_rate
-
-        if selected_star == 6:
-            # 抽到六星，重置保底
-            new_count = 0
-            new_pity = 0.0
-        elif new_count >= 50:
-            # 连续50次未出六星，增加保底概率
-            new_pity = min(1.0, pity_rate + 0.02)
+        new_count, new_pity = next_pity(no_six_star_count, pity_rate, selected_star)
 
         conn.execute(
             """INSERT OR REPLACE INTO gacha_stats(user_id, no_six_star_count, pity_rate) 
@@ -268,11 +245,13 @@ def draw_gacha(user_id):
             (user_id, new_count, new_pity)
         )
 
-        # 检查是否重复获得
-        ownership = conn.execute(
-            "SELECT COUNT(*) as count FROM gacha_records WHERE user_id=? AND item_id=?",
-            (user_id, item_id)
-        ).fetchone()
+        # 计入奖品清单，之前已经有过就是重复获得
+        ownership = conn.execute("""
+            INSERT INTO gacha_inventory(user_id, item_id, count, first_drawn_at)
+            VALUES(?, ?, 1, CURRENT_TIMESTAMP)
+            ON CONFLICT(user_id, item_id) DO UPDATE SET count = count + 1
+            RETURNING count
+        """, (user_id, item_id)).fetchone()
 
         is_duplicate = ownership[0] > 1
         refund_coins = 0
@@ -280,8 +259,7 @@ def draw_gacha(user_id):
         # 重复获得则返还部分金币
         if is_duplicate:
             refund_coins = DEFAULT_REFUND[selected_star]
-            coins += refund_coins
-            conn.execute("UPDATE users SET coins=? WHERE id=?", (coins, user_id))
+            coins = change_balance(conn, user_id, coins=refund_coins, reason="gacha_refund")["coins"]
 
         # 提交事务
         conn.commit()
@@ -309,35 +287,45 @@ def draw_gacha(user_id):
         return {"success": False, "reason": f"database_error: {str(e)}"}
 
 
-def draw_gacha_10(user_id):
+def draw_cost(n, single_cost=None, ten_cost=None):
+    """n 次抽卡所需金币：每十次按十连价格，余下的按单抽价格（价格默认为 SINGLE_DRAW_COST / TEN_DRAW_COST）"""
+    single_cost = SINGLE_DRAW_COST if single_cost is None else single_cost
+    ten_cost = TEN_DRAW_COST if ten_cost is None else ten_cost
+    return n // 10 * ten_cost + n % 10 * single_cost
+
+
+def draw_gacha_n(user_id, n):
     """
-    执行十连抽卡
+    执行 n 连抽卡
+
+    先扣除全部金币，再在内存中依次算出每一抽的结果（保底逐抽推进，重复奖品的返还逐抽累计），
+    最后一次写入：抽卡记录一次 executemany，奖品清单一次 upsert，整个操作只提交一次
+
+    抽中的星级没有奖品时这一抽作废，按本次的平均单价退还金币；全部作废时与单抽一样不扣费
+
+    参数:
+        user_id (int): 用户ID
+        n (int): 抽卡次数
 
-    优化版：先检查金币，然后批量执行10次抽卡
+    返回:
+        dict: 抽卡结果详情，draws 为每一抽的结果
     """
+    if n <= 0:
+        return {"success": False, "reason": "invalid_count"}
+    cost = draw_cost(n)
     conn = get_db_connection()
 
     try:
         conn.execute("BEGIN IMMEDIATE")
 
-        # 先检查用户金币是否足够
-        user = conn.execute(
-            "SELECT coins FROM users WHERE id=?",
-            (user_id,)
-        ).fetchone()
-
-        if not user:
+        # 一次性扣除所需金币（余额不足或用户不存在时不扣）
+        user = change_balance(conn, user_id, coins=-cost, reason="gacha")
+        if user is None:
+            reason = balance_failure_reason(conn, user_id, coins=-cost)
             conn.rollback()
-            return {"success": False, "reason": "user_not_found"}
+            return {"success": False, "reason": reason}
 
-        coins = user[0]
-        if coins < 6000:  # 十连需要6000金币
-            conn.rollback()
-            return {"success": False, "reason": "not_enough_coins"}
-
-        # 一次性扣除6000金币
-        coins -= 6000
-        conn.execute("UPDATE users SET coins=? WHERE id=?", (coins, user_id))
+        current_coins = user["coins"]
 
         # 获取当前抽卡统计
         stats = conn.execute(
@@ -351,77 +339,33 @@ def draw_gacha_10(user_id):
             no_six_star_count, pity_rate = 0, 0.0
 
         results = []
+        records = []
         total_refund = 0
-        current_coins = coins
-
-        # 执行10次抽卡
-        for i in range(10):
-            # 计算当前概率（含保底）
-            current_rates = DEFAULT_RATES.copy()
-            current_rates[6] += pity_rate
-
-            # 调整概率保持总和为1
-            total_other = sum(current_rates[s] for s in [3, 4, 5])
-            if total_other > 0:
-                scale = (1 - current_rates[6]) / total_other
-                for star in [3, 4, 5]:
-                    current_rates[star] *= scale
-
-            # 抽卡
-            rand_val = random.random()
-            cumulative = 0
-            selected_star = 3
-
-            for star in [6, 5, 4, 3]:
-                cumulative += current_rates[star]
-                if rand_val <= cumulative:
-                    selected_star = star
-                    break
-
-            # 获取奖品
-            items = conn.execute(
-                "SELECT id, name, description FROM gacha_items WHERE star=?",
-                (selected_star,)
-            ).fetchall()
-
-            if not items:
-                continue  # 跳过这次抽卡
-
-            selected_item = random.choice(items)
-            item_id, item_name, item_desc = selected_item
+        skipped = 0  # 抽中的星级没有奖品而作废的次数
+        sampler = gacha_sampler.get_sampler(conn, current_rates)
+        owned = get_owned_item_ids(conn, user_id)
+        drawn = {}  # 奖品ID -> 本次获得的数量
 
-            # 记录抽卡
-            conn.execute(
-                "INSERT INTO gacha_records(user_id, item_id) VALUES(?,?)",
-                (user_id, item_id)
-            )
-
-            # 更新统计
-            new_count = no_six_star_count + 1
-            new_pity = pity_rate
+        for i in range(n):
+            # 抽卡（含保底）
+            selected_star, selected_item = sampler.draw(pity_rate)
 
-            if selected_star == 6:
-                new_count = 0
-                new_pity = 0.0
-            elif new_count >= 50:
-                new_pity = min(1.0, pity_rate + 0.02)
+            if selected_item is None:
+                skipped += 1  # 跳过这次抽卡，金币在最后退还
+                continue
 
-            no_six_star_count = new_count
-            pity_rate = new_pity
-
-            # 检查重复
-            ownership = conn.execute(
-                "SELECT COUNT(*) FROM gacha_records WHERE user_id=? AND item_id=?",
-                (user_id, item_id)
-            ).fetchone()
+            item_id, item_name, item_desc = selected_item
+            records.append((user_id, item_id))
 
-            is_duplicate = ownership[0] > 1
-            refund_coins = 0
+            # 更新统计
+            no_six_star_count, pity_rate = next_pity(no_six_star_count, pity_rate, selected_star)
 
-            if is_duplicate:
-                refund_coins = DEFAULT_REFUND[selected_star]
-                current_coins += refund_coins
-                total_refund += refund_coins
+            # 检查重复（之前已拥有或本次已经抽到过）
+            is_duplicate = item_id in owned
+            owned.add(item_id)
+            drawn[item_id] = drawn.get(item_id, 0) + 1
+            refund_coins = DEFAULT_REFUND[selected_star] if is_duplicate else 0
+            total_refund += refund_coins
 
             results.append({
                 "item": {
@@ -434,8 +378,18 @@ def draw_gacha_10(user_id):
                 "refund_coins": refund_coins
             })
 
-        # 更新最终金币和统计
-        conn.execute("UPDATE users SET coins=? WHERE id=?", (current_coins, user_id))
+        if not results:
+            conn.rollback()
+            return {"success": False, "reason": "no_items_in_star"}
+
+        # 一次性写入抽卡记录和奖品清单、返还重复奖品和作废抽卡的金币，并更新统计
+        conn.executemany("INSERT INTO gacha_records(user_id, item_id) VALUES(?,?)", records)
+        add_to_inventory(conn, user_id, drawn)
+        if total_refund:
+            current_coins = change_balance(conn, user_id, coins=total_refund, reason="gacha_refund")["coins"]
+        skipped_refund = cost * skipped // n
+        if skipped_refund:
+            current_coins = change_balance(conn, user_id, coins=skipped_refund, reason="gacha_skipped")["coins"]
         conn.execute(
             """INSERT OR REPLACE INTO gacha_stats(user_id, no_six_star_count, pity_rate) 
                VALUES(?,?,?)""",
@@ -448,6 +402,8 @@ def draw_gacha_10(user_id):
             "success": True,
             "draws": results,
             "total_refund": total_refund,
+            "skipped": skipped,
+            "skipped_refund": skipped_refund,
             "remaining_coins": current_coins,
             "pity_info": {
                 "no_six_star_count": no_six_star_count,
@@ -457,10 +413,15 @@ def draw_gacha_10(user_id):
 
     except Exception as e:
         conn.rollback()
-        print(f"十连抽错误: {e}")
+        print(f"{n}连抽错误: {e}")
         return {"success": False, "reason": f"database_error: {str(e)}"}
 
 
+def draw_gacha_10(user_id):
+    """执行十连抽卡（见 draw_gacha_n）"""
+    return draw_gacha_n(user_id, 10)
+
+
 def delete_gacha_item(item_id):
     """删除抽卡奖品"""
     conn = get_db_connection()
@@ -468,6 +429,7 @@ def delete_gacha_item(item_id):
     try:
         c.execute("DELETE FROM gacha_items WHERE id=?", (item_id,))
         conn.commit()
+        gacha_pool.invalidate()
         affected = c.rowcount
         return affected > 0
     except Exception:
@@ -0,0 +1,83 @@
+"""
+奖池缓存
+
+奖池只在增删奖品时变化，但打开奖池对话框和每次抽卡都要读取它。这里把整个奖池读入内存，
+按星级分组，并带一个单调递增的版本号：本进程增删奖品后调用 invalidate() 增加版本号，
+其他进程的改动通过 PRAGMA data_version 发现：它在其他连接的任何提交之后都会变化（维护任务、
+账本写入也算），所以变化后还要读一次 gacha_pool_version 中由触发器维护的计数，奖池确实变了才丢弃缓存。
+依赖奖池的缓存（如 gacha_sampler 的别名表）只要比较版本号就知道是否需要重建。
+"""
+
+import threading
+from collections import namedtuple
+
+import db
+
+_lock = threading.Lock()
+_state = {"version": 0, "db_file": None, "snapshot": None, "db_version": None}
+
+
+class PoolSnapshot(namedtuple("PoolSnapshot", "version items by_star")):
+    """
+    某个版本的奖池
+
+    items 为全部奖品 (id, name, star, description)，按星级从高到低、ID从小到大排序；
+    by_star 为星级 -> 该星级的奖品列表
+    """
+
+    __slots__ = ()
+
+
+def invalidate():
+    """奖池有变动，增加版本号，下次读取时重新查询"""
+    with _lock:
+        _state["version"] += 1
+        _state["snapshot"] = None
+
+
+def _db_version(conn):
+    """数据库中的奖池计数，gacha_items 每次增删改都由触发器加一（见 migrations._m009_gacha_pool_version）"""
+    return conn.execute("SELECT version FROM gacha_pool_version WHERE id=1").fetchone()[0]
+
+
+def _check_version(conn):
+    """
+    数据库文件切换、新连接（文件可能已被替换）、或其他连接提交后奖池计数变化时，
+    丢弃缓存的奖池（调用时持有 _lock）
+    """
+    data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+    checked = getattr(conn, "pool_data_version", None)
+    stale = _state["db_file"] != db.DB_FILE or checked is None
+    if not stale and checked != data_version:
+        stale = _db_version(conn) != _state["db_version"]
+    if stale:
+        _state["db_file"] = db.DB_FILE
+        _state["version"] += 1
+        _state["snapshot"] = None
+    if isinstance(conn, db.PooledConnection):
+        conn.pool_data_version = data_version
+
+
+def get_pool(conn=None):
+    """
+    获取当前奖池，缓存有效时不读取 gacha_items
+
+    参数:
+        conn (sqlite3.Connection, optional): 用于检查 data_version 和读取奖池的连接，默认为当前线程的连接
+
+    返回:
+        PoolSnapshot: 奖池快照
+    """
+    conn = conn or db.get_db_connection()
+    with _lock:
+        _check_version(conn)
+        snapshot = _state["snapshot"]
+        if snapshot is None:
+            items = [tuple(row) for row in conn.execute(
+                "SELECT id, name, star, description FROM gacha_items ORDER BY star DESC, id")]
+            by_star = {}
+            for item in items:
+                by_star.setdefault(item[2], []).append(item)
+            snapshot = _state["snapshot"] = PoolSnapshot(_state["version"], items, by_star)
+            _state["db_version"] = _db_version(conn)
+        return snapshot
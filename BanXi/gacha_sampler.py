@@ -0,0 +1,110 @@
+"""
+抽卡采样器
+
+每次抽卡原本要复制并缩放一遍概率表、线性查找星级，再按星级查询一次 gacha_items，
+十连就是十次相同的查询。采样器把奖池按星级读入内存，为每个保底加成构建一张
+Walker/Vose 别名表：抽一次只需要一个随机数和两次数组下标，不读数据库。
+
+采样器按 (奖池版本, 概率函数) 缓存（奖池版本见 gacha_pool.py），奖池变动或换用
+另一个概率函数后，下一次抽卡时重新构建。
+"""
+
+import random
+import threading
+
+import gacha_pool
+
+_lock = threading.Lock()
+_state = {"key": None, "sampler": None}
+
+
+class AliasTable:
+    """
+    离散分布的别名表（Vose 算法），构建 O(n)，每次采样 O(1)
+
+    参数:
+        weights (dict): 结果 -> 权重，权重不大于 0 的结果不会被抽到
+    """
+
+    __slots__ = ("outcomes", "prob", "alias")
+
+    def __init__(self, weights):
+        self.outcomes = [outcome for outcome, weight in weights.items() if weight > 0]
+        if not self.outcomes:
+            raise ValueError("至少要有一个权重大于 0 的结果")
+        n = len(self.outcomes)
+        total = sum(weights[outcome] for outcome in self.outcomes)
+        scaled = [weights[outcome] * n / total for outcome in self.outcomes]
+
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, g = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = g
+            scaled[g] += scaled[s] - 1.0
+            (small if scaled[g] < 1.0 else large).append(g)
+        # 剩下的列概率为 1（浮点误差导致的残留也按 1 处理）
+
+    def sample(self, rnd=random):
+        """抽取一个结果：随机数的整数部分选列，小数部分决定取本列还是别名"""
+        u = rnd.random() * len(self.outcomes)
+        column = int(u)
+        if u - column >= self.prob[column]:
+            column = self.alias[column]
+        return self.outcomes[column]
+
+
+class GachaSampler:
+    """
+    奖池的内存快照和按保底加成缓存的星级别名表
+
+    参数:
+        items (list): 奖池中的奖品 (id, name, star, description)
+        rates_for (callable): rates_for(保底加成) 返回 {星级: 概率}
+    """
+
+    def __init__(self, items, rates_for):
+        self.rates_for = rates_for
+        self.items_by_star = {}
+        for item_id, name, star, description in items:
+            self.items_by_star.setdefault(star, []).append((item_id, name, description))
+        self._tables = {}
+
+    def star_table(self, pity_rate):
+        """保底加成对应的星级别名表，第一次用到时构建"""
+        key = round(pity_rate, 9)
+        table = self._tables.get(key)
+        if table is None:
+            table = self._tables[key] = AliasTable(self.rates_for(pity_rate))
+        return table
+
+    def draw(self, pity_rate, rnd=random):
+        """
+        抽一次
+
+        返回:
+            tuple: (星级, (id, name, description))，该星级没有奖品时奖品为 None
+        """
+        star = self.star_table(pity_rate).sample(rnd)
+        items = self.items_by_star.get(star)
+        return star, (items[rnd.randrange(len(items))] if items else None)
+
+
+def get_sampler(conn, rates_for):
+    """
+    返回当前奖池和概率函数的采样器，奖池版本或 rates_for 变化后重新构建
+
+    参数:
+        conn (sqlite3.Connection): 用来检查奖池版本的连接
+        rates_for (callable): 见 GachaSampler
+    """
+    pool = gacha_pool.get_pool(conn)
+    with _lock:
+        key = (pool.version, rates_for)
+        if _state["key"] != key:
+            _state["sampler"] = GachaSampler(pool.items, rates_for)
+            _state["key"] = key
+        return _state["sampler"]
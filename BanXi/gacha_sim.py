@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+抽卡经济蒙特卡洛模拟
+
+按 gacha_fixed 的规则（基础概率、连续 PITY_THRESHOLD 次未出六星后每次 +PITY_STEP 的保底、
+重复奖品返还、单抽和十连价格）同时模拟大量玩家，回答"平均多少金币一个六星"、
+"最倒霉的 1% 玩家要花多少"这类问题。所有玩家的六星位置、各奖品获得次数和累计返还都是 NumPy 数组，
+按块（每块 CHUNK_SIZE 个玩家）整体计算，百万玩家几秒内完成。
+
+用法: python gacha_sim.py [玩家数] [每人抽数]
+"""
+
+import os
+import sys
+import time
+from collections import Counter, namedtuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖，只有模拟器需要
+    np = None
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import gacha_fixed
+
+STARS = (6, 5, 4, 3)  # 星级的顺序，与 current_rates 的累加顺序一致
+CHUNK_SIZE = 65536  # 每块同时模拟的玩家数
+PERCENTILES = (50, 90, 99)
+
+
+class GachaRules(namedtuple("GachaRules", "rates refund pity_threshold pity_step single_cost ten_cost pool_sizes")):
+    """
+    一套抽卡规则
+
+    rates / refund / pool_sizes 为 星级 -> 基础概率 / 重复返还金币 / 奖品数量，
+    其余字段对应 gacha_fixed 中的同名常量；用 _replace() 得到调整了某几项的候选规则
+    """
+
+    __slots__ = ()
+
+
+def default_rules():
+    """gacha_fixed 当前使用的规则，奖品数量按默认奖池计算"""
+    return GachaRules(
+        rates=dict(gacha_fixed.DEFAULT_RATES),
+        refund=dict(gacha_fixed.DEFAULT_REFUND),
+        pity_threshold=gacha_fixed.PITY_THRESHOLD,
+        pity_step=gacha_fixed.PITY_STEP,
+        single_cost=gacha_fixed.SINGLE_DRAW_COST,
+        ten_cost=gacha_fixed.TEN_DRAW_COST,
+        pool_sizes=dict(Counter(star for _, star, _ in gacha_fixed.DEFAULT_GACHA_ITEMS)),
+    )
+
+
+def _gap_table(rules):
+    """
+    相邻两个六星（或新玩家到第一个六星）之间抽数的分布
+
+    距上一个六星的第 j 抽之前已连续 j-1 次未出六星，保底加成为 max(0, j - pity_threshold) 档；
+    按每一抽出六星的概率 h_j 累乘得到 P(间隔 <= j)，直到 h_j 为 1 或不再变化
+
+    返回:
+        tuple: (cdf 数组，cdf[j-1] = P(间隔 <= j)；表外每抽出六星的概率)
+    """
+    hazards = []
+    while True:
+        j = len(hazards) + 1
+        pity = min(1.0, max(0, j - rules.pity_threshold) * rules.pity_step)
+        hazard = gacha_fixed.current_rates(pity, rules.rates)[6]
+        hazards.append(hazard)
+        if hazard >= 1.0 or pity >= 1.0 or (rules.pity_step <= 0 and j >= rules.pity_threshold):
+            break
+    cdf = 1.0 - np.cumprod(1.0 - np.array(hazards))
+    return cdf, hazards[-1]
+
+
+def _sample_gaps(rng, n, cdf, tail_hazard, never):
+    """按 _gap_table 的分布抽取 n 个间隔，永远抽不到六星时返回 never"""
+    u = rng.random(n)
+    gaps = np.searchsorted(cdf, u, side="right") + 1
+    beyond = u >= cdf[-1]
+    if beyond.any():
+        if tail_hazard > 0:
+            gaps[beyond] = len(cdf) + rng.geometric(tail_hazard, int(beyond.sum()))
+        else:
+            gaps[beyond] = never
+    return gaps
+
+
+def _item_weights(rules):
+    """
+    非六星奖品的抽取概率和重复返还
+
+    current_rates 把五星、四星、三星按同一比例缩放，所以没出六星时各星级的条件概率与保底无关，
+    每个奖品的概率为 星级条件概率 / 该星级奖品数
+    """
+    rates = gacha_fixed.current_rates(0.0, rules.rates)
+    other = sum(rates[star] for star in STARS[1:])
+    weights, refunds = [], []
+    for star in STARS[1:]:
+        size = rules.pool_sizes.get(star, 0)
+        if rates[star] > 0 and size <= 0:
+            raise ValueError(f"{star}星的概率大于0，奖池中至少要有一个{star}星奖品")
+        for _ in range(size):
+            weights.append(rates[star] / other / size if other > 0 else 0.0)
+            refunds.append(rules.refund.get(star, 0))
+    return np.array(weights), np.array(refunds, dtype=np.int64)
+
+
+def _refunds(counts, refunds):
+    """每个奖品第二次及以后获得时返还，counts 为 (玩家, 奖品) 的获得次数"""
+    return (np.maximum(counts - 1, 0) * refunds).sum(axis=1)
+
+
+def _simulate_chunk(rules, players, pulls, rng, gaps, items):
+    """
+    模拟一块玩家
+
+    返回:
+        tuple: 每个玩家的 (六星数, 累计返还, 第一个六星在第几抽（没有为 -1）, 届时的累计返还)
+    """
+    cdf, tail_hazard = gaps
+    weights, refunds = items
+    six_size = rules.pool_sizes.get(6, 0)
+
+    # 六星的位置：从第 0 抽开始依次累加间隔，直到超出 pulls
+    position = np.zeros(players, dtype=np.int64)
+    six_stars = np.zeros(players, dtype=np.int64)
+    first_six = np.full(players, -1, dtype=np.int64)
+    active = np.arange(players)
+    while active.size:
+        position[active] += _sample_gaps(rng, active.size, cdf, tail_hazard, pulls + 1)
+        active = active[position[active] <= pulls]
+        six_stars[active] += 1
+        new = active[first_six[active] < 0]
+        first_six[new] = position[new]
+
+    # 其余各抽是互相独立的非六星奖品：第一个六星之前的部分和之后的部分分别抽取获得次数
+    got_six = first_six > 0
+    before = np.where(got_six, first_six - 1, pulls)
+    after = pulls - six_stars - before
+    refund_at_first = np.zeros(players, dtype=np.int64)
+    refund_total = np.zeros(players, dtype=np.int64)
+    if weights.size and weights.sum() > 0:
+        weights = weights / weights.sum()
+        counts = rng.multinomial(before, weights)
+        refund_at_first = _refunds(counts, refunds)
+        counts += rng.multinomial(after, weights)
+        refund_total = _refunds(counts, refunds)
+
+    # 六星奖品：第一个一定是新的，之后的在 six_size 个奖品中均匀抽取
+    if six_size > 0:
+        counts = rng.multinomial(np.maximum(six_stars - 1, 0), np.full(six_size, 1.0 / six_size))
+        counts[:, 0] += got_six
+        refund_total += _refunds(counts, rules.refund.get(6, 0))
+    return six_stars, refund_total, first_six, refund_at_first
+
+
+def _summary(values):
+    """平均值、百分位数和最大值"""
+    stats = {"mean": float(values.mean()), "max": float(values.max())}
+    for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        stats[f"p{p}"] = float(value)
+    return stats
+
+
+def simulate(players=1_000_000, pulls=300, rules=None, batch=10, seed=None, chunk_size=CHUNK_SIZE):
+    """
+    模拟 players 个新玩家每人抽 pulls 次
+
+    不逐抽循环：保底只取决于距上一个六星的抽数，六星的间隔直接按其分布抽取；
+    没出六星的各抽星级分布与保底无关，各奖品的获得次数按多项分布一次抽出，与逐抽模拟同分布
+
+    参数:
+        players (int): 玩家数
+        pulls (int): 每人抽卡次数
+        rules (GachaRules, optional): 抽卡规则，默认为 default_rules()
+        batch (int): 每次购买的抽数（10 为十连，1 为单抽），决定抽到第一个六星时已花的金币
+        seed (int, optional): 随机种子，相同的种子得到相同的结果
+        chunk_size (int): 每块同时模拟的玩家数
+
+    返回:
+        dict: 六星概率、每个六星的平均净花费、第一个六星所需抽数和净金币的分布、
+              pulls 次之后每个玩家净花费的分布、没有抽到六星的玩家比例
+    """
+    if np is None:
+        raise RuntimeError("抽卡模拟需要安装 numpy")
+    rules = rules or default_rules()
+    if rules.pool_sizes.get(6, 0) <= 0:
+        raise ValueError("奖池中至少要有一个六星奖品")
+    rng = np.random.default_rng(seed)
+    gaps = _gap_table(rules)
+    items = _item_weights(rules)
+
+    parts = []
+    for start in range(0, players, chunk_size):
+        parts.append(_simulate_chunk(rules, min(chunk_size, players - start), pulls, rng, gaps, items))
+    six_stars, refund_total, first_six, refund_at_first = (np.concatenate(column) for column in zip(*parts))
+
+    def cost(n):
+        return gacha_fixed.draw_cost(n, rules.single_cost, rules.ten_cost)
+
+    net = cost(pulls) - refund_total
+    got_six = first_six > 0
+    # 抽到第一个六星时已经买下了它所在的整批
+    bought = -(-first_six[got_six] // batch) * batch
+    first_cost = cost(bought) - refund_at_first[got_six]
+
+    total_six = int(six_stars.sum())
+    return {
+        "players": players,
+        "pulls": pulls,
+        "six_star_rate": total_six / (players * pulls) if pulls else 0.0,
+        "coins_per_six_star": float(net.sum()) / total_six if total_six else None,
+        "refund_per_pull": float(refund_total.sum()) / (players * pulls) if pulls else 0.0,
+        "first_six_star_pulls": _summary(first_six[got_six]) if got_six.any() else None,
+        "first_six_star_coins": _summary(first_cost) if got_six.any() else None,
+        "net_cost": _summary(net),
+        "no_six_star_players": float(1 - got_six.mean()),
+    }
+
+
+def format_report(report):
+    """把 simulate() 的结果整理成可读的文本"""
+    lines = [
+        f"玩家 {report['players']}，每人 {report['pulls']} 抽",
+        f"六星实际概率: {report['six_star_rate']:.4%}",
+        f"每个六星平均净花费: {report['coins_per_six_star']:.0f} 金币" if report["coins_per_six_star"]
+        else "没有抽到六星",
+        f"平均每抽返还: {report['refund_per_pull']:.1f} 金币",
+        f"{report['pulls']} 抽内没有六星的玩家: {report['no_six_star_players']:.4%}",
+    ]
+    for key, label in (("first_six_star_pulls", "第一个六星所需抽数"), ("first_six_star_coins", "第一个六星的净花费"),
+                       ("net_cost", f"{report['pulls']} 抽的净花费")):
+        stats = report[key]
+        if stats is None:
+            continue
+        lines.append(f"{label}: 平均 {stats['mean']:.1f}，" +
+                     "，".join(f"P{p} {stats[f'p{p}']:.0f}" for p in PERCENTILES) + f"，最多 {stats['max']:.0f}")
+    return "\n".join(lines)
+
+
+def main():
+    players = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    pulls = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    started = time.perf_counter()
+    report = simulate(players, pulls)
+    print(format_report(report))
+    print(f"耗时 {time.perf_counter() - started:.1f} 秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+抽卡参数扫描
+
+把一组候选参数（六星基础概率、保底起点和步长、重复返还倍数、单抽和十连价格）的所有组合
+分给 ProcessPoolExecutor 的各个进程，每个组合用 gacha_sim.simulate 模拟，
+结果按列保存为一个压缩的 .npz 文件（每个参数和每项统计一列，一行一个组合），
+之后用 load() 读回来筛选、排序、比较。
+
+用法: python gacha_sweep.py [输出文件] [每组玩家数] [每人抽数]
+"""
+
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import gacha_fixed
+import gacha_sim
+
+np = gacha_sim.np
+
+# 参数名 -> 候选值，默认的网格共 5 * 5 * 4 * 2 * 5 = 1000 组
+DEFAULT_GRID = {
+    "six_rate": (0.01, 0.015, 0.02, 0.025, 0.03),
+    "pity_threshold": (30, 40, 50, 60, 70),
+    "pity_step": (0.01, 0.02, 0.05, 0.1),
+    "refund_scale": (0.5, 1.0),
+    "single_cost": (gacha_fixed.SINGLE_DRAW_COST,),
+    "ten_cost": (4800, 5400, 6000, 6600, 7200),
+}
+STATS = ("mean", "p50", "p90", "p99", "max")
+DISTRIBUTIONS = ("first_six_star_pulls", "first_six_star_coins", "net_cost")
+SCALARS = ("six_star_rate", "coins_per_six_star", "refund_per_pull", "no_six_star_players")
+
+
+def candidate_rules(six_rate, pity_threshold, pity_step, refund_scale, single_cost, ten_cost):
+    """
+    一组参数对应的规则
+
+    六星基础概率改为 six_rate，其余星级按 DEFAULT_RATES 的比例分配剩下的概率；
+    重复返还为 DEFAULT_REFUND 乘以 refund_scale（取整）
+    """
+    rules = gacha_sim.default_rules()
+    base = gacha_fixed.DEFAULT_RATES
+    scale = (1 - six_rate) / (1 - base[6])
+    rates = {star: (six_rate if star == 6 else rate * scale) for star, rate in base.items()}
+    refund = {star: round(coins * refund_scale) for star, coins in gacha_fixed.DEFAULT_REFUND.items()}
+    return rules._replace(rates=rates, refund=refund, pity_threshold=pity_threshold, pity_step=pity_step,
+                          single_cost=single_cost, ten_cost=ten_cost)
+
+
+def _flatten(report):
+    """把 simulate() 的结果展开成 列名 -> 数值，没有值的统计为 NaN"""
+    row = {key: (float("nan") if report[key] is None else report[key]) for key in SCALARS}
+    for key in DISTRIBUTIONS:
+        for stat in STATS:
+            row[f"{key}_{stat}"] = float("nan") if report[key] is None else report[key][stat]
+    return row
+
+
+def _run(task):
+    """在工作进程中模拟一个组合，task 为 (序号, 参数, 玩家数, 抽数, 种子)"""
+    index, params, players, pulls, seed = task
+    report = gacha_sim.simulate(players, pulls, candidate_rules(**params), seed=[seed, index])
+    return _flatten(report)
+
+
+def sweep(grid=None, players=100_000, pulls=300, seed=0, workers=None, out=None):
+    """
+    模拟网格中的所有参数组合
+
+    参数:
+        grid (dict, optional): 参数名 -> 候选值，缺少的参数使用 DEFAULT_GRID 中的候选值
+        players (int): 每个组合模拟的玩家数
+        pulls (int): 每人抽卡次数
+        seed (int): 随机种子，每个组合使用 (seed, 序号)，结果与进程数无关
+        workers (int, optional): 进程数，默认为 CPU 核数；为 1 时在当前进程中依次模拟
+        out (str, optional): 结果保存到这个 .npz 文件
+
+    返回:
+        dict: 列名 -> NumPy 数组，每行一个组合
+    """
+    if np is None:
+        raise RuntimeError("抽卡参数扫描需要安装 numpy")
+    grid = {**DEFAULT_GRID, **(grid or {})}
+    names = list(DEFAULT_GRID)
+    combos = [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+    tasks = [(index, params, players, pulls, seed) for index, params in enumerate(combos)]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        rows = [_run(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            rows = list(executor.map(_run, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+
+    columns = {name: np.array([params[name] for params in combos]) for name in names}
+    for key in (rows[0] if rows else []):
+        columns[key] = np.array([row[key] for row in rows], dtype=np.float64)
+    columns["players"] = np.full(len(combos), players)
+    columns["pulls"] = np.full(len(combos), pulls)
+    if out:
+        np.savez_compressed(out, **columns)
+    return columns
+
+
+def load(path):
+    """读回 sweep() 保存的结果，返回 列名 -> NumPy 数组"""
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def main():
+    out = sys.argv[1] if len(sys.argv) > 1 else "gacha_sweep.npz"
+    players = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    pulls = int(sys.argv[3]) if len(sys.argv) > 3 else 300
+    started = time.perf_counter()
+    columns = sweep(players=players, pulls=pulls, out=out)
+    print(f"{len(columns['six_rate'])} 组参数，每组 {players} 个玩家，结果已保存到 {out}")
+    print(f"耗时 {time.perf_counter() - started:.1f} 秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,10 @@
 from PySide6 import QtWidgets, QtCore, QtGui
 
+import db_worker
+
+MAX_MULTI_DRAW = 1000  # N连抽一次最多的次数
+MAX_LISTED_RESULTS = 50  # 抽卡结果超过这个数量时只逐个列出五星及以上的奖品
+
 
 class GachaTab(QtWidgets.QWidget):
     def __init__(self, parent=None):
@@ -62,6 +67,24 @@ class GachaTab(QtWidgets.QWidget):
         self.ten_draw_btn.clicked.connect(self.on_ten_draw)
         button_layout.addWidget(self.ten_draw_btn)
 
+        # N连抽：上面选择次数，按钮上显示所需金币
+        multi_layout = QtWidgets.QVBoxLayout()
+        multi_layout.setSpacing(4)
+        self.multi_draw_count = QtWidgets.QSpinBox()
+        self.multi_draw_count.setRange(1, MAX_MULTI_DRAW)
+        self.multi_draw_count.setValue(100)
+        self.multi_draw_count.setFixedSize(120, 24)
+        self.multi_draw_count.valueChanged.connect(self.update_multi_draw_label)
+        multi_layout.addWidget(self.multi_draw_count)
+
+        self.multi_draw_btn = QtWidgets.QPushButton()
+        self.multi_draw_btn.setFixedSize(120, 66)
+        self.multi_draw_btn.setObjectName("gachaButton")
+        self.multi_draw_btn.clicked.connect(self.on_multi_draw)
+        multi_layout.addWidget(self.multi_draw_btn)
+        button_layout.addLayout(multi_layout)
+        self.update_multi_draw_label()
+
         layout.addWidget(button_container)
 
         self.setLayout(layout)
@@ -101,21 +124,27 @@ class GachaTab(QtWidgets.QWidget):
             }
         """)
 
-    def set_user(self, user_id):
+    def set_user(self, user_id, refresh=True):
         self.user_id = user_id
         # 重置动画状态，避免切换用户时触发动画
 
-        self.refresh_display()
+        if refresh:
+            self.refresh_display()
 
-    def refresh_display(self):
+    def refresh_display(self, records=None):
         if not hasattr(self, 'user_id') or self.user_id is None:
             return
 
-        from gacha_fixed import get_user_gacha_records
+        if records is None:
+            # 在后台读取抽卡记录，读完后如果用户没有切换再显示
+            from gacha_fixed import get_user_gacha_records
+            user_id = self.user_id
+            db_worker.submit(get_user_gacha_records, user_id, 20,
+                             on_done=lambda rows: user_id == self.user_id and self.refresh_display(rows))
+            return
 
         # 更新抽卡记录
         self.result_list.clear()
-        records = get_user_gacha_records(self.user_id, 20)
 
         for draw_time, item_name, star, description in records:
             # 根据星级设置颜色
@@ -164,28 +193,35 @@ class GachaTab(QtWidgets.QWidget):
             QtWidgets.QMessageBox.warning(self, "错误", "请先选择用户")
             return
 
-        try:
-            from gacha_fixed import draw_gacha
-            result = draw_gacha(self.user_id)
+        from gacha_fixed import draw_gacha
+
+        def done(result):
+            self.set_draw_enabled(True)
             self.handle_draw_result(result, is_single=True)
 
             # 立即刷新显示，让用户看到金币变化
-            self.refresh_display()
             if self.parent:
-                self.parent.refresh_all()  # 正常刷新，触发动画
+                self.parent.refresh_all()  # 正常刷新，触发动画（包括抽卡记录）
+            else:
+                self.refresh_display()
 
-        except Exception as e:
+        def failed(e):
+            self.set_draw_enabled(True)
             QtWidgets.QMessageBox.warning(self, "抽卡失败", f"抽卡过程中出现错误: {str(e)}")
 
+        # 抽卡在后台执行，结果返回前禁用抽卡按钮，避免重复点击
+        self.set_draw_enabled(False)
+        db_worker.submit(draw_gacha, self.user_id, on_done=done, on_error=failed)
+
     def on_ten_draw(self):
         if not hasattr(self, 'user_id') or self.user_id is None:
             QtWidgets.QMessageBox.warning(self, "错误", "请先选择用户")
             return
 
-        try:
-            from gacha_fixed import draw_gacha_10
-            result = draw_gacha_10(self.user_id)
+        from gacha_fixed import draw_gacha_10
 
+        def done(result):
+            self.set_draw_enabled(True)
             if not result["success"]:
                 if result.get("reason") == "not_enough_coins":
                     QtWidgets.QMessageBox.warning(self, "金币不足", "金币不足，无法进行十连抽！需要6000金币。")
@@ -197,13 +233,63 @@ class GachaTab(QtWidgets.QWidget):
             self.handle_draw_result(result, is_single=False)
 
             # 立即刷新显示，让用户看到金币变化
-            self.refresh_display()
             if self.parent:
                 self.parent.refresh_all()
+            else:
+                self.refresh_display()
 
-        except Exception as e:
+        def failed(e):
+            self.set_draw_enabled(True)
             QtWidgets.QMessageBox.warning(self, "抽卡失败", f"十连抽过程中出现错误: {str(e)}")
 
+        self.set_draw_enabled(False)
+        db_worker.submit(draw_gacha_10, self.user_id, on_done=done, on_error=failed)
+
+    def update_multi_draw_label(self):
+        from gacha_fixed import draw_cost
+        n = self.multi_draw_count.value()
+        self.multi_draw_btn.setText(f"{n}连抽卡\n({draw_cost(n)}金币)")
+
+    def on_multi_draw(self):
+        if not hasattr(self, 'user_id') or self.user_id is None:
+            QtWidgets.QMessageBox.warning(self, "错误", "请先选择用户")
+            return
+
+        from gacha_fixed import draw_cost, draw_gacha_n
+        n = self.multi_draw_count.value()
+
+        def done(result):
+            self.set_draw_enabled(True)
+            if not result["success"]:
+                if result.get("reason") == "not_enough_coins":
+                    QtWidgets.QMessageBox.warning(self, "金币不足",
+                                                  f"金币不足，无法进行{n}连抽！需要{draw_cost(n)}金币。")
+                else:
+                    QtWidgets.QMessageBox.warning(self, "抽卡失败", f"{n}连抽失败: {result.get('reason', '未知错误')}")
+                return
+
+            self.handle_draw_result(result, is_single=False)
+
+            # 立即刷新显示，让用户看到金币变化
+            if self.parent:
+                self.parent.refresh_all()
+            else:
+                self.refresh_display()
+
+        def failed(e):
+            self.set_draw_enabled(True)
+            QtWidgets.QMessageBox.warning(self, "抽卡失败", f"{n}连抽过程中出现错误: {str(e)}")
+
+        self.set_draw_enabled(False)
+        db_worker.submit(draw_gacha_n, self.user_id, n, on_done=done, on_error=failed)
+
+    def set_draw_enabled(self, enabled):
+        """抽卡请求处理期间禁用抽卡按钮"""
+        self.single_draw_btn.setEnabled(enabled)
+        self.ten_draw_btn.setEnabled(enabled)
+        self.multi_draw_btn.setEnabled(enabled)
+        self.multi_draw_count.setEnabled(enabled)
+
     def handle_draw_result(self, result, is_single=True):
         if not result["success"]:
             reason = result.get("reason", "未知错误")
@@ -216,10 +302,11 @@ class GachaTab(QtWidgets.QWidget):
         if is_single:
             self.show_draw_result_dialog([result])
         else:
-            self.show_draw_result_dialog(result["draws"])
+            self.show_draw_result_dialog(result["draws"], result.get("skipped", 0),
+                                         result.get("skipped_refund", 0))
 
-    def show_draw_result_dialog(self, results):
-        dialog = GachaResultDialog(results, self)
+    def show_draw_result_dialog(self, results, skipped=0, skipped_refund=0):
+        dialog = GachaResultDialog(results, self, skipped=skipped, skipped_refund=skipped_refund)
         dialog.exec()
 
     def show_pool_dialog(self):
@@ -230,9 +317,12 @@ class GachaTab(QtWidgets.QWidget):
 
 
 class GachaResultDialog(QtWidgets.QDialog):
-    def __init__(self, results, parent=None):
+    def __init__(self, results, parent=None, skipped=0, skipped_refund=0):
         super().__init__(parent)
         self.results = results
+        # 多抽中抽到的星级没有奖品而作废的次数和退还的金币
+        self.skipped = skipped
+        self.skipped_refund = skipped_refund
         self.setup_ui()
 
     def setup_ui(self):
@@ -253,7 +343,12 @@ class GachaResultDialog(QtWidgets.QDialog):
         content_layout = QtWidgets.QVBoxLayout()
         content_layout.setSpacing(8)  # 增加项间距
 
-        for result in self.results:
+        # 结果很多时只逐个列出五星及以上的奖品，其余的计入下面的统计
+        listed = self.results
+        if len(listed) > MAX_LISTED_RESULTS:
+            listed = [r for r in self.results if r["item"]["star"] >= 5][:MAX_LISTED_RESULTS]
+
+        for result in listed:
             item = result["item"]
             item_widget = self.create_item_widget(item, result.get("is_duplicate", False))
             content_layout.addWidget(item_widget)
@@ -262,15 +357,19 @@ class GachaResultDialog(QtWidgets.QDialog):
         scroll.setWidget(content)
         layout.addWidget(scroll)
 
-        # 统计信息（仅十连显示）
-        if len(self.results) > 1:
+        # 统计信息（多抽时显示）
+        if len(self.results) > 1 or self.skipped:
             total_refund = sum(r.get("refund_coins", 0) for r in self.results)
             six_star_count = sum(1 for r in self.results if r["item"]["star"] == 6)
             five_star_count = sum(1 for r in self.results if r["item"]["star"] == 5)
 
-            stats_text = f"十连统计: {six_star_count}个六星, {five_star_count}个五星"
+            draw_count = len(self.results) + self.skipped
+            draw_name = "十连" if draw_count == 10 else f"{draw_count}连"
+            stats_text = f"{draw_name}统计: {six_star_count}个六星, {five_star_count}个五星"
             if total_refund > 0:
                 stats_text += f", 重复返还: {total_refund}金币"
+            if self.skipped:
+                stats_text += f", {self.skipped}抽无奖品作废, 退还: {self.skipped_refund}金币"
 
             stats_label = QtWidgets.QLabel(stats_text)
             stats_label.setStyleSheet("color: #FFD166; font-weight: bold; padding: 10px;")
@@ -379,9 +478,11 @@ class GachaPoolDialog(QtWidgets.QDialog):
         layout.addLayout(btn_layout)
         self.setLayout(layout)
 
-    def load_pool_items(self):
-        from gacha_fixed import get_gacha_items
-        items = get_gacha_items()
+    def load_pool_items(self, items=None):
+        if items is None:
+            from gacha_fixed import get_gacha_items
+            db_worker.submit(get_gacha_items, on_done=self.load_pool_items)
+            return
 
         self.pool_list.clear()
         for item_id, name, star, description in items:
@@ -450,8 +551,8 @@ class GachaPoolDialog(QtWidgets.QDialog):
             name, star, description = dialog.get_data()
             if name:
                 from gacha_fixed import add_gacha_item
-                add_gacha_item(name, star, description)
-                self.load_pool_items()
+                db_worker.submit(add_gacha_item, name, star, description,
+                                 on_done=lambda _: self.load_pool_items())
 
     def on_delete_item(self):
         current_item = self.pool_list.currentItem()
@@ -469,9 +570,12 @@ class GachaPoolDialog(QtWidgets.QDialog):
 
         if reply == QtWidgets.QMessageBox.StandardButton.Yes:
             from gacha_fixed import (delete_gacha_item)
-            success = delete_gacha_item(item_id)
-            if success:
-                self.load_pool_items()
-                QtWidgets.QMessageBox.information(self, "成功", "奖品已删除")
-            else:
-                QtWidgets.QMessageBox.warning(self, "失败", "删除奖品失败")
+
+            def done(success):
+                if success:
+                    self.load_pool_items()
+                    QtWidgets.QMessageBox.information(self, "成功", "奖品已删除")
+                else:
+                    QtWidgets.QMessageBox.warning(self, "失败", "删除奖品失败")
+
+            db_worker.submit(delete_gacha_item, item_id, on_done=done)
@@ -1,6 +1,7 @@
 from PySide6 import QtWidgets, QtCore
 
 import db
+import db_worker
 from db import get_user  # 导入获取用户信息的函数
 
 from PySide6 import QtWidgets, QtCore, QtGui
@@ -130,25 +131,29 @@ class TopHUD(QtWidgets.QWidget):
         layout.addWidget(self.coin_container)
         layout.addStretch()
 
-    def set_user(self, user_id):
-        """设置用户，重置动画状态"""
+    def set_user(self, user_id, user=None):
+        """设置用户，重置动画状态；user 为已经读取好的用户数据，不传时在 db_worker 中读取，读完后再显示"""
         self.user_id = user_id
         self.reset_coin_animation()
         self.reset_platinum_animation()
         # 立即更新显示，但不要重置金币数值
-        u = self._fetch_user()
-        if u:
-            uid, name, xp, level, coins, platinum_coins = u
-            # 只更新显示，不触发动画
-            self.current_coins = coins
-            self.target_coins = coins
-            self.coin_label.setText(str(coins))
-            self.change_label.setText("")
+        if user is None:
+            self._load_user(self._show_user)
+        else:
+            self._show_user(user)
 
-            self.current_platinum = platinum_coins
-            self.target_platinum = platinum_coins
-            self.platinum_label.setText(str(platinum_coins))
-            self.platinum_change_label.setText("")
+    def _show_user(self, u):
+        uid, name, xp, level, coins, platinum_coins = u
+        # 只更新显示，不触发动画
+        self.current_coins = coins
+        self.target_coins = coins
+        self.coin_label.setText(str(coins))
+        self.change_label.setText("")
+
+        self.current_platinum = platinum_coins
+        self.target_platinum = platinum_coins
+        self.platinum_label.setText(str(platinum_coins))
+        self.platinum_change_label.setText("")
 
     def reset_coin_animation(self):
         """重置金币动画状态"""
@@ -166,14 +171,15 @@ class TopHUD(QtWidgets.QWidget):
         self.pending_platinum_change = 0
         self.platinum_change_label.setText("")
 
-    def update_display(self, user_id=None):
-        """更新显示，保持原有的动画逻辑"""
+    def update_display(self, user_id=None, user=None):
+        """更新显示，保持原有的动画逻辑；user 为已经读取好的用户数据，不传时在 db_worker 中读取，读完后再更新"""
         if user_id is not None:
             self.user_id = user_id
 
-        u = self._fetch_user()
-        if not u:
+        if user is None:
+            self._load_user(lambda u: self.update_display(user=u))
             return
+        u = user
 
         uid, name, xp, level, coins, platinum_coins = u
         xp_needed_new = db.get_xp_required_for_level(level)
@@ -453,10 +459,17 @@ class TopHUD(QtWidgets.QWidget):
         """缓动函数：缓出立方"""
         return 1 - pow(1 - x, 3)
 
-    def _fetch_user(self):
-        if self.user_id is None:
-            return None
-        return get_user(self.user_id)
+    def _load_user(self, then):
+        """在 db_worker 中读取当前用户，读完后如果没有切换用户，在界面线程中调用 then(用户数据)"""
+        user_id = self.user_id
+        if user_id is None:
+            return
+
+        def deliver(u):
+            if u and user_id == self.user_id:
+                then(u)
+
+        db_worker.get_worker().submit(get_user, user_id, on_done=deliver)
 
     def _on_anim_finished(self, level, xp):
         self.last_level = level
@@ -0,0 +1,220 @@
+"""
+批量导入
+
+从 CSV 或 JSON Lines 文件导入任务、奖励和奖池物品。文件按行流式读取，
+逐行校验后每 IMPORT_CHUNK_SIZE 行用一次 executemany 写入，整个导入只在一个事务中提交一次。
+导入过程中可以通过进度回调报告进度，回调返回 False 时取消导入并回滚。
+
+CSV 第一行为表头，列名与下面 IMPORT_KINDS 中的字段名一致；JSON Lines 每行一个对象。
+"""
+
+import csv
+import json
+import os
+from itertools import islice
+
+import gacha_pool
+from db import get_db_connection
+
+IMPORT_CHUNK_SIZE = 500  # 每次 executemany 写入的行数，也是进度回调的间隔
+MAX_REPORTED_ERRORS = 100  # 结果中最多保留的错误行数
+
+
+def _text(value):
+    text = str(value).strip() if value is not None else ""
+    if not text:
+        raise ValueError("不能为空")
+    return text
+
+
+def _non_negative_int(value):
+    number = int(str(value).strip())
+    if number < 0:
+        raise ValueError("不能为负数")
+    return number
+
+
+def _currency(value):
+    currency = str(value).strip() or "coins"
+    if currency not in ("coins", "platinum"):
+        raise ValueError("只能是 coins 或 platinum")
+    return currency
+
+
+def _star(value):
+    star = int(str(value).strip())
+    if star not in (3, 4, 5, 6):
+        raise ValueError("星级只能是 3-6")
+    return star
+
+
+# 可导入的数据类型：每项包含插入语句、是否按用户导入，以及字段列表 (字段名, 转换函数, 缺省值)
+# 缺省值为 None 表示必填
+IMPORT_KINDS = {
+    "tasks": {
+        "label": "任务",
+        "per_user": True,
+        "sql": "INSERT INTO tasks(user_id, name, xp_reward, platinum_reward) VALUES(?,?,?,?)",
+        "fields": [("name", _text, None), ("xp_reward", _non_negative_int, None),
+                   ("platinum_reward", _non_negative_int, 0)],
+    },
+    "rewards": {
+        "label": "奖励",
+        "per_user": True,
+        "sql": "INSERT INTO rewards(user_id, name, price, currency_type) VALUES(?,?,?,?)",
+        "fields": [("name", _text, None), ("price", _non_negative_int, None),
+                   ("currency_type", _currency, "coins")],
+    },
+    "gacha_items": {
+        "label": "奖池物品",
+        "per_user": False,
+        "sql": "INSERT INTO gacha_items(name, star, description) VALUES(?,?,?)",
+        "fields": [("name", _text, None), ("star", _star, None), ("description", str, "")],
+    },
+}
+
+
+def _read_lines(f, progress_state):
+    """逐行读取二进制文件并解码，同时累计已读取的字节数（首行去掉可能存在的 BOM）"""
+    encoding = "utf-8-sig"
+    for raw in f:
+        progress_state["bytes"] += len(raw)
+        yield raw.decode(encoding)
+        encoding = "utf-8"
+
+
+def iter_records(path, progress_state, file_format=None):
+    """
+    逐条读取文件中的记录
+
+    参数:
+        path (str): 文件路径
+        progress_state (dict): 读取进度，"bytes" 会随读取累加
+        file_format (str, optional): 'csv' 或 'jsonl'，默认按扩展名判断
+
+    返回:
+        generator: 依次产生 (行号, dict 记录)，JSON 行解析失败时记录为 None
+    """
+    if file_format is None:
+        file_format = "csv" if path.lower().endswith(".csv") else "jsonl"
+
+    with open(path, "rb") as f:
+        lines = _read_lines(f, progress_state)
+        if file_format == "csv":
+            reader = csv.DictReader(lines)
+            for record in reader:
+                yield reader.line_num, record
+        else:
+            for line_no, line in enumerate(lines, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                yield line_no, record if isinstance(record, dict) else None
+
+
+def validate_record(kind, record):
+    """
+    校验并转换一条记录
+
+    参数:
+        kind (str): IMPORT_KINDS 中的类型名
+        record (dict): 文件中读到的一条记录
+
+    返回:
+        tuple: 按字段顺序转换后的值
+
+    异常:
+        ValueError: 记录不合法，异常信息说明原因
+    """
+    if record is None:
+        raise ValueError("无法解析的行")
+
+    values = []
+    for name, convert, default in IMPORT_KINDS[kind]["fields"]:
+        raw = record.get(name)
+        if raw is None or raw == "":
+            if default is None:
+                raise ValueError(f"缺少字段 {name}")
+            values.append(default)
+            continue
+        try:
+            values.append(convert(raw))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"字段 {name} 不合法: {e}")
+    return tuple(values)
+
+
+def import_file(kind, path, user_id=None, progress=None, file_format=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    从文件批量导入数据
+
+    参数:
+        kind (str): 'tasks'、'rewards' 或 'gacha_items'
+        path (str): CSV 或 JSON Lines 文件路径
+        user_id (int, optional): 任务和奖励所属的用户ID
+        progress (callable, optional): 进度回调 progress(已读字节, 总字节, 已导入行数)，
+                                       返回 False 时取消导入
+        file_format (str, optional): 'csv' 或 'jsonl'，默认按扩展名判断
+        chunk_size (int): 每次写入的行数
+
+    返回:
+        dict: 导入结果，包含导入行数、出错行数和前 MAX_REPORTED_ERRORS 条错误 (行号, 原因)
+    """
+    spec = IMPORT_KINDS.get(kind)
+    if spec is None:
+        return {"success": False, "reason": "unknown_kind"}
+    if spec["per_user"] and user_id is None:
+        return {"success": False, "reason": "user_required"}
+    if not os.path.exists(path):
+        return {"success": False, "reason": "file_not_found"}
+
+    total_bytes = os.path.getsize(path)
+    progress_state = {"bytes": 0}
+    errors = []
+    error_count = 0
+    prefix = (user_id,) if spec["per_user"] else ()
+
+    def valid_rows():
+        nonlocal error_count
+        for line_no, record in iter_records(path, progress_state, file_format):
+            try:
+                yield prefix + validate_record(kind, record)
+            except ValueError as e:
+                error_count += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append((line_no, str(e)))
+
+    rows = valid_rows()
+    imported = 0
+    conn = get_db_connection()
+    try:
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            conn.executemany(spec["sql"], chunk)
+            imported += len(chunk)
+            if progress is not None and progress(progress_state["bytes"], total_bytes, imported) is False:
+                conn.rollback()
+                return {"success": False, "reason": "cancelled", "imported": 0,
+                        "error_count": error_count, "errors": errors}
+        conn.commit()
+    except (OSError, UnicodeDecodeError, csv.Error) as e:
+        conn.rollback()
+        return {"success": False, "reason": f"read_error: {e}", "imported": 0,
+                "error_count": error_count, "errors": errors}
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    if kind == "gacha_items":
+        gacha_pool.invalidate()
+    if progress is not None:
+        progress(total_bytes, total_bytes, imported)
+
+    return {"success": True, "imported": imported, "error_count": error_count, "errors": errors}
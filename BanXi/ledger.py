@@ -0,0 +1,252 @@
+"""
+货币账本
+
+每次经验、金币、铂金币的变动都会在 currency_ledger 中追加一条记录（含变动后的余额），
+users 表中的余额是账本的物化结果，两者在同一个事务中写入。
+
+每个用户每 CHECKPOINT_INTERVAL 条记录在 ledger_checkpoints 中保存一次累计收支，
+统计一段时间内的收支时，只需找到时间点之前最近的检查点，再累加检查点之后的少量记录，
+不需要从头重放整个账本。
+"""
+
+import db
+
+CHECKPOINT_INTERVAL = 100  # 每个用户每多少条账本记录保存一次检查点
+
+# 账本记录的变动原因
+REASON_LABELS = {
+    "opening": "期初余额",
+    "task": "完成任务",
+    "repeat_task": "完成重复任务",
+    "reward": "兑换奖励",
+    "gacha": "抽卡",
+    "gacha_refund": "抽卡重复返还",
+    "gacha_skipped": "抽卡作废退还",
+    "exchange": "铂金币兑换",
+    "platinum_grant": "发放铂金币",
+    "adjust": "手动调整",
+}
+
+# 累计收支的字段及其在账本记录上的计算方式
+_TOTAL_COLUMNS = (
+    ("xp_earned", "MAX(xp_delta, 0)"),
+    ("coins_earned", "MAX(coins_delta, 0)"),
+    ("coins_spent", "MAX(-coins_delta, 0)"),
+    ("platinum_earned", "MAX(platinum_delta, 0)"),
+    ("platinum_spent", "MAX(-platinum_delta, 0)"),
+)
+_TOTALS_SELECT = ", ".join(f"COALESCE(SUM({expr}), 0)" for _, expr in _TOTAL_COLUMNS)
+_ZERO_TOTALS = {name: 0 for name, _ in _TOTAL_COLUMNS}
+
+
+def record(conn, snapshot, reason, ref_id=None, xp_delta=0, coins_delta=0, platinum_delta=0):
+    """
+    追加一条账本记录（不提交事务，由调用方与余额更新一起提交）
+
+    参数:
+        conn (sqlite3.Connection): 数据库连接
+        snapshot (UserSnapshot): 变动后的用户数据
+        reason (str): 变动原因，见 REASON_LABELS
+        ref_id (int, optional): 关联的任务、奖励等记录ID
+        xp_delta (int): 获得的经验
+        coins_delta (int): 金币变动量
+        platinum_delta (int): 铂金币变动量
+    """
+    user_id = snapshot["id"]
+    seq = conn.execute("""
+        INSERT INTO currency_ledger(user_id, seq, reason, ref_id, xp_delta, coins_delta, platinum_delta,
+                                    xp, level, coins, platinum_coins)
+        VALUES(?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM currency_ledger WHERE user_id=?),
+               ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        RETURNING seq
+    """, (user_id, user_id, reason, ref_id, xp_delta, coins_delta, platinum_delta,
+          snapshot["xp"], snapshot["level"], snapshot["coins"], snapshot["platinum_coins"])).fetchone()[0]
+
+    if seq % CHECKPOINT_INTERVAL == 0:
+        _write_checkpoint(conn, user_id, seq)
+
+
+def record_adjustment(conn, snapshot, ref_id=None):
+    """
+    直接改写余额后追加一条 adjust 记录，变动量为与上一条账本记录余额的差
+
+    参数:
+        conn (sqlite3.Connection): 数据库连接
+        snapshot (UserSnapshot): 改写后的用户数据
+        ref_id (int, optional): 关联记录ID
+    """
+    last = conn.execute("""
+        SELECT xp, coins, platinum_coins FROM currency_ledger
+        WHERE user_id=? ORDER BY seq DESC LIMIT 1
+    """, (snapshot["id"],)).fetchone()
+    xp, coins, platinum = last if last is not None else (0, 0, 0)
+
+    # 经验可能因升级结算而减少，调整记录中的经验变动只记录增加的部分
+    record(conn, snapshot, "adjust", ref_id,
+           xp_delta=max(snapshot["xp"] - xp, 0),
+           coins_delta=snapshot["coins"] - coins,
+           platinum_delta=snapshot["platinum_coins"] - platinum)
+
+
+def _latest_checkpoint(conn, user_id, seq=None):
+    """返回序号不超过 seq 的最近一个检查点 (序号, 累计收支)，没有则为 (0, 全零)"""
+    query = "SELECT seq, " + ", ".join(name for name, _ in _TOTAL_COLUMNS) + \
+            " FROM ledger_checkpoints WHERE user_id=?"
+    params = [user_id]
+    if seq is not None:
+        query += " AND seq<=?"
+        params.append(seq)
+    row = conn.execute(query + " ORDER BY seq DESC LIMIT 1", params).fetchone()
+    if row is None:
+        return 0, dict(_ZERO_TOTALS)
+    return row[0], {name: row[i + 1] for i, (name, _) in enumerate(_TOTAL_COLUMNS)}
+
+
+def _sum_range(conn, user_id, after_seq, upto_seq):
+    """累加序号在 (after_seq, upto_seq] 之间的记录"""
+    row = conn.execute(f"""
+        SELECT {_TOTALS_SELECT} FROM currency_ledger
+        WHERE user_id=? AND seq>? AND seq<=?
+    """, (user_id, after_seq, upto_seq)).fetchone()
+    return {name: row[i] for i, (name, _) in enumerate(_TOTAL_COLUMNS)}
+
+
+def _write_checkpoint(conn, user_id, seq):
+    """在序号 seq 处保存检查点：上一个检查点的累计值加上之后的记录"""
+    prev_seq, totals = _latest_checkpoint(conn, user_id)
+    for name, value in _sum_range(conn, user_id, prev_seq, seq).items():
+        totals[name] += value
+
+    created_at = conn.execute("SELECT created_at FROM currency_ledger WHERE user_id=? AND seq=?",
+                              (user_id, seq)).fetchone()[0]
+    names = [name for name, _ in _TOTAL_COLUMNS]
+    conn.execute(f"""
+        INSERT OR REPLACE INTO ledger_checkpoints(user_id, seq, created_at, {', '.join(names)})
+        VALUES(?, ?, ?, {', '.join('?' * len(names))})
+    """, [user_id, seq, created_at] + [totals[name] for name in names])
+
+
+def _totals_until(conn, user_id, until):
+    """截至某一时间（含）的累计收支，until 为 None 表示截至目前"""
+    if until is None:
+        row = conn.execute("SELECT MAX(seq) FROM currency_ledger WHERE user_id=?", (user_id,)).fetchone()
+    else:
+        # (user_id, created_at) 索引直接定位到该时间点的最后一条记录
+        row = conn.execute("""
+            SELECT seq FROM currency_ledger
+            WHERE user_id=? AND created_at<=?
+            ORDER BY created_at DESC, id DESC LIMIT 1
+        """, (user_id, until)).fetchone()
+    if row is None or row[0] is None:
+        return dict(_ZERO_TOTALS)
+
+    seq = row[0]
+    cp_seq, totals = _latest_checkpoint(conn, user_id, seq)
+    for name, value in _sum_range(conn, user_id, cp_seq, seq).items():
+        totals[name] += value
+    return totals
+
+
+def get_totals(user_id, start=None, end=None):
+    """
+    统计一段时间内的收支
+
+    参数:
+        user_id (int): 用户ID
+        start (str, optional): 起始时间（不含），格式与 created_at 相同，如 '2024-01-01 00:00:00'
+        end (str, optional): 结束时间（含），默认截至目前
+
+    返回:
+        dict: xp_earned, coins_earned, coins_spent, platinum_earned, platinum_spent
+    """
+    conn = db.get_db_connection()
+    try:
+        totals = _totals_until(conn, user_id, end)
+        if start is not None:
+            before = _totals_until(conn, user_id, start)
+            totals = {name: totals[name] - before[name] for name in totals}
+    finally:
+        conn.close()
+    return totals
+
+
+def get_history(user_id, start=None, end=None, limit=100):
+    """
+    获取账本记录，按时间倒序
+
+    参数:
+        user_id (int): 用户ID
+        start (str, optional): 起始时间（不含）
+        end (str, optional): 结束时间（含）
+        limit (int): 最多返回的记录数
+
+    返回:
+        list: sqlite3.Row 列表，包含变动量、变动后的余额、原因和时间
+    """
+    query = """
+        SELECT id, seq, reason, ref_id, xp_delta, coins_delta, platinum_delta,
+               xp, level, coins, platinum_coins, created_at
+        FROM currency_ledger WHERE user_id=?
+    """
+    params = [user_id]
+    if start is not None:
+        query += " AND created_at>?"
+        params.append(start)
+    if end is not None:
+        query += " AND created_at<=?"
+        params.append(end)
+    query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+    params.append(limit)
+
+    conn = db.get_db_connection()
+    rows = conn.execute(query, params).fetchall()
+    conn.close()
+    return rows
+
+
+def get_balance_at(user_id, when):
+    """
+    查询某一时间点的余额
+
+    参数:
+        user_id (int): 用户ID
+        when (str): 时间点（含），格式与 created_at 相同
+
+    返回:
+        dict: xp, level, coins, platinum_coins；该时间点之前没有记录返回None
+    """
+    conn = db.get_db_connection()
+    row = conn.execute("""
+        SELECT xp, level, coins, platinum_coins FROM currency_ledger
+        WHERE user_id=? AND created_at<=?
+        ORDER BY created_at DESC, id DESC LIMIT 1
+    """, (user_id, when)).fetchone()
+    conn.close()
+    return dict(row) if row is not None else None
+
+
+def verify_user(user_id):
+    """
+    核对账本：变动量之和与最后一条记录的余额、以及 users 表中的余额是否一致
+
+    返回:
+        bool: 是否一致
+    """
+    conn = db.get_db_connection()
+    try:
+        sums = conn.execute("""
+            SELECT COALESCE(SUM(coins_delta), 0), COALESCE(SUM(platinum_delta), 0)
+            FROM currency_ledger WHERE user_id=?
+        """, (user_id,)).fetchone()
+        last = conn.execute("""
+            SELECT coins, platinum_coins FROM currency_ledger
+            WHERE user_id=? ORDER BY seq DESC LIMIT 1
+        """, (user_id,)).fetchone()
+        user = conn.execute("SELECT coins, platinum_coins FROM users WHERE id=?", (user_id,)).fetchone()
+    finally:
+        conn.close()
+
+    if user is None:
+        return False
+    last = tuple(last) if last is not None else (0, 0)
+    return tuple(sums) == last == tuple(user)
@@ -2,16 +2,22 @@ import os
 import sys
 from PySide6 import QtWidgets, QtGui
 
+import profiler
+import shards
+
+# 设置 BANXI_PROFILE=1 时开启查询耗时统计，需在导入界面模块之前包装数据库函数
+profiler.install_from_env()
 
-from repeat_tasks import init_repeat_tasks
 from window import MainWindow
 from db import init_db
 from style import STYLE
+import db_worker
 
 
 def main():
+    # 设置 BANXI_SHARDS=1 或 BANXI_SHARD_DIR 时按用户分库
+    shards.install_from_env()
     init_db()
-    init_repeat_tasks()
 
     app = QtWidgets.QApplication(sys.argv)
     app.setStyleSheet(STYLE)
@@ -20,7 +26,10 @@ def main():
     win = MainWindow()
     win.show()
     win.on_tab_changed(win.tab_widget.currentIndex())
-    sys.exit(app.exec())
+    code = app.exec()
+    # 等后台线程中排队的写入全部完成后再退出
+    db_worker.wait_for_done()
+    sys.exit(code)
 
 
 if __name__ == "__main__":
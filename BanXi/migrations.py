@@ -0,0 +1,603 @@
+"""
+数据库结构迁移
+
+数据库版本记录在 PRAGMA user_version 中。MIGRATIONS 按版本号顺序列出所有迁移，
+启动时只需读取一次 user_version：已是最新版本时直接返回，否则把所有待执行的迁移
+放在同一个事务中依次执行，最后写入新的版本号，整个升级要么全部生效要么全部回滚。
+
+新增表或列时，在 MIGRATIONS 末尾追加一项即可，不要修改已发布的迁移。
+"""
+
+import re
+import sqlite3
+from collections import Counter
+
+# 索引：每项为 (索引名, 所属表, 建索引语句)
+# 各列表查询都是 WHERE user_id=? ORDER BY completed, id，复合索引可以直接按序返回，省去全表扫描和排序
+MANAGED_INDEXES = [
+    ("idx_tasks_user_completed", "tasks",
+     "CREATE INDEX IF NOT EXISTS idx_tasks_user_completed ON tasks(user_id, completed, id)"),
+    ("idx_tasks_open", "tasks",
+     "CREATE INDEX IF NOT EXISTS idx_tasks_open ON tasks(user_id, id) WHERE completed=0"),
+    ("idx_rewards_user_completed", "rewards",
+     "CREATE INDEX IF NOT EXISTS idx_rewards_user_completed ON rewards(user_id, completed, id)"),
+    ("idx_repeat_tasks_user_completed", "repeat_tasks",
+     "CREATE INDEX IF NOT EXISTS idx_repeat_tasks_user_completed ON repeat_tasks(user_id, completed, id)"),
+    ("idx_gacha_records_user_item", "gacha_records",
+     "CREATE INDEX IF NOT EXISTS idx_gacha_records_user_item ON gacha_records(user_id, item_id)"),
+    ("idx_gacha_records_user_recent", "gacha_records",
+     "CREATE INDEX IF NOT EXISTS idx_gacha_records_user_recent ON gacha_records(user_id, id DESC)"),
+    ("idx_gacha_items_star", "gacha_items",
+     "CREATE INDEX IF NOT EXISTS idx_gacha_items_star ON gacha_items(star, id)"),
+    # 账本按用户和时间范围查询，按用户序号定位检查点之后的记录
+    ("idx_ledger_user_time", "currency_ledger",
+     "CREATE INDEX IF NOT EXISTS idx_ledger_user_time ON currency_ledger(user_id, created_at, id)"),
+    ("idx_ledger_user_seq", "currency_ledger",
+     "CREATE UNIQUE INDEX IF NOT EXISTS idx_ledger_user_seq ON currency_ledger(user_id, seq)"),
+    # 归档记录按用户从新到旧翻页
+    ("idx_tasks_archive_user", "tasks_archive",
+     "CREATE INDEX IF NOT EXISTS idx_tasks_archive_user ON tasks_archive(user_id, id)"),
+    ("idx_rewards_archive_user", "rewards_archive",
+     "CREATE INDEX IF NOT EXISTS idx_rewards_archive_user ON rewards_archive(user_id, id)"),
+]
+
+# v2 迁移发布时已有的表，之后新增的表的索引由各自的迁移创建
+_V2_INDEXED_TABLES = {"tasks", "rewards", "repeat_tasks", "gacha_records", "gacha_items"}
+
+
+def create_indexes(conn, tables=None):
+    """
+    创建 MANAGED_INDEXES 中的索引（不提交事务）
+
+    参数:
+        conn (sqlite3.Connection): 数据库连接
+        tables (set, optional): 只创建这些表上的索引，默认全部
+    """
+    for _name, table, sql in MANAGED_INDEXES:
+        if tables is None or table in tables:
+            conn.execute(sql)
+
+
+def _table_columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _add_missing_columns(conn, table, columns):
+    """为旧版本数据库补齐缺失的列，columns 为 [(列名, 列定义)]"""
+    existing = _table_columns(conn, table)
+    for name, decl in columns:
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+            print(f"已添加 {name} 列到 {table} 表")
+
+
+def _m001_base_schema(conn):
+    """
+    基础表结构
+
+    引入迁移机制之前的数据库已经有这些表，但可能缺少后来加上的列，
+    这里统一用 IF NOT EXISTS 建表并按 table_info 补列
+    """
+    # 用户表：存储用户基本信息
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS users(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE,           -- 用户名，唯一
+        xp INTEGER DEFAULT 0,       -- 经验值
+        level INTEGER DEFAULT 1,    -- 等级
+        coins INTEGER DEFAULT 0,    -- 金币数量
+        platinum_coins INTEGER DEFAULT 0  -- 铂金币数量
+    )
+    """)
+
+    # 任务表：存储单次任务信息
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS tasks(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,            -- 关联用户ID
+        name TEXT,                  -- 任务名称
+        xp_reward INTEGER,          -- 经验奖励
+        platinum_reward INTEGER DEFAULT 0,  -- 铂金币奖励
+        completed INTEGER DEFAULT 0,-- 完成状态：0未完成，1已完成
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )
+    """)
+
+    # 商店表：存储可兑换奖励
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS rewards(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,            -- 关联用户ID
+        name TEXT,                  -- 奖励名称
+        price INTEGER,              -- 所需金币/铂金币
+        currency_type TEXT DEFAULT 'coins',  -- 货币类型：'coins'(金币) 或 'platinum'(铂金币)
+        completed INTEGER DEFAULT 0,-- 兑换状态：0未兑换，1已兑换
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )
+    """)
+
+    # 重复任务表
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS repeat_tasks(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        name TEXT,
+        xp_reward INTEGER,
+        platinum_reward INTEGER DEFAULT 0,
+        max_completions INTEGER,
+        current_completions INTEGER DEFAULT 0,
+        completed INTEGER DEFAULT 0,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )
+    """)
+
+    # 奖品表：存储所有可抽到的物品
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS gacha_items(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,          -- 奖品名称
+        star INTEGER NOT NULL,       -- 星级（3-6星）
+        description TEXT,            -- 奖品描述
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    # 抽卡记录表：记录用户每次抽卡结果
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS gacha_records(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,    -- 用户ID
+        item_id INTEGER NOT NULL,    -- 奖品ID
+        draw_time TEXT DEFAULT CURRENT_TIMESTAMP,  -- 抽卡时间
+        FOREIGN KEY(user_id) REFERENCES users(id),
+        FOREIGN KEY(item_id) REFERENCES gacha_items(id)
+    )
+    """)
+
+    # 用户统计表：用于保底机制计算
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS gacha_stats(
+        user_id INTEGER PRIMARY KEY,
+        no_six_star_count INTEGER DEFAULT 0,  -- 连续未出六星次数
+        pity_rate REAL DEFAULT 0.0,           -- 保底概率加成
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )
+    """)
+
+    # 旧版本数据库中后加的列
+    _add_missing_columns(conn, "users", [("platinum_coins", "INTEGER DEFAULT 0")])
+    _add_missing_columns(conn, "tasks", [("platinum_reward", "INTEGER DEFAULT 0")])
+    _add_missing_columns(conn, "rewards", [("currency_type", "TEXT DEFAULT 'coins'")])
+    _add_missing_columns(conn, "repeat_tasks", [("platinum_reward", "INTEGER DEFAULT 0")])
+
+
+def _m002_indexes(conn):
+    """列表查询索引"""
+    create_indexes(conn, _V2_INDEXED_TABLES)
+
+
+def _m003_default_data(conn):
+    """默认用户、默认重复任务和默认奖池"""
+    from repeat_tasks import DEFAULT_REPEAT_TASKS
+    from gacha_fixed import DEFAULT_GACHA_ITEMS
+
+    for uname in ["玖", "未"]:
+        conn.execute("INSERT OR IGNORE INTO users(name, xp, level, coins, platinum_coins) VALUES(?,?,?,?,?)",
+                     (uname, 0, 1, 0, 0))
+
+    # 重复任务表为空时为每个用户添加默认的重复任务
+    if conn.execute("SELECT COUNT(*) FROM repeat_tasks").fetchone()[0] == 0:
+        users = conn.execute("SELECT id FROM users").fetchall()
+        conn.executemany(
+            "INSERT INTO repeat_tasks(user_id, name, xp_reward, max_completions) VALUES(?,?,?,?)",
+            [(user_id, name, xp_reward, max_completions)
+             for user_id, in users
+             for name, xp_reward, max_completions in DEFAULT_REPEAT_TASKS])
+        print(f"已为 {len(users)} 个用户添加 {len(DEFAULT_REPEAT_TASKS)} 个默认重复任务")
+
+    # 奖池为空时添加默认奖品
+    if conn.execute("SELECT COUNT(*) FROM gacha_items").fetchone()[0] == 0:
+        conn.executemany("INSERT INTO gacha_items(name, star, description) VALUES(?,?,?)",
+                         DEFAULT_GACHA_ITEMS)
+
+
+def _m004_currency_ledger(conn):
+    """
+    货币账本
+
+    currency_ledger 只追加不修改，每次经验、金币、铂金币变动记一条，同时记下变动后的余额；
+    users 表中的数值是账本的结果，与账本在同一个事务中更新。
+    ledger_checkpoints 每隔若干条记录保存一次累计收支，按时间范围统计时只需读取检查点之后的一小段记录
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS currency_ledger(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        seq INTEGER NOT NULL,             -- 该用户的第几条记录，从 1 开始
+        reason TEXT NOT NULL,             -- 变动原因：task/repeat_task/reward/gacha/gacha_refund/exchange/platinum_grant/adjust/opening
+        ref_id INTEGER,                   -- 关联的任务、奖励等记录ID
+        xp_delta INTEGER DEFAULT 0,       -- 获得的经验
+        coins_delta INTEGER DEFAULT 0,    -- 金币变动，负数为支出
+        platinum_delta INTEGER DEFAULT 0, -- 铂金币变动，负数为支出
+        xp INTEGER,                       -- 变动后的经验
+        level INTEGER,                    -- 变动后的等级
+        coins INTEGER,                    -- 变动后的金币
+        platinum_coins INTEGER,           -- 变动后的铂金币
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ledger_checkpoints(
+        user_id INTEGER NOT NULL,
+        seq INTEGER NOT NULL,             -- 检查点对应的账本序号（含）
+        created_at TEXT NOT NULL,         -- 该序号记录的时间
+        xp_earned INTEGER NOT NULL,       -- 截至该记录的累计获得经验
+        coins_earned INTEGER NOT NULL,    -- 累计获得金币
+        coins_spent INTEGER NOT NULL,     -- 累计支出金币
+        platinum_earned INTEGER NOT NULL, -- 累计获得铂金币
+        platinum_spent INTEGER NOT NULL,  -- 累计支出铂金币
+        PRIMARY KEY(user_id, seq),
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    ) WITHOUT ROWID
+    """)
+
+    create_indexes(conn, {"currency_ledger"})
+
+    # 已有用户的余额记为一条期初记录
+    conn.execute("""
+        INSERT INTO currency_ledger(user_id, seq, reason, xp_delta, coins_delta, platinum_delta,
+                                    xp, level, coins, platinum_coins)
+        SELECT id, 1, 'opening', COALESCE(xp, 0), COALESCE(coins, 0), COALESCE(platinum_coins, 0),
+               COALESCE(xp, 0), COALESCE(level, 1), COALESCE(coins, 0), COALESCE(platinum_coins, 0)
+        FROM users
+        WHERE id NOT IN (SELECT user_id FROM currency_ledger)
+    """)
+
+
+def _m005_archive(conn):
+    """
+    已完成任务和已兑换奖励的归档表
+
+    tasks / rewards 增加完成时间 completed_at，超过一定时间的已完成记录由 archive.py
+    移动到 tasks_archive / rewards_archive，保留原来的ID
+    """
+    _add_missing_columns(conn, "tasks", [("completed_at", "TEXT")])
+    _add_missing_columns(conn, "rewards", [("completed_at", "TEXT")])
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS tasks_archive(
+        id INTEGER PRIMARY KEY,     -- 原 tasks 表中的ID
+        user_id INTEGER,
+        name TEXT,
+        xp_reward INTEGER,
+        platinum_reward INTEGER DEFAULT 0,
+        created_at TEXT,
+        completed_at TEXT,          -- 完成时间，旧数据没有记录时为创建时间
+        archived_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS rewards_archive(
+        id INTEGER PRIMARY KEY,     -- 原 rewards 表中的ID
+        user_id INTEGER,
+        name TEXT,
+        price INTEGER,
+        currency_type TEXT DEFAULT 'coins',
+        created_at TEXT,
+        completed_at TEXT,          -- 兑换时间，旧数据没有记录时为创建时间
+        archived_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    create_indexes(conn, {"tasks_archive", "rewards_archive"})
+
+
+# 全文索引：每项为 (索引表, 源表, 索引的列)
+# 使用外部内容表（content=源表），索引只保存分词结果，由触发器与源表保持同步
+SEARCH_INDEXES = [
+    ("tasks_fts", "tasks", ("name",)),
+    ("rewards_fts", "rewards", ("name",)),
+    ("repeat_tasks_fts", "repeat_tasks", ("name",)),
+    ("gacha_items_fts", "gacha_items", ("name", "description")),
+]
+
+
+def _m006_search_index(conn):
+    """
+    名称全文索引
+
+    trigram 分词按连续三个字符建索引，中文不需要分词也能做子串匹配。
+    当前 SQLite 没有编译 FTS5 时跳过，search.py 会退回到 LIKE 查询
+    """
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x, tokenize='trigram')")
+        conn.execute("DROP TABLE temp.fts5_probe")
+    except sqlite3.OperationalError:
+        print("当前 SQLite 不支持 FTS5 trigram 分词，跳过全文索引")
+        return
+
+    for fts_table, table, columns in SEARCH_INDEXES:
+        cols = ", ".join(columns)
+        conn.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table}
+            USING fts5({cols}, content='{table}', content_rowid='id', tokenize='trigram')
+        """)
+        _create_search_triggers(conn, fts_table, table, columns)
+        conn.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+
+
+def _create_search_triggers(conn, fts_table, table, columns):
+    """创建让全文索引跟随源表增删改的触发器"""
+    cols = ", ".join(columns)
+    old_values = ", ".join(f"old.{c}" for c in columns)
+    new_values = ", ".join(f"new.{c}" for c in columns)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts_table}(rowid, {cols}) VALUES (new.id, {new_values});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts_table}({fts_table}, rowid, {cols}) VALUES ('delete', old.id, {old_values});
+        END
+    """)
+    # 只有索引的列变化时才更新索引，完成任务等只改状态的更新不受影响
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF {cols} ON {table} BEGIN
+            INSERT INTO {fts_table}({fts_table}, rowid, {cols}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO {fts_table}(rowid, {cols}) VALUES (new.id, {new_values});
+        END
+    """)
+
+
+# 级联删除的外键：子表 -> [(外键列, 父表)]
+# 删除用户时，其任务、奖励、抽卡记录、账本和归档记录由 SQLite 一并删除；
+# 抽卡记录和奖品清单的 item_id 不设外键，删除奖池中的奖品不影响已有的抽卡记录和拥有情况
+CASCADE_FOREIGN_KEYS = {
+    "tasks": [("user_id", "users")],
+    "rewards": [("user_id", "users")],
+    "repeat_tasks": [("user_id", "users")],
+    "gacha_records": [("user_id", "users")],
+    "gacha_stats": [("user_id", "users")],
+    "currency_ledger": [("user_id", "users")],
+    "ledger_checkpoints": [("user_id", "users")],
+    "tasks_archive": [("user_id", "users")],
+    "rewards_archive": [("user_id", "users")],
+    "gacha_inventory": [("user_id", "users")],
+}
+
+# 外键子句连同前面的逗号一起去掉，逗号和子句之间可能隔着上一列的注释
+_FOREIGN_KEY_CLAUSE = re.compile(r",(?P<gap>(\s|--[^\n]*\n)*)FOREIGN\s+KEY\s*\(\s*\w+\s*\)\s*REFERENCES\s+\w+\s*\(\s*\w+\s*\)"
+                                 r"(\s+ON\s+(DELETE|UPDATE)\s+(CASCADE|SET\s+NULL|SET\s+DEFAULT|RESTRICT|NO\s+ACTION))*",
+                                 re.I)
+
+
+def _rebuild_foreign_keys(conn, table, foreign_keys):
+    """
+    按 SQLite 推荐的步骤重建表以修改外键：建新表、复制数据、删除旧表、改名
+
+    新表沿用旧表的建表语句（包括后来 ALTER 加上的列），外键子句全部换成 foreign_keys
+    中的级联外键（为空时去掉外键），行的ID和 AUTOINCREMENT 计数都保持不变；
+    完成后用 PRAGMA foreign_key_check 确认失效的外键正好是重建前就找不到父记录的那些行，
+    否则抛出 sqlite3.IntegrityError，由 migrate() 回滚
+    """
+    expected = Counter()
+    for column, parent in foreign_keys:
+        expected[parent] += conn.execute(
+            f"SELECT COUNT(*) FROM {table} WHERE {column} IS NOT NULL AND {column} NOT IN (SELECT id FROM {parent})"
+        ).fetchone()[0]
+
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone()[0]
+    sql = _FOREIGN_KEY_CLAUSE.sub(r"\g<gap>", sql)
+    clauses = "".join(f",\n    FOREIGN KEY({column}) REFERENCES {parent}(id) ON DELETE CASCADE"
+                      for column, parent in foreign_keys)
+    end = sql.rindex(")")
+    body, comment = sql[:end].rstrip(), ""
+    # 最后一列带注释时，逗号要加在注释前面
+    last_line = body.rfind("\n") + 1
+    if "--" in body[last_line:]:
+        split = body.index("--", last_line)
+        body, comment = body[:split].rstrip(), "  " + body[split:]
+    if clauses:
+        sql = body + clauses[:1] + comment + clauses[1:] + "\n" + sql[end:]
+    else:
+        sql = body + comment + "\n" + sql[end:]
+    new_table = f"{table}_rebuild"
+    # 改过名的表在 sqlite_master 中的表名带引号
+    sql = re.sub(rf'^CREATE TABLE\s+(IF NOT EXISTS\s+)?"?{table}\b"?', f"CREATE TABLE {new_table}", sql, flags=re.I)
+
+    sequence = None
+    if "AUTOINCREMENT" in sql.upper():
+        sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name=?", (table,)).fetchone()
+    conn.execute(sql)
+    conn.execute(f"INSERT INTO {new_table} SELECT * FROM {table}")
+    conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"ALTER TABLE {new_table} RENAME TO {table}")
+    if sequence is not None:
+        updated = conn.execute("UPDATE sqlite_sequence SET seq=MAX(seq, ?) WHERE name=?", (sequence[0], table))
+        if updated.rowcount == 0:
+            conn.execute("INSERT INTO sqlite_sequence(name, seq) VALUES(?, ?)", (table, sequence[0]))
+
+    found = Counter(row[2] for row in conn.execute(f"PRAGMA foreign_key_check({table})"))
+    if found != +expected:
+        raise sqlite3.IntegrityError(f"重建 {table} 后外键检查不一致: {dict(found)}，应为 {dict(+expected)}")
+
+
+def _m007_cascade_deletes(conn):
+    """
+    删除用户时级联删除其所有数据
+
+    旧表的外键没有 ON DELETE CASCADE（归档表没有外键），删除用户后会留下孤立的记录。
+    这里逐个重建子表，随表删除的索引和全文索引触发器随后重新创建；
+    已经存在的孤立记录原样保留，由 sweeper.py 在后台分批清理；
+    之后版本新增的表建表时就带着级联外键，这里还不存在，跳过
+    """
+    search_tables = {table: (fts_table, columns) for fts_table, table, columns in SEARCH_INDEXES}
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    for table, foreign_keys in CASCADE_FOREIGN_KEYS.items():
+        if table not in existing:
+            continue
+        _rebuild_foreign_keys(conn, table, foreign_keys)
+        fts_table, columns = search_tables.get(table, (None, None))
+        if fts_table in existing:
+            _create_search_triggers(conn, fts_table, table, columns)
+    create_indexes(conn, set(CASCADE_FOREIGN_KEYS) & existing)
+
+
+def backfill_gacha_inventory(conn, skip_orphans=True):
+    """
+    按抽卡记录补齐 gacha_inventory 中还没有的 (用户, 奖品)
+
+    参数:
+        skip_orphans (bool): 跳过用户已被删除的记录（分库的用户库中没有 users，传 False）
+    """
+    where = "WHERE user_id IN (SELECT id FROM users)" if skip_orphans else ""
+    conn.execute(f"""
+        INSERT OR IGNORE INTO gacha_inventory(user_id, item_id, count, first_drawn_at)
+        SELECT user_id, item_id, COUNT(*), MIN(draw_time) FROM gacha_records
+        {where}
+        GROUP BY user_id, item_id
+    """)
+
+
+def _m008_gacha_inventory(conn):
+    """
+    抽卡获得的奖品清单
+
+    判断重复获得原本要在全部抽卡记录中 COUNT(*)，记录越多越慢；
+    gacha_inventory 按 (用户, 奖品) 记录获得次数，与抽卡记录在同一个事务中更新，
+    判断重复只需一次主键查找。已有的抽卡记录在这里汇总写入；
+    与 gacha_records 一样只随用户级联删除，从奖池删除奖品不影响已获得的记录
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS gacha_inventory(
+        user_id INTEGER NOT NULL,
+        item_id INTEGER NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,  -- 获得次数
+        first_drawn_at TEXT,               -- 第一次抽到的时间
+        PRIMARY KEY(user_id, item_id),
+        FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+    ) WITHOUT ROWID
+    """)
+    backfill_gacha_inventory(conn)
+
+
+def _m009_gacha_pool_version(conn):
+    """
+    奖池版本计数
+
+    gacha_pool_version 只有一行，gacha_items 每次增删改都由触发器把 version 加一；
+    奖池缓存发现其他连接提交过之后只读这一行，就能知道奖池本身有没有变
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS gacha_pool_version(
+        id INTEGER PRIMARY KEY CHECK(id = 1),
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    conn.execute("INSERT OR IGNORE INTO gacha_pool_version(id, version) VALUES(1, 0)")
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS gacha_items_version_{event.lower()} AFTER {event} ON gacha_items
+        BEGIN
+            UPDATE gacha_pool_version SET version = version + 1 WHERE id = 1;
+        END
+        """)
+
+
+# 分库布局（shards.py）：公共库只保存用户和奖池，其余的表按用户拆到各自的文件中
+CATALOG_TABLES = ("users", "gacha_items", "gacha_pool_version")
+SHARD_TABLES = tuple(CASCADE_FOREIGN_KEYS)
+
+
+def apply_layout(conn, role):
+    """
+    把迁移到最新版本的完整数据库裁剪为分库布局中的公共库或用户库
+
+    用户库的表和 users、gacha_items 不在同一个文件中，SQLite 不支持跨文件的外键，
+    所以用户库的表重建时去掉外键，删除用户时直接删除整个文件
+
+    参数:
+        conn (sqlite3.Connection): 已关闭外键约束、处于事务中的连接
+        role (str): "catalog" 为公共库，"shard" 为用户库（同时清空默认数据）
+    """
+    search_tables = {table: (fts_table, columns) for fts_table, table, columns in SEARCH_INDEXES}
+    for table in (SHARD_TABLES if role == "catalog" else CATALOG_TABLES):
+        if table in search_tables:
+            conn.execute(f"DROP TABLE IF EXISTS {search_tables[table][0]}")
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+    if role != "shard":
+        return
+
+    for table in SHARD_TABLES:
+        conn.execute(f"DELETE FROM {table}")
+        _rebuild_foreign_keys(conn, table, [])
+        if table in search_tables:
+            fts_table, columns = search_tables[table]
+            _create_search_triggers(conn, fts_table, table, columns)
+    conn.execute("DELETE FROM sqlite_sequence")
+    create_indexes(conn, set(SHARD_TABLES))
+
+
+# 每项为 (版本号, 说明, 迁移函数)，版本号必须连续递增
+MIGRATIONS = [
+    (1, "基础表结构", _m001_base_schema),
+    (2, "列表查询索引", _m002_indexes),
+    (3, "默认用户、重复任务和奖池", _m003_default_data),
+    (4, "货币账本", _m004_currency_ledger),
+    (5, "已完成记录归档", _m005_archive),
+    (6, "名称全文索引", _m006_search_index),
+    (7, "删除用户时级联删除", _m007_cascade_deletes),
+    (8, "抽卡奖品清单", _m008_gacha_inventory),
+    (9, "奖池版本计数", _m009_gacha_pool_version),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    """读取数据库当前的结构版本（PRAGMA user_version）"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """
+    把数据库升级到 SCHEMA_VERSION
+
+    所有待执行的迁移在同一个 IMMEDIATE 事务中完成，失败时整体回滚
+
+    参数:
+        conn (sqlite3.Connection): 数据库连接，调用时不能处于事务中
+
+    返回:
+        int: 本次执行的迁移数量，已是最新版本时为 0
+    """
+    if get_schema_version(conn) >= SCHEMA_VERSION:
+        return 0
+
+    # 重建表时要关闭外键约束（只能在事务外切换），否则删除旧表会触发级联删除
+    foreign_keys = conn.execute("PRAGMA foreign_keys").fetchone()[0]
+    conn.execute("PRAGMA foreign_keys=OFF")
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # 拿到写锁后重新读取版本，其他进程可能已经完成了升级
+        current = get_schema_version(conn)
+        pending = [m for m in MIGRATIONS if m[0] > current]
+        for version, description, func in pending:
+            func(conn)
+            print(f"已应用数据库迁移 v{version}: {description}")
+        if pending:
+            conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute(f"PRAGMA foreign_keys={foreign_keys}")
+    return len(pending)
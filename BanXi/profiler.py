@@ -0,0 +1,322 @@
+"""
+查询耗时统计（调试用，默认关闭）
+
+设置环境变量 BANXI_PROFILE=1 启动程序，或在代码中调用 enable() 后：
+
+- 每条 SQL 语句：执行次数、耗时分布（含取结果的时间）和返回/影响的行数
+- db.py、repeat_tasks.py、gacha_fixed.py 中的每个公开函数：调用次数和耗时分布
+- 事务：通过 set_trace_callback 观察 BEGIN 到 COMMIT/ROLLBACK 之间持有事务的时间
+
+统计结果可以在开发者模式的"性能统计"面板中查看，退出程序时写入 JSON 文件
+（默认当前目录下的 banxi-profile-时间.json，可用 BANXI_PROFILE_FILE 指定）。
+"""
+
+import atexit
+import functools
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import db
+
+PROFILED_MODULES = ("db", "repeat_tasks", "gacha_fixed")  # 包装公开函数的模块
+# 耗时分布的区间上限（毫秒），最后一档为无穷大
+HISTOGRAM_BOUNDS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, float("inf"))
+
+_lock = threading.Lock()
+_state = {"enabled": False, "dump_path": None, "originals": {}}
+_statements = {}
+_functions = {}
+_transactions = {}
+
+
+class LatencyStats:
+    """一个统计项的耗时分布"""
+
+    __slots__ = ("count", "total", "max", "rows", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.buckets = [0] * len(HISTOGRAM_BOUNDS_MS)
+
+    def add(self, seconds, rows=0):
+        ms = seconds * 1000
+        self.count += 1
+        self.total += ms
+        self.rows += rows
+        if ms > self.max:
+            self.max = ms
+        for i, bound in enumerate(HISTOGRAM_BOUNDS_MS):
+            if ms <= bound:
+                self.buckets[i] += 1
+                break
+
+    def percentile(self, fraction):
+        """按分布区间估算分位数（返回所在区间的上限，最后一档用最大值）"""
+        target = self.count * fraction
+        seen = 0
+        for bound, n in zip(HISTOGRAM_BOUNDS_MS, self.buckets):
+            seen += n
+            if n and seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total_ms": round(self.total, 3),
+            "avg_ms": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(0.5), 3),
+            "p95_ms": round(self.percentile(0.95), 3),
+            "max_ms": round(self.max, 3),
+            "rows": self.rows,
+            "histogram": {_bucket_label(bound): n for bound, n in zip(HISTOGRAM_BOUNDS_MS, self.buckets)},
+        }
+
+
+def _bucket_label(bound):
+    return f"<={bound:g}ms" if bound != float("inf") else ">1000ms"
+
+
+def _record(table, key, seconds, rows=0):
+    with _lock:
+        stats = table.get(key)
+        if stats is None:
+            stats = table[key] = LatencyStats()
+        stats.add(seconds, rows)
+
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _normalize(sql):
+    """合并空白，让同一条语句的不同缩进算作一项"""
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """记录每条语句从执行到取完结果的耗时和行数"""
+
+    _sql = None
+    _elapsed = 0.0
+    _rows = 0
+
+    def _finish(self):
+        if self._sql is not None:
+            rows = self._rows or max(self.rowcount, 0)
+            _record(_statements, self._sql, self._elapsed, rows)
+            self._sql = None
+
+    def _timed(self, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self._elapsed += time.perf_counter() - start
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        self._sql, self._elapsed, self._rows = _normalize(sql), 0.0, 0
+        self._timed(super().execute, sql, parameters)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        self._sql, self._elapsed, self._rows = _normalize(sql), 0.0, 0
+        self._timed(super().executemany, sql, seq_of_parameters)
+        return self
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is not None:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, self.arraysize if size is None else size)
+        self._rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self._rows += len(rows)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        row = self._timed(super().__next__)
+        self._rows += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+
+class ProfiledConnection(db.PooledConnection):
+    """统计模式下连接池使用的连接：语句经过 ProfiledCursor，事务边界通过 trace 回调观察"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._txn_start = None
+        self._txn_kind = None
+        self.set_trace_callback(self._on_trace)
+
+    def _on_trace(self, statement):
+        head = statement.lstrip()[:8].upper()
+        if head.startswith("BEGIN"):
+            self._txn_start = time.perf_counter()
+            self._txn_kind = _normalize(statement).upper()
+        elif (head.startswith("COMMIT") or head.startswith("ROLLBACK")) and self._txn_start is not None:
+            outcome = "COMMIT" if head.startswith("COMMIT") else "ROLLBACK"
+            _record(_transactions, f"{self._txn_kind} -> {outcome}", time.perf_counter() - self._txn_start)
+            self._txn_start = None
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def _wrap(name, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = None
+        try:
+            result = func(*args, **kwargs)
+            return result
+        finally:
+            # 返回列表的函数（get_tasks 等）同时记录返回的行数
+            rows = len(result) if isinstance(result, list) else 0
+            _record(_functions, name, time.perf_counter() - start, rows)
+
+    wrapper.__profiled__ = func
+    return wrapper
+
+
+def is_enabled():
+    return _state["enabled"]
+
+
+def enable(dump_path=None):
+    """
+    开启统计
+
+    需要在 window 等模块用 from ... import 导入这些函数之前调用，否则它们拿到的是未包装的函数
+
+    参数:
+        dump_path (str, optional): 退出时写入统计结果的 JSON 文件路径，None 表示不写入
+    """
+    if _state["enabled"]:
+        return
+    import importlib
+
+    db.CONNECTION_FACTORY = ProfiledConnection
+    db.close_db_connections()  # 之后新建的连接才会带上统计
+
+    for module_name in PROFILED_MODULES:
+        module = importlib.import_module(module_name)
+        for name, obj in list(vars(module).items()):
+            if (name.startswith("_") or not callable(obj) or isinstance(obj, type)
+                    or getattr(obj, "__module__", None) != module_name):
+                continue
+            _state["originals"][(module, name)] = obj
+            setattr(module, name, _wrap(f"{module_name}.{name}", obj))
+
+    _state["enabled"] = True
+    _state["dump_path"] = dump_path
+
+
+def disable():
+    """关闭统计并还原被包装的函数（已有的统计结果保留）"""
+    if not _state["enabled"]:
+        return
+    for (module, name), func in _state["originals"].items():
+        setattr(module, name, func)
+    _state["originals"].clear()
+    db.CONNECTION_FACTORY = db.PooledConnection
+    db.close_db_connections()
+    _state["enabled"] = False
+    _state["dump_path"] = None
+
+
+def install_from_env():
+    """环境变量 BANXI_PROFILE 为 1 时开启统计，并在退出时写入 JSON 文件"""
+    if os.environ.get("BANXI_PROFILE", "") not in ("1", "true", "yes"):
+        return False
+    path = os.environ.get("BANXI_PROFILE_FILE") or \
+        f"banxi-profile-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    enable(path)
+    atexit.register(_dump_on_exit)
+    print(f"已开启查询耗时统计，退出时写入 {path}")
+    return True
+
+
+def reset():
+    """清空已有的统计结果"""
+    with _lock:
+        _statements.clear()
+        _functions.clear()
+        _transactions.clear()
+
+
+def get_report():
+    """
+    返回统计结果
+
+    返回:
+        dict: statements / functions / transactions，各项按总耗时从高到低排列
+    """
+    with _lock:
+        sections = {"statements": _statements, "functions": _functions, "transactions": _transactions}
+        return {
+            section: {key: stats.to_dict()
+                      for key, stats in sorted(table.items(), key=lambda item: -item[1].total)}
+            for section, table in sections.items()
+        }
+
+
+def dump(path):
+    """把统计结果写入 JSON 文件"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(get_report(), f, ensure_ascii=False, indent=2)
+
+
+def _dump_on_exit():
+    if _state["dump_path"]:
+        try:
+            dump(_state["dump_path"])
+            print(f"查询耗时统计已写入 {_state['dump_path']}")
+        except OSError as e:
+            print(f"写入查询耗时统计失败: {e}")
+
+
+def format_report(limit=20):
+    """把统计结果格式化为文本表格，供调试面板显示"""
+    report = get_report()
+    titles = {"functions": "函数", "statements": "SQL 语句", "transactions": "事务持有时间"}
+    lines = []
+    for section in ("functions", "statements", "transactions"):
+        entries = list(report[section].items())
+        lines.append(f"== {titles[section]}（共 {len(entries)} 项，按总耗时排序）==")
+        lines.append(f"{'次数':>6} {'总计ms':>10} {'平均ms':>8} {'p95ms':>8} {'最大ms':>8} {'行数':>8}  名称")
+        for key, s in entries[:limit]:
+            name = key if len(key) <= 100 else key[:97] + "..."
+            lines.append(f"{s['count']:>6} {s['total_ms']:>10.2f} {s['avg_ms']:>8.2f} {s['p95_ms']:>8.2f} "
+                         f"{s['max_ms']:>8.2f} {s['rows']:>8}  {name}")
+        lines.append("")
+    return "\n".join(lines)
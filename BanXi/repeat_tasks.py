@@ -1,65 +1,24 @@
 import sqlite3
-from db import get_db_connection
+
+import reward_engine
+from db import get_db_connection, change_balance, fetch_page, PAGE_SIZE
+
+# 默认重复任务，新数据库初始化时为每个用户添加
+DEFAULT_REPEAT_TASKS = [
+    # 格式: (任务名称, 经验奖励, 最大完成次数)
+    ("0点前睡", 90, 1),  # 每日一次
+    ("9点前进入学习", 190, 1),  # 每日一次
+    ("一个番茄钟认真学习", 90, 0),  # 无限次
+    ("一个番茄钟普通学习", 50, 0),  # 每日一次
+]
 
 # -------------------------
 # 初始化重复任务表
 # -------------------------
 def init_repeat_tasks_table():
-    conn = get_db_connection()
-    c = conn.cursor()
-
-    # 创建重复任务表
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS repeat_tasks(
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER,
-        name TEXT,
-        xp_reward INTEGER,
-        platinum_reward INTEGER DEFAULT 0,
-        max_completions INTEGER,
-        current_completions INTEGER DEFAULT 0,
-        completed INTEGER DEFAULT 0,
-        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY(user_id) REFERENCES users(id)
-    )
-    """)
-
-    conn.commit()
-
-    # 迁移：为现有重复任务添加 platinum_reward 列（如果不存在）
-    try:
-        c.execute("SELECT platinum_reward FROM repeat_tasks LIMIT 1")
-    except sqlite3.OperationalError:
-        c.execute("ALTER TABLE repeat_tasks ADD COLUMN platinum_reward INTEGER DEFAULT 0")
-        conn.commit()
-        print("已添加 platinum_reward 列到 repeat_tasks 表")
-
-    # 检查是否已有重复任务，如果没有则添加默认任务
-    c.execute("SELECT COUNT(*) FROM repeat_tasks")
-    count = c.fetchone()[0]
-
-    if count == 0:
-        # 为每个用户添加默认的重复任务
-        users = c.execute("SELECT id FROM users").fetchall()
-
-        default_tasks = [
-            # 格式: (任务名称, 经验奖励, 最大完成次数)
-            ("0点前睡", 90, 1),  # 每日一次
-            ("9点前进入学习", 190, 1),  # 每日一次
-            ("一个番茄钟认真学习", 90, 0),  # 无限次
-            ("一个番茄钟普通学习", 50, 0),  # 每日一次
-        ]
-
-        for user_id, in users:
-            for name, xp_reward, max_completions in default_tasks:
-                c.execute("""
-                    INSERT INTO repeat_tasks(user_id, name, xp_reward, max_completions) 
-                    VALUES(?,?,?,?)
-                """, (user_id, name, xp_reward, max_completions))
-
-        conn.commit()
-        print(f"已为 {len(users)} 个用户添加 {len(default_tasks)} 个默认重复任务")
-    conn.close()
+    # 重复任务表由 migrations 统一创建，这里只确保数据库已是最新版本
+    from db import init_db
+    init_db()
 
 # -------------------------
 # 添加重复任务
@@ -90,13 +49,35 @@ def get_repeat_tasks(user_id):
     conn.close()
     return rows
 
+# -------------------------
+# 分页获取重复任务列表，返回 (任务列表, 下一页的游标)
+# -------------------------
+def get_repeat_tasks_page(user_id, after=None, limit=PAGE_SIZE):
+    conn = get_db_connection()
+    page = fetch_page(conn, "repeat_tasks",
+                      "id, name, xp_reward, platinum_reward, max_completions, current_completions, completed",
+                      user_id, after, limit)
+    conn.close()
+    return page
+
+# -------------------------
+# 获取单个重复任务信息
+# -------------------------
+def get_repeat_task(task_id):
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("""
+        SELECT name, xp_reward, platinum_reward, max_completions, current_completions, completed
+        FROM repeat_tasks WHERE id=?
+    """, (task_id,))
+    row = c.fetchone()
+    conn.close()
+    return row
+
 # -------------------------
 # 完成重复任务逻辑
 # -------------------------
 def complete_repeat_task(task_id):
-    import random
-    from db import get_user, update_user, get_xp_required_for_level  # 添加导入
-
     conn = get_db_connection()
     c = conn.cursor()
 
@@ -124,66 +105,34 @@ def complete_repeat_task(task_id):
     if max_completions > 0 and new_completions >= max_completions:
         new_completed = 1
 
+    # 以读到的完成次数为守卫，并发完成同一任务时只有一次生效
     c.execute("""
         UPDATE repeat_tasks 
         SET current_completions=?, completed=? 
-        WHERE id=?
-    """, (new_completions, new_completed, task_id))
+        WHERE id=? AND current_completions=? AND completed=0
+    """, (new_completions, new_completed, task_id, current_completions))
+    if c.rowcount == 0:
+        conn.close()
+        return None
 
     # 获取用户当前数据
-    c.execute("SELECT xp, level, coins, platinum_coins FROM users WHERE id=?", (user_id,))
+    c.execute("SELECT xp, level FROM users WHERE id=?", (user_id,))
     u = c.fetchone()
     if u is None:
         conn.commit()
         conn.close()
         return None
 
-    cur_xp, level, coins, platinum_coins = u
-    new_xp = cur_xp + xp_reward
-
-    # 添加任务完成时的铂金币奖励
-    platinum_coins += task_platinum_reward
-
-    # 修复：使用线性增长公式
-    xp_needed = get_xp_required_for_level(level)
-    gained_coins = 0
-    gained_platinum = task_platinum_reward  # 初始化为任务奖励的铂金币
-    leveled = 0
-    level_up_rewards = []
-
-    while new_xp >= xp_needed:
-        new_xp -= xp_needed
-        level += 1
-        leveled += 1
-
-        base_reward = xp_needed
-        min_multiplier = 0.8
-        max_multiplier = 1.5
-        random_multiplier = random.uniform(min_multiplier, max_multiplier)
-        reward = int(base_reward * random_multiplier)
-
-        coins += reward
-        gained_coins += reward
-
-        # 每2级奖励1个铂金币
-        if level % 2 == 0:
-            platinum_coins += 1
-            gained_platinum += 1
-
-        level_up_rewards.append({
-            "from_level": level - 1,
-            "to_level": level,
-            "base_reward": base_reward,
-            "random_multiplier": round(random_multiplier, 2),
-            "actual_reward": reward,
-            "platinum_reward": 1 if level % 2 == 0 else 0
-        })
-
-        # 修复：使用线性增长公式计算下一级所需经验
-        xp_needed = get_xp_required_for_level(level)
-
-    c.execute("UPDATE users SET xp=?, level=?, coins=?, platinum_coins=? WHERE id=?",
-              (new_xp, level, coins, platinum_coins, user_id))
+    cur_xp, level = u
+
+    # 结算经验和升级奖励，任务自带的铂金币奖励另外累加
+    outcome = reward_engine.apply_xp(level, cur_xp, xp_reward)
+    gained_coins = outcome["coins_gained"]
+    gained_platinum = task_platinum_reward + outcome["platinum_gained"]
+
+    change_balance(conn, user_id, coins=gained_coins, platinum=gained_platinum,
+                   xp=outcome["xp"], level=outcome["level"],
+                   reason="repeat_task", ref_id=task_id, xp_gained=xp_reward)
     conn.commit()
     conn.close()
 
@@ -191,15 +140,16 @@ def complete_repeat_task(task_id):
         "user_id": user_id,
         "task_name": name,
         "xp": xp_reward,
-        "leveled": leveled,
+        "leveled": outcome["leveled"],
         "coins_gained": gained_coins,
         "platinum_gained": gained_platinum,
-        "new_level": level,
-        "new_xp": new_xp,
+        "new_level": outcome["level"],
+        "new_xp": outcome["xp"],
         "completion_count": new_completions,
         "max_completions": max_completions,
         "is_fully_completed": new_completed,
-        "level_up_details": level_up_rewards
+        "level_up_details": outcome["level_up_details"],
+        "level_up_details_omitted": outcome["level_up_details_omitted"]
     }
 
 # -------------------------
@@ -226,9 +176,6 @@ def complete_repeat_task_multiple_times(task_id, times):
         """
         多次完成重复任务
         """
-        import random
-        from db import get_user, update_user, get_xp_required_for_level
-
         conn = get_db_connection()
         c = conn.cursor()
 
@@ -270,64 +217,34 @@ def complete_repeat_task_multiple_times(task_id, times):
         c.execute("""
             UPDATE repeat_tasks 
             SET current_completions=?, completed=? 
-            WHERE id=?
-        """, (new_completions, new_completed, task_id))
+            WHERE id=? AND current_completions=? AND completed=0
+        """, (new_completions, new_completed, task_id, current_completions))
+        if c.rowcount == 0:
+            conn.close()
+            return None
 
         # 获取用户当前数据
-        c.execute("SELECT xp, level, coins, platinum_coins FROM users WHERE id=?", (user_id,))
+        c.execute("SELECT xp, level FROM users WHERE id=?", (user_id,))
         u = c.fetchone()
         if u is None:
             conn.commit()
             conn.close()
             return None
 
-        cur_xp, level, coins, platinum_coins = u
+        cur_xp, level = u
         total_xp_gained = xp_reward * times
-        new_xp = cur_xp + total_xp_gained
 
-        # 添加任务完成时的铂金币奖励（乘以完成次数）
+        # 任务完成时的铂金币奖励（乘以完成次数）
         total_task_platinum = task_platinum_reward * times
-        platinum_coins += total_task_platinum
-
-        # 计算升级逻辑
-        xp_needed = get_xp_required_for_level(level)
-        gained_coins = 0
-        gained_platinum = total_task_platinum  # 初始化为任务奖励的铂金币
-        leveled = 0
-        level_up_rewards = []
-
-        while new_xp >= xp_needed:
-            new_xp -= xp_needed
-            level += 1
-            leveled += 1
-
-            base_reward = xp_needed
-            min_multiplier = 0.8
-            max_multiplier = 1.5
-            random_multiplier = random.uniform(min_multiplier, max_multiplier)
-            reward = int(base_reward * random_multiplier)
-
-            coins += reward
-            gained_coins += reward
-
-            # 每2级奖励1个铂金币
-            if level % 2 == 0:
-                platinum_coins += 1
-                gained_platinum += 1
-
-            level_up_rewards.append({
-                "from_level": level - 1,
-                "to_level": level,
-                "base_reward": base_reward,
-                "random_multiplier": round(random_multiplier, 2),
-                "actual_reward": reward,
-                "platinum_reward": 1 if level % 2 == 0 else 0
-            })
-
-            xp_needed = get_xp_required_for_level(level)
-
-        c.execute("UPDATE users SET xp=?, level=?, coins=?, platinum_coins=? WHERE id=?",
-                  (new_xp, level, coins, platinum_coins, user_id))
+
+        # 一次性结算全部经验，升级次数再多也不需要逐级循环
+        outcome = reward_engine.apply_xp(level, cur_xp, total_xp_gained)
+        gained_coins = outcome["coins_gained"]
+        gained_platinum = total_task_platinum + outcome["platinum_gained"]
+
+        change_balance(conn, user_id, coins=gained_coins, platinum=gained_platinum,
+                       xp=outcome["xp"], level=outcome["level"],
+                       reason="repeat_task", ref_id=task_id, xp_gained=total_xp_gained)
         conn.commit()
         conn.close()
 
@@ -337,13 +254,14 @@ def complete_repeat_task_multiple_times(task_id, times):
             "times_completed": times,
             "total_xp": total_xp_gained,
             "xp_per_completion": xp_reward,
-            "leveled": leveled,
+            "leveled": outcome["leveled"],
             "coins_gained": gained_coins,
             "platinum_gained": gained_platinum,
-            "new_level": level,
-            "new_xp": new_xp,
+            "new_level": outcome["level"],
+            "new_xp": outcome["xp"],
             "completion_count": new_completions,
             "max_completions": max_completions,
             "is_fully_completed": new_completed,
-            "level_up_details": level_up_rewards
+            "level_up_details": outcome["level_up_details"],
+            "level_up_details_omitted": outcome["level_up_details_omitted"]
         }
\ No newline at end of file
@@ -0,0 +1,147 @@
+"""
+升级奖励引擎
+
+complete_task、complete_repeat_task 等所有发放经验的路径共用这里的结算逻辑。
+升级所需经验是等差数列 100 + (等级-1) * 19，连续升 k 级所需的总经验有闭式解，
+因此最终等级和剩余经验可以直接算出，不必逐级循环；每级的金币倍率一次性批量抽取。
+"""
+
+import math
+import random
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖，缺失时退回标准库逐个抽取倍率
+    np = None
+
+BASE_XP = 100  # 1 级升级所需经验
+XP_STEP = 19  # 每升一级所需经验的增量
+MIN_COIN_MULTIPLIER = 0.8  # 升级金币奖励的随机倍率下限
+MAX_COIN_MULTIPLIER = 1.5  # 升级金币奖励的随机倍率上限
+PLATINUM_LEVEL_INTERVAL = 2  # 每到达 2 的倍数等级奖励 1 个铂金币
+MAX_LEVEL_UP_DETAILS = 50  # 结果中最多保留的逐级详情条数
+
+_rng = np.random.default_rng() if np is not None else None
+
+
+def xp_required_for_level(level):
+    """
+    计算指定等级升级所需经验值
+
+    参数:
+        level (int): 当前等级
+
+    返回:
+        int: 升级所需经验值
+    """
+    return int(BASE_XP + (level - 1) * XP_STEP)
+
+
+def xp_for_levels(level, count):
+    """
+    从 level 级连续升 count 级所需的总经验（等差数列求和）
+
+    参数:
+        level (int): 起始等级
+        count (int): 升级次数
+
+    返回:
+        int: 所需总经验
+    """
+    return count * xp_required_for_level(level) + XP_STEP * count * (count - 1) // 2
+
+
+def levels_affordable(level, xp):
+    """
+    计算 xp 点经验最多能从 level 级连续升几级
+
+    解不等式 19k² + (2a - 19)k - 2xp <= 0（a 为当前等级所需经验），
+    用整数平方根求近似解后再做一次校正，避免浮点误差
+
+    参数:
+        level (int): 当前等级
+        xp (int): 可用经验（当前经验 + 新获得经验）
+
+    返回:
+        int: 可以升级的次数
+    """
+    if xp <= 0:
+        return 0
+    first = xp_required_for_level(level)
+    if XP_STEP == 0:
+        return xp // first
+
+    b = 2 * first - XP_STEP
+    count = max(0, (math.isqrt(b * b + 8 * XP_STEP * xp) - b) // (2 * XP_STEP))
+    while xp_for_levels(level, count + 1) <= xp:
+        count += 1
+    while count > 0 and xp_for_levels(level, count) > xp:
+        count -= 1
+    return count
+
+
+def _draw_multipliers(count):
+    """一次性抽取 count 个升级金币倍率"""
+    if _rng is not None:
+        return _rng.uniform(MIN_COIN_MULTIPLIER, MAX_COIN_MULTIPLIER, count)
+    return [random.uniform(MIN_COIN_MULTIPLIER, MAX_COIN_MULTIPLIER) for _ in range(count)]
+
+
+def apply_xp(level, xp, xp_gained):
+    """
+    结算获得的经验：计算升级次数、剩余经验和升级奖励
+
+    参数:
+        level (int): 当前等级
+        xp (int): 当前等级内已有经验
+        xp_gained (int): 本次获得的经验
+
+    返回:
+        dict: 结算结果，包含新等级、剩余经验、升级金币和铂金币奖励，
+              以及最多 MAX_LEVEL_UP_DETAILS 条逐级详情
+    """
+    total_xp = xp + xp_gained
+    leveled = levels_affordable(level, total_xp)
+    new_level = level + leveled
+    new_xp = total_xp - xp_for_levels(level, leveled)
+
+    coins_gained = 0
+    details = []
+    if leveled:
+        multipliers = _draw_multipliers(leveled)
+        if np is not None:
+            bases = xp_required_for_level(level) + XP_STEP * np.arange(leveled, dtype=np.int64)
+            rewards = (bases * multipliers).astype(np.int64)  # 与 int() 一样向零取整
+            coins_gained = int(rewards.sum())
+            shown = zip(bases[:MAX_LEVEL_UP_DETAILS].tolist(),
+                        multipliers[:MAX_LEVEL_UP_DETAILS].tolist(),
+                        rewards[:MAX_LEVEL_UP_DETAILS].tolist())
+        else:
+            bases = [xp_required_for_level(level + i) for i in range(leveled)]
+            rewards = [int(base * m) for base, m in zip(bases, multipliers)]
+            coins_gained = sum(rewards)
+            shown = zip(bases[:MAX_LEVEL_UP_DETAILS], multipliers, rewards)
+
+        for i, (base, multiplier, reward) in enumerate(shown):
+            to_level = level + i + 1
+            details.append({
+                "from_level": to_level - 1,
+                "to_level": to_level,
+                "base_reward": base,
+                "random_multiplier": round(multiplier, 2),
+                "actual_reward": reward,
+                "platinum_reward": 1 if to_level % PLATINUM_LEVEL_INTERVAL == 0 else 0
+            })
+
+    # 区间 (level, new_level] 内 2 的倍数的个数
+    platinum_gained = new_level // PLATINUM_LEVEL_INTERVAL - level // PLATINUM_LEVEL_INTERVAL
+
+    return {
+        "level": new_level,
+        "xp": new_xp,
+        "leveled": leveled,
+        "coins_gained": coins_gained,
+        "platinum_gained": platinum_gained,
+        "level_up_details": details,
+        "level_up_details_omitted": leveled - len(details)
+    }
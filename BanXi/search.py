@@ -0,0 +1,92 @@
+"""
+名称搜索
+
+任务、重复任务、奖励的名称和奖池物品的名称/描述建有 FTS5 全文索引（迁移 v6），
+由触发器与源表同步。索引使用 trigram 分词，中文不需要额外分词：
+三个字符及以上的查询走索引，几十万条记录也只需几毫秒；
+一两个字符的查询无法用 trigram 匹配，退回到只扫描当前用户记录的 LIKE 查询。
+"""
+
+import db
+
+SEARCH_LIMIT = 20  # 每类最多返回的条数
+MIN_INDEXED_LENGTH = 3  # trigram 索引能匹配的最短查询
+
+# 搜索的数据：类别 -> (索引表, 源表, 返回的列, 匹配的列, 是否按用户过滤)
+SEARCH_SOURCES = {
+    "tasks": ("tasks_fts", "tasks", ("id", "name", "completed"), ("name",), True),
+    "repeat_tasks": ("repeat_tasks_fts", "repeat_tasks", ("id", "name", "completed"), ("name",), True),
+    "gacha_items": ("gacha_items_fts", "gacha_items", ("id", "name", "star", "description"),
+                    ("name", "description"), False),
+    "rewards": ("rewards_fts", "rewards", ("id", "name", "completed"), ("name",), True),
+}
+
+
+def _has_index(conn, fts_table):
+    # table_info 会查找所有 ATTACH 的库，分库布局下索引在用户库中
+    row = conn.execute("SELECT 1 FROM pragma_table_info(?)", (fts_table,)).fetchone()
+    return row is not None
+
+
+def _match_query(text):
+    """把输入转为 FTS5 短语查询，引号和运算符都按普通字符处理"""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _like_pattern(text):
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _search_source(conn, kind, user_id, text, limit, use_index):
+    fts_table, table, columns, match_columns, per_user = SEARCH_SOURCES[kind]
+    select = ", ".join(f"s.{c}" for c in columns)
+    user_filter = " AND s.user_id=?" if per_user else ""
+    user_params = [user_id] if per_user else []
+
+    if use_index:
+        # 按 rowid 从新到旧返回，凑满 limit 条即可停止，不需要对所有匹配项排序
+        query = f"""
+            SELECT {select} FROM {fts_table} f JOIN {table} s ON s.id=f.rowid
+            WHERE {fts_table} MATCH ?{user_filter}
+            ORDER BY f.rowid DESC LIMIT ?
+        """
+        params = [_match_query(text)] + user_params + [limit]
+    else:
+        pattern = _like_pattern(text)
+        condition = " OR ".join(f"s.{c} LIKE ? ESCAPE '\\'" for c in match_columns)
+        query = f"""
+            SELECT {select} FROM {table} s
+            WHERE ({condition}){user_filter}
+            ORDER BY s.id DESC LIMIT ?
+        """
+        params = [pattern] * len(match_columns) + user_params + [limit]
+    return conn.execute(query, params).fetchall()
+
+
+def search(user_id, text, limit=SEARCH_LIMIT):
+    """
+    按名称搜索当前用户的任务、重复任务、奖励以及奖池物品
+
+    参数:
+        user_id (int): 用户ID
+        text (str): 搜索内容，匹配名称中的任意位置，不区分英文大小写
+        limit (int): 每类最多返回的条数
+
+    返回:
+        dict: tasks / repeat_tasks / gacha_items / rewards -> 匹配的记录列表（最新的在前），
+              text 为空时各类均为空列表
+    """
+    text = text.strip()
+    results = {kind: [] for kind in SEARCH_SOURCES}
+    if not text:
+        return results
+
+    conn = db.get_db_connection()
+    try:
+        for kind, (fts_table, *_rest) in SEARCH_SOURCES.items():
+            use_index = len(text) >= MIN_INDEXED_LENGTH and _has_index(conn, fts_table)
+            results[kind] = _search_source(conn, kind, user_id, text, limit, use_index)
+    finally:
+        conn.close()
+    return results
@@ -0,0 +1,349 @@
+"""
+按用户分库（可选布局）
+
+默认所有用户共用一个 data.db，一个用户的抽卡记录会拖慢其他用户的扫描，所有写入也争用同一把锁。
+分库布局下公共库 catalog.db 只保存 users 和 gacha_items，每个用户的任务、奖励、抽卡记录、
+账本和归档保存在各自的 user-<ID>.db 中。
+
+切换用户时（db.use_user_shard），各线程的连接在下一次取用时把该用户的文件 ATTACH 为 shard。
+SQL 中的表名不需要加前缀：公共库中没有的表会在 shard 中找到，所以 db.py 等模块的查询不用修改，
+只会读到当前用户的页，写入也只锁当前用户的文件。删除用户就是删除文件，单个用户的备份就是复制文件。
+
+注意：用户库的表只对当前用户有效，操作其他用户的任务、账本前要先切换用户；
+改其他用户的余额会抛出 ValueError（见 db.check_shard_user），而不是把账本写进当前用户的文件。
+公共库和用户库都使用回滚日志（见 db.SHARD_STORAGE_OVERRIDES）而不是 WAL，
+同时写两个文件的事务（如改余额同时记账）由 super-journal 保证一起提交或一起回滚。
+
+开启方式：设置环境变量 BANXI_SHARDS=1（或用 BANXI_SHARD_DIR 指定目录），或在代码中调用 enable()。
+目录中还没有公共库时，会把当前的 DB_FILE 拆分过去，原文件保留不动。
+"""
+
+import os
+import shutil
+import sqlite3
+import threading
+
+import db
+import migrations
+
+SHARD_DIR_NAME = "shards"  # 默认的分库目录，位于 DB_FILE 所在目录下
+CATALOG_NAME = "catalog.db"
+
+_lock = threading.Lock()  # 创建、升级、删除用户库时持有
+_checked = set()  # 本进程中已确认是最新结构的用户库
+_previous = {"db_file": None}  # enable() 之前的 DB_FILE，disable() 时恢复
+
+
+def shard_path(user_id, shard_dir=None):
+    """返回用户库的文件路径"""
+    return os.path.join(shard_dir or db.SHARD_DIR, f"user-{user_id}.db")
+
+
+def list_shard_files(shard_dir=None):
+    """
+    列出分库目录中所有用户库
+
+    返回:
+        dict: 用户ID -> 文件路径
+    """
+    shard_dir = shard_dir or db.SHARD_DIR
+    files = {}
+    if shard_dir and os.path.isdir(shard_dir):
+        for name in os.listdir(shard_dir):
+            stem, ext = os.path.splitext(name)
+            if ext == ".db" and stem.startswith("user-") and stem[5:].isdigit():
+                files[int(stem[5:])] = os.path.join(shard_dir, name)
+    return files
+
+
+def _remove_database_file(path):
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def _create_empty(path, role):
+    """按最新结构创建空的公共库或用户库（DELETE 日志模式）"""
+    _remove_database_file(path)
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("BEGIN")
+        for _, _, func in migrations.MIGRATIONS:
+            func(conn)
+        migrations.apply_layout(conn, role)
+        conn.execute(f"PRAGMA user_version={migrations.SCHEMA_VERSION}")
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+
+def _template_path(shard_dir):
+    """空用户库的模板，新用户的文件直接复制模板，不用每次都执行一遍迁移"""
+    return os.path.join(shard_dir, f".shard-template-v{migrations.SCHEMA_VERSION}.db")
+
+
+def _new_shard(path, shard_dir):
+    template = _template_path(shard_dir)
+    if not os.path.exists(template):
+        _create_empty(template + ".tmp", "shard")
+        os.replace(template + ".tmp", template)
+    shutil.copyfile(template, path)
+
+
+def _copy_rows(conn, dest, source, tables, user_id=None):
+    """
+    把 source 库中的数据复制到 dest 库的同名表，只复制两边都有的列，ID和 AUTOINCREMENT 计数保持不变；
+    dest 中已有的同主键行（如新建公共库时写入的奖池版本计数）被 source 中的行覆盖
+
+    参数:
+        user_id (int, optional): 只复制该用户的行，None 表示全部
+    """
+    for table in tables:
+        source_columns = {row[1] for row in conn.execute(f"PRAGMA {source}.table_info({table})")}
+        if not source_columns:
+            continue
+        columns = ", ".join(row[1] for row in conn.execute(f"PRAGMA {dest}.table_info({table})")
+                            if row[1] in source_columns)
+        where, params = (" WHERE user_id=?", (user_id,)) if user_id is not None else ("", ())
+        conn.execute(f"INSERT OR REPLACE INTO {dest}.{table}({columns}) SELECT {columns} FROM {source}.{table}{where}", params)
+
+        sequence = conn.execute(f"SELECT seq FROM {source}.sqlite_sequence WHERE name=?", (table,)).fetchone()
+        if sequence is not None:
+            conn.execute(f"DELETE FROM {dest}.sqlite_sequence WHERE name=?", (table,))
+            conn.execute(f"INSERT INTO {dest}.sqlite_sequence(name, seq) VALUES(?, ?)", (table, sequence[0]))
+
+
+def _fill(path, role, source_path, user_id=None):
+    """把 source_path 中属于该文件的数据复制进新建的 path"""
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute("ATTACH DATABASE ? AS source", (source_path,))
+        conn.execute("BEGIN")
+        if role == "catalog":
+            conn.execute("DELETE FROM users")
+            conn.execute("DELETE FROM gacha_items")
+            tables = migrations.CATALOG_TABLES
+        else:
+            tables = migrations.SHARD_TABLES
+        _copy_rows(conn, "main", "source", tables, user_id)
+        if role == "shard":
+            # 早于 v8 的用户库没有 gacha_inventory，按复制过来的抽卡记录补齐
+            migrations.backfill_gacha_inventory(conn, skip_orphans=False)
+        conn.execute("COMMIT")
+        conn.execute("DETACH DATABASE source")
+    finally:
+        conn.close()
+
+
+def split_database(source_path, shard_dir):
+    """
+    把单文件布局的数据库拆分为公共库和每个用户的用户库
+
+    原文件只会被升级到最新结构，数据不做改动；已删除用户遗留的记录不会被复制
+
+    参数:
+        source_path (str): 单文件布局的数据库
+        shard_dir (str): 分库目录
+
+    返回:
+        dict: catalog 为公共库路径，users 为拆分出的用户数
+    """
+    os.makedirs(shard_dir, exist_ok=True)
+    conn = sqlite3.connect(source_path)
+    try:
+        migrations.migrate(conn)
+        user_ids = [row[0] for row in conn.execute("SELECT id FROM users ORDER BY id")]
+    finally:
+        conn.close()
+
+    for user_id in user_ids:
+        path = shard_path(user_id, shard_dir)
+        _new_shard(path + ".tmp", shard_dir)
+        _fill(path + ".tmp", "shard", source_path, user_id)
+        _remove_database_file(path)
+        os.replace(path + ".tmp", path)
+
+    # 公共库最后就位，它存在就表示拆分已经完成
+    catalog = os.path.join(shard_dir, CATALOG_NAME)
+    _create_empty(catalog + ".tmp", "catalog")
+    _fill(catalog + ".tmp", "catalog", source_path)
+    _remove_database_file(catalog)
+    os.replace(catalog + ".tmp", catalog)
+    return {"catalog": catalog, "users": len(user_ids)}
+
+
+def _upgrade(path, role, user_id=None):
+    """结构版本落后时，按最新结构新建文件并把数据复制过去"""
+    conn = sqlite3.connect(path)
+    try:
+        version = migrations.get_schema_version(conn)
+    finally:
+        conn.close()
+    if version >= migrations.SCHEMA_VERSION:
+        return False
+
+    shard_dir = os.path.dirname(path)
+    if role == "catalog":
+        _create_empty(path + ".tmp", "catalog")
+    else:
+        _new_shard(path + ".tmp", shard_dir)
+    _fill(path + ".tmp", role, path, user_id)
+    _remove_database_file(path)
+    os.replace(path + ".tmp", path)
+    print(f"已将 {os.path.basename(path)} 升级到 v{migrations.SCHEMA_VERSION}")
+    return True
+
+
+def ensure_shard(user_id):
+    """返回用户库路径，文件不存在时从模板创建，结构落后时升级"""
+    path = shard_path(user_id)
+    if path in _checked:
+        return path
+    with _lock:
+        if not os.path.exists(path):
+            _new_shard(path + ".tmp", db.SHARD_DIR)
+            os.replace(path + ".tmp", path)
+        else:
+            _upgrade(path, "shard", user_id)
+        _checked.add(path)
+    return path
+
+
+def attach(conn, user_id):
+    """把用户库 ATTACH 到连接上（由 db.get_db_connection 在切换用户后调用）"""
+    conn.execute(f"ATTACH DATABASE ? AS {db.SHARD_SCHEMA}", (ensure_shard(user_id),))
+    # 日志模式和同步级别是按文件设置的，ATTACH 的文件要单独设置；之前用 WAL 的用户库在这里改回回滚日志
+    profile = db.storage_profile()
+    for pragma in ("journal_mode", "synchronous"):
+        if profile.get(pragma) is not None:
+            conn.execute(f"PRAGMA {db.SHARD_SCHEMA}.{pragma}={profile[pragma]}").fetchall()
+
+
+def connect(path):
+    """单独打开分库目录中的一个文件（不经过连接池），维护任务逐个处理各用户库时使用"""
+    conn = sqlite3.connect(path)
+    db.apply_storage_profile(conn)
+    return conn
+
+
+def remove_shard(user_id):
+    """删除用户库文件（用户已从公共库中删除之后调用）"""
+    path = shard_path(user_id)
+    if db.get_active_shard() == user_id:
+        db.use_user_shard(None)
+    # 其他线程的连接可能还 ATTACH 着这个文件，它们下次取连接时才会关闭；
+    # 文件被占用删不掉时留给下次 enable() 的 remove_orphan_shards()
+    db.close_db_connections()
+    with _lock:
+        try:
+            _remove_database_file(path)
+        except OSError as e:
+            print(f"用户库暂时无法删除，下次启动时清理: {path} ({e})")
+        _checked.discard(path)
+
+
+def remove_orphan_shards(shard_dir, catalog):
+    """删除公共库中已没有对应用户的用户库，返回删除的用户ID"""
+    conn = sqlite3.connect(catalog)
+    try:
+        user_ids = {row[0] for row in conn.execute("SELECT id FROM users")}
+    finally:
+        conn.close()
+    removed = []
+    for user_id, path in list_shard_files(shard_dir).items():
+        if user_id not in user_ids:
+            try:
+                _remove_database_file(path)
+                removed.append(user_id)
+            except OSError as e:
+                print(f"删除已删除用户的用户库失败: {path} ({e})")
+    return removed
+
+
+def enable(shard_dir=None, fresh=False):
+    """
+    开启分库布局：DB_FILE 改为分库目录中的公共库
+
+    目录中还没有公共库时，把当前的 DB_FILE 拆分过去；DB_FILE 也不存在时新建默认数据
+
+    参数:
+        shard_dir (str, optional): 分库目录，默认为 DB_FILE 旁边的 shards 目录
+        fresh (bool): 目录中没有公共库时不拆分 DB_FILE，直接新建默认数据
+
+    返回:
+        str: 分库目录
+    """
+    if db.is_memory_database():
+        raise ValueError("内存数据库不能使用分库布局")
+    shard_dir = os.path.abspath(shard_dir or os.path.join(os.path.dirname(os.path.abspath(db.DB_FILE)),
+                                                          SHARD_DIR_NAME))
+    catalog = os.path.join(shard_dir, CATALOG_NAME)
+    db.close_db_connections()
+    if not os.path.exists(catalog):
+        source = db.DB_FILE
+        fresh = fresh or not os.path.exists(source)
+        if fresh:
+            # 先按单文件布局建好默认用户、重复任务和奖池，再拆分
+            os.makedirs(shard_dir, exist_ok=True)
+            source = os.path.join(shard_dir, "init.db")
+            conn = sqlite3.connect(source)
+            migrations.migrate(conn)
+            conn.close()
+        result = split_database(source, shard_dir)
+        if fresh:
+            _remove_database_file(source)
+        print(f"已拆分为 {result['users']} 个用户库: {shard_dir}")
+    else:
+        _upgrade(catalog, "catalog")
+    remove_orphan_shards(shard_dir, catalog)
+
+    _previous["db_file"] = db.DB_FILE
+    db.DB_FILE = catalog
+    db.SHARD_DIR = shard_dir
+    db.use_user_shard(None)
+    return shard_dir
+
+
+def disable():
+    """回到单文件布局（恢复 enable() 之前的 DB_FILE，分库目录中的文件保留）"""
+    if db.SHARD_DIR is None:
+        return
+    db.close_db_connections()
+    db.SHARD_DIR = None
+    db.use_user_shard(None)
+    if _previous["db_file"] is not None:
+        db.DB_FILE = _previous["db_file"]
+    _checked.clear()
+
+
+def reset():
+    """
+    删除分库目录中的所有数据并按默认数据重新创建（由 db.clear_data_file_and_reinit 调用）
+
+    调用前要确认 db.close_db_connections() 返回 0
+
+    返回:
+        bool: 是否成功
+    """
+    shard_dir, catalog = db.SHARD_DIR, db.DB_FILE
+    disable()
+    try:
+        _remove_database_file(catalog)
+    except OSError as e:
+        print(f"清空数据失败: 公共库无法删除 ({e})")
+        enable(shard_dir)
+        return False
+    # 公共库删除后，剩下的用户库会在重建时被覆盖，删不掉的由 remove_orphan_shards() 清理
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    enable(shard_dir, fresh=True)
+    return True
+
+
+def install_from_env():
+    """环境变量 BANXI_SHARDS 为 1 或设置了 BANXI_SHARD_DIR 时开启分库布局"""
+    shard_dir = os.environ.get("BANXI_SHARD_DIR")
+    if not shard_dir and os.environ.get("BANXI_SHARDS", "") not in ("1", "true", "yes"):
+        return False
+    enable(shard_dir)
+    return True
@@ -0,0 +1,145 @@
+"""
+孤立记录清理
+
+迁移 v7 之后删除用户会由外键级联删除其所有数据，但之前删除的用户留下的
+奖励、重复任务、抽卡记录等还在各个表里，拖慢每次没有索引可用的扫描。
+sweep_orphans() 分批删除这些父记录已不存在的行，每批单独提交；
+之后 reclaim_free_pages() 把空出来的页还给文件系统，数据库文件随之变小。
+
+分库布局下删除用户就是删除其用户库，不会留下孤立记录，定时任务只为公共库和每个用户库归还空闲页。
+"""
+
+import time
+
+import db
+from migrations import CASCADE_FOREIGN_KEYS
+
+SWEEP_BATCH_SIZE = 1000  # 每批删除的行数
+SWEEP_PAUSE = 0.01  # 批与批之间让出写锁的时间（秒）
+
+# 没有 rowid 的表按主键定位行
+_ROW_KEYS = {"ledger_checkpoints": "user_id, seq", "gacha_inventory": "user_id, item_id"}
+
+
+def _orphan_condition(table, column, parent):
+    return f"{column} IS NOT NULL AND NOT EXISTS (SELECT 1 FROM {parent} p WHERE p.id={table}.{column})"
+
+
+def count_orphans():
+    """
+    统计各表中父记录已不存在的行数
+
+    返回:
+        dict: 表名 -> 孤立行数（一行有多个失效的外键时只算一次）
+    """
+    conn = db.get_db_connection()
+    counts = {}
+    for table, foreign_keys in CASCADE_FOREIGN_KEYS.items():
+        condition = " OR ".join(f"({_orphan_condition(table, column, parent)})" for column, parent in foreign_keys)
+        counts[table] = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {condition}").fetchone()[0]
+    conn.close()
+    return counts
+
+
+def _sweep_batch(conn, table, column, parent, batch_size):
+    key = _ROW_KEYS.get(table, "rowid")
+    cursor = conn.execute(f"""
+        DELETE FROM {table} WHERE ({key}) IN (
+            SELECT {key} FROM {table} WHERE {_orphan_condition(table, column, parent)} LIMIT ?
+        )
+    """, (batch_size,))
+    return cursor.rowcount
+
+
+def sweep_orphans(batch_size=SWEEP_BATCH_SIZE, progress=None):
+    """
+    分批删除父记录已不存在的行
+
+    参数:
+        batch_size (int): 每批删除的行数，每批单独提交
+        progress (callable, optional): 每批之后调用 progress(表名, 已删除行数)，返回 False 时停止
+
+    返回:
+        dict: 每个表删除的行数
+    """
+    conn = db.get_db_connection()
+    deleted = {table: 0 for table in CASCADE_FOREIGN_KEYS}
+    try:
+        for table, foreign_keys in CASCADE_FOREIGN_KEYS.items():
+            for column, parent in foreign_keys:
+                while True:
+                    count = _sweep_batch(conn, table, column, parent, batch_size)
+                    conn.commit()
+                    deleted[table] += count
+                    if count < batch_size:
+                        break
+                    if progress is not None and progress(table, deleted[table]) is False:
+                        return deleted
+                    time.sleep(SWEEP_PAUSE)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return deleted
+
+
+def reclaim_free_pages(pages=None, conn=None):
+    """
+    把空闲页还给文件系统
+
+    新建的数据库使用 auto_vacuum=INCREMENTAL，直接执行增量 VACUUM；
+    更早的数据库第一次调用时切换到增量模式，需要完整 VACUUM 一次，耗时与文件大小成正比
+
+    参数:
+        pages (int, optional): 增量模式下最多归还的页数，默认全部
+        conn (sqlite3.Connection, optional): 要处理的数据库的连接，默认为当前线程的长连接；
+            传入的连接由调用方关闭
+
+    返回:
+        int: 归还的页数
+    """
+    pooled = conn is None
+    if pooled:
+        conn = db.get_db_connection()
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return db.incremental_vacuum(conn, pages)
+        before = conn.execute("PRAGMA page_count").fetchone()[0]
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        print("数据库已切换为增量 VACUUM 模式")
+        return before - conn.execute("PRAGMA page_count").fetchone()[0]
+    finally:
+        if pooled:
+            conn.close()
+
+
+def _reclaim_if_free(conn=None):
+    """有空闲页时归还给文件系统，返回归还的页数"""
+    check = conn or db.get_db_connection()
+    free_pages = check.execute("PRAGMA freelist_count").fetchone()[0]
+    if conn is None:
+        check.close()
+    return reclaim_free_pages(conn=conn) if free_pages else 0
+
+
+def run_scheduled_sweep():
+    """定时任务调用：清理孤立记录，有空闲页时归还给文件系统"""
+    if db.SHARD_DIR is None:
+        deleted = sweep_orphans()
+        if any(deleted.values()):
+            print(f"已清理孤立记录: {', '.join(f'{t} {n} 行' for t, n in deleted.items() if n)}")
+        return {"deleted": deleted, "freed_pages": _reclaim_if_free()}
+
+    # 分库布局：公共库用本线程的长连接，各用户库单独打开，不影响连接池 ATTACH 的当前用户
+    import shards
+    deleted = {table: 0 for table in CASCADE_FOREIGN_KEYS}
+    freed = _reclaim_if_free()
+    for path in shards.list_shard_files().values():
+        conn = shards.connect(path)
+        try:
+            freed += _reclaim_if_free(conn)
+        finally:
+            conn.close()
+    return {"deleted": deleted, "freed_pages": freed}
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+归档测试脚本
+验证只归档完成时间超过期限的记录，归档分批进行，归档后可以分页查看
+"""
+
+import os
+import sys
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import archive
+import db
+import testing
+
+
+def test_archive_old_completed_rows():
+    """完成超过期限的任务和奖励被移到归档表，未完成和最近完成的保留"""
+    print("=== 归档测试 ===")
+    user_id = testing.use_temp_database()
+    conn = db.get_db_connection()
+    conn.executemany(
+        "INSERT INTO tasks(user_id, name, xp_reward, completed, created_at, completed_at) VALUES(?,?,?,?,?,?)",
+        [(user_id, f"旧任务{i}", 10, 1, "2020-01-01 00:00:00", "2020-02-01 00:00:00") for i in range(1234)])
+    # 旧版本完成的任务没有完成时间，按创建时间判断
+    conn.execute("INSERT INTO tasks(user_id, name, xp_reward, completed, created_at) "
+                 "VALUES(?, '没有完成时间', 10, 1, '2020-01-01 00:00:00')", (user_id,))
+    conn.executemany("INSERT INTO rewards(user_id, name, price, completed, created_at) VALUES(?,?,?,1,?)",
+                     [(user_id, f"旧奖励{i}", 100, "2020-01-01 00:00:00") for i in range(20)])
+    conn.commit()
+
+    db.add_task(user_id, "未完成", 10)
+    db.add_task(user_id, "刚完成", 10)
+    db.complete_task([t for t in db.get_tasks(user_id) if t["name"] == "刚完成"][0]["id"])
+
+    batches = []
+    moved = archive.archive_completed(batch_size=500, progress=lambda table, n: batches.append((table, n)))
+    assert moved == {"tasks": 1235, "rewards": 20}, moved
+    assert batches == [("tasks", 500), ("tasks", 1000)], batches
+
+    names = sorted(row["name"] for row in db.get_tasks(user_id))
+    assert names == ["刚完成", "未完成"], names
+    assert db.get_rewards(user_id) == []
+    assert archive.get_archive_counts(user_id) == {"tasks": 1235, "rewards": 20}
+
+    # 再次执行没有可归档的记录
+    assert archive.archive_completed() == {"tasks": 0, "rewards": 0}
+    print(f"归档 {moved}")
+    print("✅ 归档测试完成！\n")
+
+
+def test_archived_history_pages():
+    """归档记录按ID从新到旧分页读取"""
+    print("=== 归档历史分页测试 ===")
+    user_id = testing.use_temp_database()
+    for i in range(7):
+        db.add_task(user_id, f"任务{i}", 10 + i)
+    db.complete_tasks([t["id"] for t in db.get_tasks(user_id)])
+    assert archive.archive_completed(older_than_days=-1)["tasks"] == 7
+
+    rows = []
+    cursor = None
+    while True:
+        page, cursor = archive.get_archived_tasks(user_id, cursor, limit=3)
+        rows.extend(page)
+        if cursor is None:
+            break
+    assert [row["name"] for row in rows] == [f"任务{i}" for i in reversed(range(7))]
+    assert all(row["completed_at"] for row in rows)
+    print("✅ 归档历史分页测试完成！\n")
+
+
+if __name__ == "__main__":
+    test_archive_old_completed_rows()
+    test_archived_history_pages()
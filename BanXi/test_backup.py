@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+在线备份测试脚本
+验证分步备份期间其他线程可以继续写入、旧备份轮换，以及从备份恢复
+"""
+
+import os
+import sys
+import threading
+import time
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import backup
+import db
+import testing
+
+
+def test_online_backup_and_rotation():
+    """备份分多步完成，期间的写入不会被长时间阻塞；超出数量的旧备份被删除"""
+    print("=== 在线备份测试 ===")
+    user_id = testing.use_temp_database("file")  # 备份和恢复针对数据库文件
+    conn = db.get_db_connection()
+    conn.executemany("INSERT INTO tasks(user_id, name, xp_reward) VALUES(?,?,?)",
+                     [(user_id, f"历史任务{i}" + "备注" * 50, 10) for i in range(20000)])
+    conn.commit()
+
+    steps = []
+    res = {}
+    thread = threading.Thread(target=lambda: res.update(
+        backup.create_backup(pages=64, progress=lambda copied, total: steps.append((copied, total)))))
+    thread.start()
+
+    # 备份进行期间写入
+    slowest = 0.0
+    writes = 0
+    while thread.is_alive() or writes == 0:
+        start = time.perf_counter()
+        db.add_task(user_id, f"备份期间的任务{writes}", 5)
+        slowest = max(slowest, time.perf_counter() - start)
+        writes += 1
+    thread.join()
+
+    assert res["success"], res
+    assert len(steps) > 1 and steps[-1][0] == steps[-1][1]
+    assert slowest < 1.0, slowest
+    print(f"备份 {res['pages']} 页，共 {len(steps)} 步；期间写入 {writes} 次，最慢 {slowest * 1000:.1f} ms")
+
+    # 备份是独立的普通文件，可以直接打开
+    import sqlite3
+    copy = sqlite3.connect(res["path"])
+    assert copy.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    assert copy.execute("SELECT COUNT(*) FROM tasks").fetchone()[0] >= 20000
+    copy.close()
+
+    for _ in range(4):
+        backup.create_backup(keep=3)
+    assert len(backup.list_backups()) == 3
+    assert not backup.backup_due()
+    assert backup.run_scheduled_backup() is None
+    print("✅ 在线备份测试完成！\n")
+
+
+def test_restore():
+    """恢复后数据回到备份时的状态，恢复前的数据另有一份备份"""
+    print("=== 备份恢复测试 ===")
+    user_id = testing.use_temp_database("file")
+    db.update_user(user_id, coins=111)
+    saved = backup.create_backup()["path"]
+
+    db.update_user(user_id, coins=999)
+    db.add_task(user_id, "备份之后的任务", 10)
+
+    res = backup.restore_backup(saved)
+    assert res["success"], res
+    assert db.get_user(user_id).coins == 111
+    assert db.get_tasks(user_id) == []
+    assert res["previous_backup"] in backup.list_backups()
+
+    # 损坏的备份不会替换当前数据库
+    broken = os.path.join(testing.temp_dir(), "broken.db")
+    with open(broken, "wb") as f:
+        f.write(b"not a database" * 100)
+    assert backup.restore_backup(broken)["reason"] == "invalid_backup"
+    assert db.get_user(user_id).coins == 111
+    print("✅ 备份恢复测试完成！\n")
+
+
+def test_restore_waits_for_other_threads():
+    """其他线程还打开着数据库时不替换文件，该线程交还连接后才能恢复"""
+    print("=== 恢复时其他线程占用测试 ===")
+    user_id = testing.use_temp_database("file")
+    saved = backup.create_backup()["path"]
+    db.update_user(user_id, coins=999)
+
+    ready, release, done = threading.Event(), threading.Event(), threading.Event()
+
+    def maintenance():
+        db.get_db_connection().execute("SELECT COUNT(*) FROM tasks").fetchone()
+        ready.set()
+        release.wait()
+        db.release_thread_connection()
+        done.set()
+
+    thread = threading.Thread(target=maintenance)
+    thread.start()
+    ready.wait()
+    assert backup.restore_backup(saved) == {"success": False, "reason": "database_busy"}
+    assert db.get_user(user_id).coins == 999
+    assert not os.path.exists(db.DB_FILE + ".restore")
+
+    release.set()
+    done.wait()
+    assert backup.restore_backup(saved)["success"]
+    assert db.get_user(user_id).coins != 999
+    thread.join()
+    print("✅ 恢复时其他线程占用测试完成！\n")
+
+
+if __name__ == "__main__":
+    test_online_backup_and_rotation()
+    test_restore()
+    test_restore_waits_for_other_threads()
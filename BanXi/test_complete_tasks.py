@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量完成任务测试脚本
+验证 complete_tasks 在一个事务中完成多个任务，结果与逐个完成一致
+"""
+
+import os
+import sys
+import time
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import db
+import testing
+
+
+def test_batch_matches_single():
+    """批量完成后的等级、经验和铂金币与逐个完成相同"""
+    print("=== 批量完成任务测试 ===")
+    testing.use_temp_database()
+    first, second = [u["id"] for u in db.get_users()]
+    for i in range(200):
+        db.add_task(first, f"任务{i}", 37, platinum_reward=1 if i % 10 == 0 else 0)
+    for i in range(5):
+        db.add_task(second, f"任务{i}", 80)
+    first_ids = [t["id"] for t in db.get_tasks(first)]
+    second_ids = [t["id"] for t in db.get_tasks(second)]
+
+    start = time.perf_counter()
+    summary = db.complete_tasks(first_ids + second_ids + first_ids[:3] + [999999])
+    elapsed = (time.perf_counter() - start) * 1000
+
+    assert sorted(summary["completed_ids"]) == sorted(first_ids + second_ids)
+    assert summary["skipped"] == 1, summary["skipped"]
+    by_user = {res["user_id"]: res for res in summary["results"]}
+    assert by_user[first]["xp"] == 200 * 37
+    assert by_user[second]["task_ids"] == second_ids
+
+    # 同样的经验一次性结算，等级、剩余经验和铂金币应当一致
+    expected = db.reward_engine.apply_xp(1, 0, 200 * 37)
+    user = db.get_user(first)
+    assert (user["level"], user["xp"]) == (expected["level"], expected["xp"]), tuple(user)
+    assert user["platinum_coins"] == expected["platinum_gained"] + 20
+    assert user["coins"] == by_user[first]["coins_gained"]
+    assert all(t["completed"] for t in db.get_tasks(first))
+
+    # 已完成的任务再次提交会被全部跳过
+    again = db.complete_tasks(first_ids)
+    assert again["results"] == [] and again["skipped"] == len(first_ids)
+    assert db.complete_task(first_ids[0]) is None
+    print(f"批量完成 {len(summary['completed_ids'])} 个任务，耗时 {elapsed:.2f} ms")
+    print("✅ 批量完成任务测试完成！\n")
+
+
+if __name__ == "__main__":
+    test_batch_matches_single()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+连接池测试脚本
+验证 close_db_connections 只关闭当前线程和已结束线程的连接，其他线程的连接由其自己在下次取用时关闭
+"""
+
+import os
+import sys
+import threading
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import db
+import testing
+
+
+def test_other_threads_close_their_own():
+    """其他线程正在使用的连接不会被关闭，该线程下次取连接时换成新连接"""
+    print("=== 连接池关闭测试 ===")
+    testing.use_temp_database()
+    mine = db.get_db_connection()
+
+    opened, closed, checked, finish = (threading.Event() for _ in range(4))
+    seen = {}
+
+    def worker():
+        conn = db.get_db_connection()
+        conn.execute("BEGIN")
+        before = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        opened.set()
+        closed.wait()
+        # 连接池已关闭，但本线程的事务仍然有效，可以继续执行并提交
+        conn.execute("INSERT INTO users(name) VALUES('线程中的用户')")
+        seen["count"] = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] - before
+        conn.commit()
+        seen["same"] = db.get_db_connection() is conn
+        checked.set()
+        finish.wait()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    opened.wait()
+    assert db.close_db_connections() == 1  # 只有工作线程的连接还开着
+    closed.set()
+    assert db.get_db_connection() is not mine
+    checked.wait()
+    assert seen == {"count": 1, "same": False}
+    assert "线程中的用户" in [user.name for user in db.get_users()]
+    assert db.close_db_connections() == 1  # 工作线程取用的新连接
+
+    finish.set()
+    thread.join()
+    assert db.close_db_connections() == 0  # 线程结束后它的连接可以直接关闭
+
+    db.get_db_connection()
+    db.release_thread_connection()
+    assert db.close_db_connections() == 0
+    print("✅ 连接池关闭测试完成！\n")
+
+
+if __name__ == "__main__":
+    test_other_threads_close_their_own()
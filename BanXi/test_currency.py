@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+货币变动测试脚本
+验证 change_balance 的余额守卫，以及多线程并发扣款、兑换时不会丢失更新
+"""
+
+import os
+import sys
+import threading
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import db
+import testing
+
+
+def test_guarded_spend():
+    """余额不足时不扣款，并返回正确的失败原因"""
+    print("=== 余额守卫测试 ===")
+    user_id = testing.use_temp_database()
+    db.update_user(user_id, coins=500, platinum_coins=3)
+
+    db.add_reward(user_id, "贵的奖励", 800)
+    db.add_reward(user_id, "铂金奖励", 2, currency_type="platinum")
+    expensive, platinum_reward = [r["id"] for r in db.get_rewards(user_id)]
+
+    result = db.redeem_reward(expensive)
+    assert result == {"success": False, "reason": "not_enough_coins"}, result
+    # 余额不足时奖励不应被标记为已兑换
+    assert db.get_rewards(user_id)[0]["completed"] == 0
+
+    result = db.redeem_reward(platinum_reward)
+    assert result["success"] and result["remaining_platinum"] == 1, result
+    assert db.redeem_reward(platinum_reward)["reason"] == "already_redeemed"
+
+    result = db.exchange_platinum_to_gold(user_id, 5)
+    assert result == {"success": False, "reason": "not_enough_platinum"}, result
+    assert db.exchange_platinum_to_gold(9999, 1)["reason"] == "user_not_found"
+
+    user = db.get_user(user_id)
+    assert (user["coins"], user["platinum_coins"]) == (500, 1), tuple(user)
+    print("✅ 余额守卫测试完成！\n")
+
+
+def test_concurrent_spend_and_grant():
+    """多个线程同时扣款和加铂金币，最终余额与串行执行一致"""
+    print("=== 并发扣款测试 ===")
+    user_id = testing.use_temp_database()
+    db.update_user(user_id, coins=10000, platinum_coins=0)
+
+    threads_count = 8
+    rounds = 50
+    for _ in range(threads_count * rounds):
+        db.add_reward(user_id, "小奖励", 30)
+    reward_ids = [r["id"] for r in db.get_rewards(user_id)]
+
+    def worker(index):
+        for reward_id in reward_ids[index::threads_count]:
+            db.redeem_reward(reward_id)
+            db.add_platinum_coins(user_id, 1)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(threads_count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    user = db.get_user(user_id)
+    redeemed = sum(r["completed"] for r in db.get_rewards(user_id))
+    expected_redeemed = min(len(reward_ids), 10000 // 30)
+    assert redeemed == expected_redeemed, redeemed
+    assert user["coins"] == 10000 - 30 * redeemed, user["coins"]
+    assert user["platinum_coins"] == len(reward_ids), user["platinum_coins"]
+    print(f"兑换 {redeemed} 次，剩余金币 {user['coins']}，铂金币 {user['platinum_coins']}")
+    print("✅ 并发扣款测试完成！\n")
+
+
+if __name__ == "__main__":
+    test_guarded_spend()
+    test_concurrent_spend_and_grant()
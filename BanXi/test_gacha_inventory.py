@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+抽卡奖品清单测试脚本
+验证 gacha_inventory 与抽卡记录保持一致、升级时由已有记录汇总生成，判断重复不再扫描抽卡记录
+"""
+
+import os
+import sqlite3
+import sys
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import db
+import gacha_fixed
+import migrations
+import testing
+
+
+def inventory_matches_records(conn):
+    inventory = conn.execute("SELECT user_id, item_id, count FROM gacha_inventory ORDER BY 1, 2").fetchall()
+    records = conn.execute("SELECT user_id, item_id, COUNT(*) FROM gacha_records GROUP BY 1, 2 ORDER BY 1, 2").fetchall()
+    return [tuple(row) for row in inventory] == [tuple(row) for row in records]
+
+
+def test_draws_update_inventory():
+    """单抽和十连都在同一个事务中更新奖品清单，重复判断与抽卡记录一致"""
+    print("=== 奖品清单更新测试 ===")
+    user_id = testing.use_temp_database()
+    db.update_user(user_id, coins=1000000)
+
+    statements = []
+    conn = db.get_db_connection()
+    conn.set_trace_callback(statements.append)
+    try:
+        seen = set()
+        for _ in range(10):
+            for draw in gacha_fixed.draw_gacha_10(user_id)["draws"]:
+                item_id = draw["item"]["id"]
+                assert draw["is_duplicate"] == (item_id in seen)
+                seen.add(item_id)
+        for _ in range(20):
+            result = gacha_fixed.draw_gacha(user_id)
+            assert result["is_duplicate"] == (result["item"]["id"] in seen)
+            seen.add(result["item"]["id"])
+    finally:
+        conn.set_trace_callback(None)
+
+    assert not [sql for sql in statements if "COUNT(*)" in sql and "gacha_records" in sql]
+    assert inventory_matches_records(conn)
+    assert all(gacha_fixed.user_owns_item(user_id, item_id) for item_id in seen)
+    print(f"抽到 {len(seen)} 种奖品")
+    print("✅ 奖品清单更新测试完成！\n")
+
+
+def test_upgrade_backfills_inventory():
+    """v7 的数据库升级后按已有抽卡记录生成奖品清单，已删除用户的记录不计入"""
+    print("=== 奖品清单升级测试 ===")
+    path = testing.temp_db_path()
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("BEGIN")
+    for version, _, func in migrations.MIGRATIONS[:7]:
+        func(conn)
+    conn.execute("PRAGMA user_version=7")
+    conn.execute("COMMIT")
+    user_id = conn.execute("SELECT MIN(id) FROM users").fetchone()[0]
+    conn.executemany("INSERT INTO gacha_records(user_id, item_id, draw_time) VALUES(?, ?, ?)",
+                     [(user_id, 1, "2024-01-02"), (user_id, 1, "2024-01-01"), (user_id, 2, "2024-01-03")])
+    conn.execute("INSERT INTO gacha_records(user_id, item_id) VALUES(999, 1)")  # 已删除用户留下的记录
+    conn.close()
+
+    db.DB_FILE = path
+    db.init_db(storage="file")
+    conn = db.get_db_connection()
+    rows = conn.execute("SELECT user_id, item_id, count, first_drawn_at FROM gacha_inventory ORDER BY item_id")
+    assert [tuple(row) for row in rows] == [(user_id, 1, 2, "2024-01-01"), (user_id, 2, 1, "2024-01-03")]
+    for table in ("gacha_records", "gacha_inventory"):
+        foreign_keys = conn.execute(f"PRAGMA foreign_key_list({table})").fetchall()
+        assert [(row["table"], row["on_delete"]) for row in foreign_keys] == [("users", "CASCADE")], table
+
+    assert db.delete_user(user_id)
+    assert conn.execute("SELECT COUNT(*) FROM gacha_inventory").fetchone()[0] == 0
+    print("✅ 奖品清单升级测试完成！\n")
+
+
+def test_deleting_item_keeps_history():
+    """从奖池删除奖品只影响之后的抽卡，已有的抽卡记录和奖品清单保留"""
+    print("=== 删除奖品保留记录测试 ===")
+    user_id = testing.use_temp_database()
+    db.update_user(user_id, coins=1000000)
+    for _ in range(3):
+        gacha_fixed.draw_gacha_10(user_id)
+    conn = db.get_db_connection()
+    item_id = conn.execute("SELECT item_id FROM gacha_records WHERE user_id=? LIMIT 1", (user_id,)).fetchone()[0]
+
+    assert gacha_fixed.delete_gacha_item(item_id)
+    assert conn.execute("SELECT COUNT(*) FROM gacha_records WHERE user_id=?", (user_id,)).fetchone()[0] == 30
+    assert gacha_fixed.user_owns_item(user_id, item_id)
+    assert inventory_matches_records(conn)
+    assert not [row for row in conn.execute("PRAGMA foreign_key_list(gacha_records)") if row["table"] == "gacha_items"]
+    print("✅ 删除奖品保留记录测试完成！\n")
+
+
+if __name__ == "__main__":
+    test_draws_update_inventory()
+    test_upgrade_backfills_inventory()
+    test_deleting_item_keeps_history()
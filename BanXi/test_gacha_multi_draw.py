@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+N连抽测试脚本
+验证 draw_gacha_n 的扣费、保底推进、重复返还与逐抽执行一致，并且一次写入、一次提交
+"""
+
+import os
+import sys
+import time
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import db
+import gacha_fixed
+import ledger
+import testing
+
+
+def test_draw_cost():
+    """每十抽按十连价格，余下的按单抽价格"""
+    assert gacha_fixed.draw_cost(1) == gacha_fixed.SINGLE_DRAW_COST
+    assert gacha_fixed.draw_cost(10) == gacha_fixed.TEN_DRAW_COST
+    assert gacha_fixed.draw_cost(23) == 2 * gacha_fixed.TEN_DRAW_COST + 3 * gacha_fixed.SINGLE_DRAW_COST
+
+
+def test_thousand_draws():
+    """一千连一次提交，余额、保底和奖品清单与逐抽推进的结果一致"""
+    print("=== N连抽测试 ===")
+    user_id = testing.use_temp_database()
+    n = 1000
+    start_coins = gacha_fixed.draw_cost(n) + 5000
+    db.update_user(user_id, coins=start_coins)
+
+    statements = []
+    conn = db.get_db_connection()
+    conn.set_trace_callback(statements.append)
+    started = time.perf_counter()
+    try:
+        result = gacha_fixed.draw_gacha_n(user_id, n)
+    finally:
+        conn.set_trace_callback(None)
+    elapsed = (time.perf_counter() - started) * 1000
+    assert result["success"], result
+
+    draws = result["draws"]
+    assert len(draws) == n
+    assert sum(sql.startswith("INSERT INTO gacha_records") for sql in statements) == n  # 同一条 executemany
+    assert statements.count("COMMIT") == 1
+
+    # 按返回的结果逐抽重放保底和重复判断
+    count, pity, seen, refund = 0, 0.0, set(), 0
+    for draw in draws:
+        item = draw["item"]
+        assert draw["is_duplicate"] == (item["id"] in seen)
+        seen.add(item["id"])
+        refund += draw["refund_coins"]
+        count, pity = gacha_fixed.next_pity(count, pity, item["star"])
+    assert result["pity_info"] == {"no_six_star_count": count, "pity_rate": pity}
+    assert gacha_fixed.get_user_gacha_stats(user_id) == result["pity_info"]
+    assert result["total_refund"] == refund
+    assert result["remaining_coins"] == start_coins - gacha_fixed.draw_cost(n) + refund
+    assert db.get_user(user_id).coins == result["remaining_coins"]
+
+    assert conn.execute("SELECT COUNT(*) FROM gacha_records WHERE user_id=?", (user_id,)).fetchone()[0] == n
+    assert conn.execute("SELECT SUM(count) FROM gacha_inventory WHERE user_id=?", (user_id,)).fetchone()[0] == n
+    assert ledger.verify_user(user_id)
+    print(f"{n}连耗时 {elapsed:.1f} ms，六星 {sum(d['item']['star'] == 6 for d in draws)} 个，返还 {refund} 金币")
+    print("✅ N连抽测试完成！\n")
+
+
+def test_not_enough_coins():
+    """金币不足时不抽卡，也不扣费"""
+    user_id = testing.use_temp_database()
+    db.update_user(user_id, coins=gacha_fixed.draw_cost(100) - 1)
+    assert gacha_fixed.draw_gacha_n(user_id, 100) == {"success": False, "reason": "not_enough_coins"}
+    assert gacha_fixed.draw_gacha_n(user_id, 0)["reason"] == "invalid_count"
+    assert db.get_user(user_id).coins == gacha_fixed.draw_cost(100) - 1
+    assert gacha_fixed.get_user_gacha_records(user_id) == []
+
+
+def test_empty_star_refunded():
+    """抽中没有奖品的星级时这一抽作废并退还金币，全部作废时不扣费"""
+    user_id = testing.use_temp_database()
+    items = gacha_fixed.get_gacha_items()
+    lowest = min(row[2] for row in items)
+    for row in items:
+        if row[2] == lowest:
+            assert gacha_fixed.delete_gacha_item(row[0])
+
+    n = 200
+    start_coins = gacha_fixed.draw_cost(n)
+    db.update_user(user_id, coins=start_coins)
+    result = gacha_fixed.draw_gacha_n(user_id, n)
+    assert result["success"], result
+    assert result["skipped"] > 0 and len(result["draws"]) + result["skipped"] == n
+    assert all(draw["item"]["star"] != lowest for draw in result["draws"])
+    assert result["skipped_refund"] == gacha_fixed.draw_cost(n) * result["skipped"] // n
+    assert result["remaining_coins"] == (start_coins - gacha_fixed.draw_cost(n) + result["total_refund"]
+                                         + result["skipped_refund"])
+    assert db.get_user(user_id).coins == result["remaining_coins"]
+    assert ledger.verify_user(user_id)
+
+    for row in gacha_fixed.get_gacha_items():
+        assert gacha_fixed.delete_gacha_item(row[0])
+    db.update_user(user_id, coins=gacha_fixed.draw_cost(10))
+    assert gacha_fixed.draw_gacha_n(user_id, 10) == {"success": False, "reason": "no_items_in_star"}
+    assert db.get_user(user_id).coins == gacha_fixed.draw_cost(10)
+
+
+if __name__ == "__main__":
+    test_draw_cost()
+    test_thousand_draws()
+    test_not_enough_coins()
+    test_empty_star_refunded()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+奖池缓存测试脚本
+验证奖池没有变动时读取奖池和抽卡都不查询 gacha_items，增删奖品和其他连接的修改会让缓存失效
+"""
+
+import os
+import sqlite3
+import sys
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import db
+import gacha_fixed
+import gacha_pool
+import testing
+
+
+def pool_queries(func, *args):
+    """执行 func，返回其间读取 gacha_items 的语句"""
+    statements = []
+    conn = db.get_db_connection()
+    conn.set_trace_callback(statements.append)
+    try:
+        func(*args)
+    finally:
+        conn.set_trace_callback(None)
+    return [sql for sql in statements if "FROM gacha_items" in sql]
+
+
+def test_pool_cache():
+    """第二次读取奖池直接使用缓存，增删奖品后版本号增加并重新读取"""
+    print("=== 奖池缓存测试 ===")
+    user_id = testing.use_temp_database("file")  # 外部修改测试用另一个连接打开同一个文件
+    db.update_user(user_id, coins=100000)
+    items = gacha_fixed.get_gacha_items()
+    assert [row[2] for row in items] == sorted((row[2] for row in items), reverse=True)
+    version = gacha_pool.get_pool().version
+
+    assert pool_queries(gacha_fixed.get_gacha_items) == []
+    assert pool_queries(gacha_fixed.draw_gacha_10, user_id) == []
+    assert gacha_pool.get_pool().version == version
+
+    gacha_fixed.add_gacha_item("限定奖品", 6, "新加入")
+    assert gacha_pool.get_pool().version > version
+    assert "限定奖品" in [row[1] for row in gacha_fixed.get_gacha_items()]
+    new_id = [row[0] for row in gacha_fixed.get_gacha_items() if row[1] == "限定奖品"][0]
+    assert gacha_fixed.delete_gacha_item(new_id)
+    assert len(gacha_fixed.get_gacha_items()) == len(items)
+    print("✅ 奖池缓存测试完成！\n")
+
+
+def test_external_change_invalidates():
+    """其他连接（例如另一个进程）修改奖池后，通过 data_version 和奖池计数发现并重新读取"""
+    print("=== 奖池外部修改测试 ===")
+    testing.use_temp_database("file")
+    count = len(gacha_fixed.get_gacha_items())
+    version = gacha_pool.get_pool().version
+
+    other = sqlite3.connect(db.DB_FILE)
+    other.execute("INSERT INTO gacha_items(name, star, description) VALUES('外部奖品', 5, '')")
+    other.commit()
+    other.close()
+
+    assert len(gacha_fixed.get_gacha_items()) == count + 1
+    assert gacha_pool.get_pool().version > version
+
+    # 其他连接只改了别的表（如维护任务、账本写入），奖池缓存和版本号保持不变
+    snapshot = gacha_pool.get_pool()
+    other = sqlite3.connect(db.DB_FILE)
+    other.execute("UPDATE users SET coins=coins+1")
+    other.commit()
+    assert gacha_pool.get_pool() is snapshot
+
+    # 奖品数和文字长度都不变的修改（改成同样长度的名称、交换两个奖品的星级）也能发现
+    first, second = snapshot.items[0], snapshot.items[-1]
+    other.execute("UPDATE gacha_items SET name=? WHERE id=?", ("改" * len(first[1]), first[0]))
+    other.execute("UPDATE gacha_items SET star=? WHERE id=?", (second[2], first[0]))
+    other.execute("UPDATE gacha_items SET star=? WHERE id=?", (first[2], second[0]))
+    other.commit()
+    other.close()
+    pool = gacha_pool.get_pool()
+    assert pool.version > snapshot.version
+    assert ("改" * len(first[1])) in [item[1] for item in pool.by_star[second[2]]]
+    print("✅ 奖池外部修改测试完成！\n")
+
+
+if __name__ == "__main__":
+    test_pool_cache()
+    test_external_change_invalidates()
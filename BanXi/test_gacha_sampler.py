@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+抽卡采样器测试脚本
+验证别名表的抽取分布与保底概率一致，抽卡时不再按星级查询奖池，增删奖品或换用概率函数后采样器重建
+"""
+
+import os
+import random
+import sys
+from collections import Counter
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import db
+import gacha_fixed
+import gacha_sampler
+import testing
+
+
+def linear_walk_rates(pity_rate, samples=200000):
+    """按原来的写法（复制、缩放、从高星线性查找）统计各星级的频率"""
+    rnd = random.Random(7)
+    rates = gacha_fixed.DEFAULT_RATES.copy()
+    rates[6] += pity_rate
+    scale = (1 - rates[6]) / sum(rates[s] for s in [3, 4, 5])
+    for star in [3, 4, 5]:
+        rates[star] *= scale
+    counts = Counter()
+    for _ in range(samples):
+        rand_val, cumulative, selected = rnd.random(), 0, 3
+        for star in [6, 5, 4, 3]:
+            cumulative += rates[star]
+            if rand_val <= cumulative:
+                selected = star
+                break
+        counts[selected] += 1
+    return {star: counts[star] / samples for star in [6, 5, 4, 3]}
+
+
+def test_alias_table_distribution():
+    """各保底加成下别名表的抽取频率与原来的线性查找一致"""
+    print("=== 别名表分布测试 ===")
+    rnd = random.Random(42)
+    samples = 200000
+    for pity_rate in (0.0, 0.1, 0.5, 0.98, 1.0):
+        expected = gacha_fixed.current_rates(pity_rate)
+        assert abs(sum(expected.values()) - 1) < 1e-9
+        walked = linear_walk_rates(pity_rate)
+        table = gacha_sampler.AliasTable(expected)
+        counts = Counter(table.sample(rnd) for _ in range(samples))
+        for star in [6, 5, 4, 3]:
+            assert abs(counts[star] / samples - expected[star]) < 0.01, (pity_rate, star)
+            assert abs(walked[star] - expected[star]) < 0.01, (pity_rate, star)
+        print(f"保底加成 {pity_rate:.2f}: 六星 {counts[6] / samples:.4f}（期望 {expected[6]:.4f}）")
+    assert gacha_fixed.current_rates(1.0)[6] == 1.0
+    print("✅ 别名表分布测试完成！\n")
+
+
+def test_draw_without_pool_queries():
+    """采样器构建后抽卡不再读取奖池；增删奖品后重新构建"""
+    print("=== 抽卡不查询奖池测试 ===")
+    user_id = testing.use_temp_database()
+    db.update_user(user_id, coins=100000)
+    gacha_fixed.draw_gacha(user_id)
+
+    statements = []
+    conn = db.get_db_connection()
+    conn.set_trace_callback(statements.append)
+    try:
+        assert gacha_fixed.draw_gacha_10(user_id)["success"]
+        assert gacha_fixed.draw_gacha(user_id)["success"]
+    finally:
+        conn.set_trace_callback(None)
+    assert not [sql for sql in statements if "FROM gacha_items" in sql], statements
+
+    # 新增一个唯一的三星奖品，把其他奖品都删掉后只能抽到它
+    gacha_fixed.add_gacha_item("新奖品", 3, "刚加入奖池")
+    new_id = max(row[0] for row in gacha_fixed.get_gacha_items())
+    for row in gacha_fixed.get_gacha_items():
+        if row[0] != new_id and row[2] == 3:
+            assert gacha_fixed.delete_gacha_item(row[0])
+    names = {d["item"]["name"] for d in gacha_fixed.draw_gacha_10(user_id)["draws"] if d["item"]["star"] == 3}
+    assert names <= {"新奖品"}
+
+    pity = gacha_fixed.get_user_gacha_stats(user_id)
+    assert gacha_fixed.next_pity(pity["no_six_star_count"], pity["pity_rate"], 6) == (0, 0.0)
+    assert gacha_fixed.next_pity(49, 0.0, 5) == (50, gacha_fixed.PITY_STEP)
+    print("✅ 抽卡不查询奖池测试完成！\n")
+
+
+def test_sampler_keyed_on_rates():
+    """同一奖池换用另一个概率函数时重新构建采样器，而不是沿用旧概率"""
+    print("=== 概率函数缓存测试 ===")
+    testing.use_temp_database()
+    conn = db.get_db_connection()
+    default = gacha_sampler.get_sampler(conn, gacha_fixed.current_rates)
+    assert gacha_sampler.get_sampler(conn, gacha_fixed.current_rates) is default
+
+    def only_six(pity_rate):
+        return {6: 1.0, 5: 0.0, 4: 0.0, 3: 0.0}
+
+    sampler = gacha_sampler.get_sampler(conn, only_six)
+    assert sampler is not default
+    rnd = random.Random(1)
+    assert {sampler.draw(0.0, rnd)[0] for _ in range(100)} == {6}
+    assert gacha_sampler.get_sampler(conn, gacha_fixed.current_rates) is not sampler
+    print("✅ 概率函数缓存测试完成！\n")
+
+
+if __name__ == "__main__":
+    test_alias_table_distribution()
+    test_draw_without_pool_queries()
+    test_sampler_keyed_on_rates()
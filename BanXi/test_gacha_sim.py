@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+抽卡模拟器测试脚本
+验证 gacha_sim 的统计结果与按 gacha_fixed 规则逐抽重放一致，并且相同的种子结果相同
+"""
+
+import os
+import random
+import sys
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import gacha_fixed
+import gacha_sampler
+import gacha_sim
+
+
+def replay(players, pulls, seed):
+    """用游戏中的采样器和保底规则逐抽模拟，返回 (六星概率, 平均每抽返还, 第一个六星的平均抽数)"""
+    rnd = random.Random(seed)
+    items = [(i, name, star, description)
+             for i, (name, star, description) in enumerate(gacha_fixed.DEFAULT_GACHA_ITEMS)]
+    sampler = gacha_sampler.GachaSampler(items, gacha_fixed.current_rates)
+    six_stars, refund, firsts = 0, 0, []
+    for _ in range(players):
+        count, pity, seen, first = 0, 0.0, set(), None
+        for pull in range(1, pulls + 1):
+            star, item = sampler.draw(pity, rnd)
+            if item[0] in seen:
+                refund += gacha_fixed.DEFAULT_REFUND[star]
+            seen.add(item[0])
+            if star == 6:
+                six_stars += 1
+                first = first or pull
+            count, pity = gacha_fixed.next_pity(count, pity, star)
+        firsts.append(first)
+    return six_stars / (players * pulls), refund / (players * pulls), sum(firsts) / len(firsts)
+
+
+def test_matches_replay():
+    """与逐抽重放的六星概率、返还和第一个六星的抽数一致（在抽样误差内）"""
+    print("=== 抽卡模拟器测试 ===")
+    if gacha_sim.np is None:
+        print("未安装 numpy，跳过")
+        return
+    players, pulls = 4000, 150
+    six_rate, refund, first = replay(players, pulls, seed=1)
+    report = gacha_sim.simulate(200000, pulls, seed=1)
+    print(f"逐抽重放: 六星 {six_rate:.4%}，每抽返还 {refund:.1f}，第一个六星 {first:.1f} 抽")
+    print(f"模拟器:   六星 {report['six_star_rate']:.4%}，每抽返还 {report['refund_per_pull']:.1f}，"
+          f"第一个六星 {report['first_six_star_pulls']['mean']:.1f} 抽")
+    assert abs(report["six_star_rate"] - six_rate) < 0.002
+    assert abs(report["refund_per_pull"] - refund) / refund < 0.02
+    assert abs(report["first_six_star_pulls"]["mean"] - first) < 1.0
+    assert report["no_six_star_players"] == 0  # 保底在 100 抽内一定出六星
+    assert report["first_six_star_pulls"]["max"] <= gacha_fixed.PITY_THRESHOLD + 1 / gacha_fixed.PITY_STEP
+    print("✅ 抽卡模拟器测试完成！\n")
+
+
+def test_first_six_star_expectation():
+    """第一个六星的平均抽数等于按保底规则算出的期望 sum(P(前 j 抽都不是六星))"""
+    if gacha_sim.np is None:
+        return
+    survival, expected, pull = 1.0, 0.0, 0
+    while survival > 0:
+        expected += survival
+        pull += 1
+        pity = min(1.0, max(0, pull - gacha_fixed.PITY_THRESHOLD) * gacha_fixed.PITY_STEP)
+        survival *= 1 - gacha_fixed.current_rates(pity)[6]
+    report = gacha_sim.simulate(300000, 200, seed=2)
+    assert abs(report["first_six_star_pulls"]["mean"] - expected) < 0.2, (report, expected)
+
+
+def test_rules_and_seed():
+    """相同种子结果相同；调整规则后结果随之变化；没有六星奖品时报错"""
+    if gacha_sim.np is None:
+        return
+    assert gacha_sim.simulate(1000, 100, seed=3) == gacha_sim.simulate(1000, 100, seed=3)
+
+    rules = gacha_sim.default_rules()
+    cheaper = gacha_sim.simulate(20000, 100, rules._replace(ten_cost=5000), seed=4)
+    assert cheaper["net_cost"]["mean"] < gacha_sim.simulate(20000, 100, rules, seed=4)["net_cost"]["mean"]
+    no_refund = gacha_sim.simulate(1000, 100, rules._replace(refund={}), seed=5)
+    assert no_refund["refund_per_pull"] == 0
+    assert no_refund["net_cost"]["max"] == gacha_fixed.draw_cost(100)
+
+    try:
+        gacha_sim.simulate(10, 10, rules._replace(pool_sizes={5: 1, 4: 1, 3: 1}))
+        assert False, "没有六星奖品应当报错"
+    except ValueError:
+        pass
+
+
+if __name__ == "__main__":
+    test_matches_replay()
+    test_first_six_star_expectation()
+    test_rules_and_seed()
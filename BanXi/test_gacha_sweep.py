@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+抽卡参数扫描测试脚本
+验证参数网格展开、多进程与单进程结果一致，以及 .npz 结果文件的读写
+"""
+
+import os
+import sys
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import gacha_fixed
+import gacha_sim
+import gacha_sweep
+import testing
+
+SMALL_GRID = {
+    "six_rate": (0.02, 0.03),
+    "pity_threshold": (50,),
+    "pity_step": (0.02, 0.05),
+    "refund_scale": (1.0,),
+    "ten_cost": (5400, 6000),
+}
+
+
+def test_candidate_rules():
+    """当前参数对应的规则与 default_rules() 相同，调整六星概率后总概率仍为 1"""
+    current = gacha_sweep.candidate_rules(gacha_fixed.DEFAULT_RATES[6], gacha_fixed.PITY_THRESHOLD,
+                                          gacha_fixed.PITY_STEP, 1.0, gacha_fixed.SINGLE_DRAW_COST,
+                                          gacha_fixed.TEN_DRAW_COST)
+    default = gacha_sim.default_rules()
+    assert all(abs(current.rates[star] - default.rates[star]) < 1e-12 for star in default.rates)
+    assert current._replace(rates=default.rates) == default
+
+    rules = gacha_sweep.candidate_rules(0.05, 40, 0.1, 0.5, 600, 5000)
+    assert rules.rates[6] == 0.05 and abs(sum(rules.rates.values()) - 1) < 1e-12
+    assert rules.refund == {star: coins // 2 for star, coins in gacha_fixed.DEFAULT_REFUND.items()}
+
+
+def test_sweep():
+    """多进程扫描与单进程结果相同，结果文件每个参数和统计一列"""
+    print("=== 抽卡参数扫描测试 ===")
+    if gacha_sweep.np is None:
+        print("未安装 numpy，跳过")
+        return
+    out = os.path.join(testing.temp_dir(), "sweep.npz")
+    columns = gacha_sweep.sweep(SMALL_GRID, players=5000, pulls=100, seed=7, workers=2, out=out)
+    assert len(columns["six_rate"]) == 8
+    assert list(columns["ten_cost"]) == [5400, 6000] * 4
+
+    serial = gacha_sweep.sweep(SMALL_GRID, players=5000, pulls=100, seed=7, workers=1)
+    loaded = gacha_sweep.load(out)
+    assert sorted(loaded) == sorted(columns)
+    for name in columns:
+        assert (loaded[name] == columns[name]).all(), name
+        assert (serial[name] == columns[name]).all(), name
+
+    # 六星概率越高、十连越便宜，每个六星的净花费越少
+    costs = columns["coins_per_six_star"].reshape(2, 2, 2)
+    assert (costs[1] < costs[0]).all()
+    assert (costs[:, :, 0] < costs[:, :, 1]).all()
+    print(f"每个六星的净花费: {', '.join(f'{c:.0f}' for c in columns['coins_per_six_star'])}")
+    print("✅ 抽卡参数扫描测试完成！\n")
+
+
+if __name__ == "__main__":
+    test_candidate_rules()
+    test_sweep()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量导入测试脚本
+验证 CSV / JSON Lines 导入、非法行跳过以及取消导入时整体回滚
+"""
+
+import json
+import os
+import sys
+import time
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import db
+import importer
+import testing
+
+
+def test_import_csv_tasks():
+    """几千行任务的 CSV 一次导入，非法行被跳过并报告行号"""
+    print("=== CSV 任务导入测试 ===")
+    user_id = testing.use_temp_database(storage=None)
+    workdir = testing.temp_dir()
+    path = os.path.join(workdir, "tasks.csv")
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        f.write("name,xp_reward,platinum_reward\r\n")
+        for i in range(5000):
+            f.write(f"第{i}课预习,{30 + i % 50},\r\n")
+        f.write(",10,0\r\n")          # 缺少名称
+        f.write("负经验,-5,0\r\n")     # 经验为负
+
+    calls = []
+    start = time.perf_counter()
+    res = importer.import_file("tasks", path, user_id=user_id,
+                               progress=lambda done, total, n: calls.append((done, total, n)))
+    elapsed = (time.perf_counter() - start) * 1000
+
+    assert res["success"] and res["imported"] == 5000, res
+    assert res["error_count"] == 2
+    assert [line for line, _ in res["errors"]] == [5002, 5003], res["errors"]
+    assert calls[-1][0] == calls[-1][1] == os.path.getsize(path)
+    assert len(db.get_tasks(user_id)) == 5000
+    print(f"导入 {res['imported']} 条任务，耗时 {elapsed:.2f} ms，进度回调 {len(calls)} 次")
+    print("✅ CSV 任务导入测试完成！\n")
+
+
+def test_import_jsonl_and_cancel():
+    """JSON Lines 导入奖池物品；进度回调返回 False 时不写入任何数据"""
+    print("=== JSON Lines 导入与取消测试 ===")
+    user_id = testing.use_temp_database(storage=None)
+    workdir = testing.temp_dir()
+    path = os.path.join(workdir, "items.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(1200):
+            f.write(json.dumps({"name": f"导入物品{i}", "star": 3 + i % 4}, ensure_ascii=False) + "\n")
+        f.write("不是 JSON\n")
+        f.write(json.dumps({"name": "七星", "star": 7}, ensure_ascii=False) + "\n")
+
+    conn = db.get_db_connection()
+    before = conn.execute("SELECT COUNT(*) FROM gacha_items").fetchone()[0]
+
+    res = importer.import_file("gacha_items", path, progress=lambda done, total, n: n < 1000)
+    assert res == {"success": False, "reason": "cancelled", "imported": 0,
+                   "error_count": 0, "errors": []}, res
+    assert conn.execute("SELECT COUNT(*) FROM gacha_items").fetchone()[0] == before
+
+    res = importer.import_file("gacha_items", path)
+    assert res["success"] and res["imported"] == 1200 and res["error_count"] == 2, res
+    assert conn.execute("SELECT COUNT(*) FROM gacha_items").fetchone()[0] == before + 1200
+
+    assert importer.import_file("rewards", path)["reason"] == "user_required"
+    print("✅ JSON Lines 导入与取消测试完成！\n")
+
+
+if __name__ == "__main__":
+    test_import_csv_tasks()
+    test_import_jsonl_and_cancel()
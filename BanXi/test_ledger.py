@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+货币账本测试脚本
+验证各种收支都记入账本、账本与余额一致，以及借助检查点统计时间范围内的收支
+"""
+
+import os
+import sys
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import db
+import gacha_fixed
+import ledger
+import repeat_tasks
+import testing
+
+
+def test_every_change_is_recorded():
+    """任务、重复任务、兑换、抽卡、铂金币兑换和发放都追加账本记录"""
+    print("=== 账本记录测试 ===")
+    user_id = testing.use_temp_database()
+
+    db.update_user(user_id, coins=10000)
+    db.add_task(user_id, "任务", 150, platinum_reward=2)
+    task_id = db.get_tasks(user_id)[0]["id"]
+    db.complete_task(task_id)
+    repeat_tasks.add_repeat_task(user_id, "重复", 10)
+    repeat_tasks.complete_repeat_task(repeat_tasks.get_repeat_tasks(user_id)[-1][0])
+    db.add_reward(user_id, "奖励", 100)
+    reward_id = db.get_rewards(user_id)[0]["id"]
+    db.redeem_reward(reward_id)
+    gacha_fixed.draw_gacha_10(user_id)
+    db.add_platinum_coins(user_id, 5)
+    db.exchange_platinum_to_gold(user_id, 3)
+
+    # 余额不足的兑换被回滚，不留下账本记录
+    db.add_reward(user_id, "太贵了", 10 ** 9)
+    db.redeem_reward(db.get_rewards(user_id)[0]["id"])
+
+    history = ledger.get_history(user_id)
+    reasons = [row["reason"] for row in reversed(history)]
+    # 默认用户在迁移时记下期初余额；十连是否有重复返还取决于抽卡结果
+    assert reasons[:6] == ["opening", "adjust", "task", "repeat_task", "reward", "gacha"], reasons
+    assert reasons[6:] in (["platinum_grant", "exchange"], ["gacha_refund", "platinum_grant", "exchange"]), reasons
+    assert [row["seq"] for row in reversed(history)] == list(range(1, len(history) + 1))
+
+    task_entry = next(row for row in history if row["reason"] == "task")
+    assert task_entry["ref_id"] == task_id and task_entry["xp_delta"] == 150
+    reward_entry = next(row for row in history if row["reason"] == "reward")
+    assert reward_entry["ref_id"] == reward_id and reward_entry["coins_delta"] == -100
+
+    # 最新记录的余额就是 users 表中的余额
+    user = db.get_user(user_id)
+    assert (history[0]["coins"], history[0]["platinum_coins"]) == (user.coins, user.platinum_coins)
+    assert ledger.verify_user(user_id)
+    for row in history:
+        print(f"{row['seq']:>3} {ledger.REASON_LABELS[row['reason']]:<8} "
+              f"金币{row['coins_delta']:+} 铂金币{row['platinum_delta']:+} -> {row['coins']}/{row['platinum_coins']}")
+    print("✅ 账本记录测试完成！\n")
+
+
+def test_checkpoints_and_totals():
+    """跨越多个检查点后，按时间范围统计的结果与逐条累加一致"""
+    print("=== 检查点统计测试 ===")
+    user_id = testing.use_temp_database()
+    conn = db.get_db_connection()
+
+    # 用固定的时间戳写入记录，模拟不同日期的收支
+    entries = 2 * ledger.CHECKPOINT_INTERVAL + 37
+    for i in range(entries):
+        if i % 3 == 2:
+            u = db.change_balance(conn, user_id, coins=-5, reason="gacha")
+        else:
+            u = db.change_balance(conn, user_id, coins=10, platinum=1, reason="platinum_grant")
+        assert u is not None
+        conn.execute("UPDATE currency_ledger SET created_at=? WHERE id=last_insert_rowid()",
+                     (f"2024-01-{1 + i // 30:02d} 12:{i % 30:02d}:00",))
+        # 检查点记录的时间要与对应账本记录一致
+        conn.execute("""
+            UPDATE ledger_checkpoints SET created_at=(
+                SELECT created_at FROM currency_ledger l
+                WHERE l.user_id=ledger_checkpoints.user_id AND l.seq=ledger_checkpoints.seq)
+        """)
+    conn.commit()
+
+    checkpoints = conn.execute("SELECT COUNT(*) FROM ledger_checkpoints WHERE user_id=?",
+                               (user_id,)).fetchone()[0]
+    assert checkpoints == entries // ledger.CHECKPOINT_INTERVAL
+
+    def brute_force(start, end):
+        rows = conn.execute("""
+            SELECT coins_delta, platinum_delta FROM currency_ledger
+            WHERE user_id=? AND created_at>? AND created_at<=?
+        """, (user_id, start, end)).fetchall()
+        return {
+            "coins_earned": sum(c for c, _ in rows if c > 0),
+            "coins_spent": sum(-c for c, _ in rows if c < 0),
+            "platinum_earned": sum(p for _, p in rows if p > 0),
+        }
+
+    for start, end in [("2024-01-02 00:00:00", "2024-01-05 12:10:00"),
+                       ("2024-01-03 12:05:00", "2024-01-08 23:59:59"),
+                       ("2023-12-31 00:00:00", "2024-12-31 00:00:00")]:
+        totals = ledger.get_totals(user_id, start, end)
+        expected = brute_force(start, end)
+        assert {name: totals[name] for name in expected} == expected, (start, end, totals, expected)
+        print(f"{start} ~ {end}: {totals}")
+
+    balance = ledger.get_balance_at(user_id, "2024-01-02 12:00:00")
+    last = conn.execute("""
+        SELECT coins FROM currency_ledger WHERE user_id=? AND created_at<='2024-01-02 12:00:00'
+        ORDER BY seq DESC LIMIT 1
+    """, (user_id,)).fetchone()[0]
+    assert balance["coins"] == last
+    assert ledger.verify_user(user_id)
+    conn.close()
+    print("✅ 检查点统计测试完成！\n")
+
+
+if __name__ == "__main__":
+    test_every_change_is_recorded()
+    test_checkpoints_and_totals()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+内存数据库测试脚本
+验证内存数据库不读写磁盘、可以从文件载入初始内容、退出前写回文件，以及通过环境变量选择
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import db
+import migrations
+import testing
+
+
+def test_memory_database_isolated():
+    """每个内存数据库都从默认数据开始，连接池重建后数据仍在，其他线程看到同一个库"""
+    print("=== 内存数据库测试 ===")
+    workdir = testing.temp_dir()
+    db.DB_FILE = os.path.join(workdir, "data.db")
+    assert db.init_db(storage="memory")
+    assert db.is_memory_database() and os.listdir(workdir) == []
+
+    user_id = db.get_users()[0].id
+    db.add_task(user_id, "内存中的任务", 10)
+    db.close_db_connections()
+    assert [t["name"] for t in db.get_tasks(user_id)] == ["内存中的任务"]
+    seen = []
+    worker = threading.Thread(target=lambda: seen.append(len(db.get_tasks(user_id))))
+    worker.start()
+    worker.join()
+    assert seen == [1]
+
+    # 已是内存数据库时 init_db 只补齐迁移
+    assert not db.init_db()
+    assert len(db.get_tasks(user_id)) == 1
+
+    db.use_memory_database()
+    db.init_db()
+    assert db.get_tasks(user_id) == []
+    assert migrations.get_schema_version(db.get_db_connection()) == migrations.SCHEMA_VERSION
+    print("✅ 内存数据库测试完成！\n")
+
+
+def test_seed_and_flush():
+    """从文件载入初始内容，修改只在写回时落盘"""
+    print("=== 内存数据库载入与写回测试 ===")
+    workdir = testing.temp_dir()
+    path = os.path.join(workdir, "data.db")
+    db.DB_FILE = path
+    db.init_db(storage="file")
+    user_id = db.get_users()[0].id
+    db.add_task(user_id, "文件中的任务", 10)
+    db.close_db_connections()
+
+    flushed = os.path.join(workdir, "flushed.db")
+    db.init_db(storage="memory", seed=path, flush_to=flushed)
+    assert [t["name"] for t in db.get_tasks(user_id)] == ["文件中的任务"]
+    db.add_task(user_id, "内存中的任务", 10)
+    assert not os.path.exists(flushed)
+
+    db.close_memory_database()
+    assert db.DB_FILE == path and not db.is_memory_database()
+    for name, count in ((path, 1), (flushed, 2)):
+        conn = sqlite3.connect(name)
+        assert conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0] == count
+        assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+        conn.close()
+    print("✅ 内存数据库载入与写回测试完成！\n")
+
+
+def test_storage_from_env():
+    """环境变量 BANXI_STORAGE 选择存储方式"""
+    print("=== 存储方式环境变量测试 ===")
+    previous = os.environ.get("BANXI_STORAGE")
+    try:
+        os.environ["BANXI_STORAGE"] = "memory"
+        db.DB_FILE = testing.temp_db_path()
+        db.init_db()
+        assert db.is_memory_database()
+        os.environ["BANXI_STORAGE"] = "disk"
+        try:
+            db.init_db()
+            assert False, "未知的存储方式应报错"
+        except ValueError:
+            pass
+    finally:
+        if previous is None:
+            os.environ.pop("BANXI_STORAGE", None)
+        else:
+            os.environ["BANXI_STORAGE"] = previous
+    print("✅ 存储方式环境变量测试完成！\n")
+
+
+if __name__ == "__main__":
+    test_memory_database_isolated()
+    test_seed_and_flush()
+    test_storage_from_env()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库迁移测试脚本
+验证新数据库和旧版本数据库都能通过 migrations 升级到最新结构
+"""
+
+import os
+import sqlite3
+import sys
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import db
+import migrations
+import testing
+
+
+def test_fresh_database():
+    """新数据库：一次性应用全部迁移并写入默认数据"""
+    print("=== 新数据库迁移测试 ===")
+    db.DB_FILE = testing.temp_db_path()
+
+    created = db.init_db(storage="file")
+    conn = db.get_db_connection()
+    assert created
+    assert migrations.get_schema_version(conn) == migrations.SCHEMA_VERSION
+
+    users = [row["name"] for row in conn.execute("SELECT name FROM users ORDER BY id")]
+    assert users == ["玖", "未"], users
+    repeat_count = conn.execute("SELECT COUNT(*) FROM repeat_tasks").fetchone()[0]
+    assert repeat_count == 2 * 4, repeat_count
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    for name, _table, _sql in migrations.MANAGED_INDEXES:
+        assert name in indexes, name
+
+    # 再次启动时不应重复执行迁移
+    assert migrations.migrate(conn) == 0
+    print(f"结构版本: v{migrations.SCHEMA_VERSION}，默认用户: {users}，重复任务: {repeat_count}")
+    print("✅ 新数据库迁移测试完成！\n")
+
+
+def test_legacy_database():
+    """旧数据库：缺少后加列、没有 user_version，升级后数据保留"""
+    print("=== 旧版本数据库迁移测试 ===")
+    path = db.DB_FILE = testing.temp_db_path()
+
+    legacy = sqlite3.connect(path)
+    legacy.executescript("""
+        CREATE TABLE users(id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE,
+                           xp INTEGER DEFAULT 0, level INTEGER DEFAULT 1, coins INTEGER DEFAULT 0);
+        CREATE TABLE tasks(id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, name TEXT,
+                           xp_reward INTEGER, completed INTEGER DEFAULT 0,
+                           created_at TEXT DEFAULT CURRENT_TIMESTAMP);
+        CREATE TABLE rewards(id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, name TEXT,
+                             price INTEGER, completed INTEGER DEFAULT 0,
+                             created_at TEXT DEFAULT CURRENT_TIMESTAMP);
+        INSERT INTO users(name, xp, level, coins) VALUES('玖', 50, 3, 1234);
+        INSERT INTO tasks(user_id, name, xp_reward) VALUES(1, '旧任务', 80);
+    """)
+    legacy.commit()
+    legacy.close()
+
+    created = db.init_db(storage="file")
+    conn = db.get_db_connection()
+    assert not created
+    assert migrations.get_schema_version(conn) == migrations.SCHEMA_VERSION
+
+    user = conn.execute("SELECT xp, level, coins, platinum_coins FROM users WHERE name='玖'").fetchone()
+    assert tuple(user) == (50, 3, 1234, 0), tuple(user)
+    task = conn.execute("SELECT name, platinum_reward FROM tasks").fetchone()
+    assert tuple(task) == ("旧任务", 0), tuple(task)
+    reward_columns = {row[1] for row in conn.execute("PRAGMA table_info(rewards)")}
+    assert "currency_type" in reward_columns
+    print(f"升级后用户数据: {tuple(user)}，任务: {tuple(task)}")
+    print("✅ 旧版本数据库迁移测试完成！\n")
+
+
+def test_failed_migration_rolls_back():
+    """迁移失败时整个升级回滚，版本号保持不变"""
+    print("=== 迁移失败回滚测试 ===")
+    db.DB_FILE = testing.temp_db_path()
+    conn = db.get_db_connection()
+
+    def broken(conn):
+        conn.execute("CREATE TABLE half_done(id INTEGER)")
+        raise RuntimeError("模拟迁移失败")
+
+    original = list(migrations.MIGRATIONS)
+    migrations.MIGRATIONS.append((migrations.SCHEMA_VERSION + 1, "失败的迁移", broken))
+    migrations.SCHEMA_VERSION += 1
+    try:
+        migrations.migrate(conn)
+        raise AssertionError("迁移应当失败")
+    except RuntimeError:
+        pass
+    finally:
+        migrations.MIGRATIONS[:] = original
+        migrations.SCHEMA_VERSION = original[-1][0]
+
+    assert migrations.get_schema_version(conn) == 0
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    assert "half_done" not in tables and "users" not in tables, tables
+    print("✅ 迁移失败回滚测试完成！\n")
+
+
+if __name__ == "__main__":
+    test_fresh_database()
+    test_legacy_database()
+    test_failed_migration_rolls_back()
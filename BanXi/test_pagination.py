@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+列表分页测试脚本
+验证按 (completed, id) 游标逐页读取的结果与一次读取全部相同，且深处的页不会变慢
+"""
+
+import os
+import sys
+import time
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import db
+import repeat_tasks
+import testing
+
+
+def read_all_pages(fetch_page, user_id, limit):
+    rows = []
+    cursor = None
+    pages = 0
+    while True:
+        page, cursor = fetch_page(user_id, cursor, limit)
+        rows.extend(tuple(row) for row in page)
+        pages += 1
+        if cursor is None:
+            return rows, pages
+
+
+def test_pages_match_full_list():
+    """任务、奖励、重复任务逐页读取，拼起来与完整列表一致"""
+    print("=== 分页一致性测试 ===")
+    user_id = testing.use_temp_database()
+    conn = db.get_db_connection()
+    conn.executemany("INSERT INTO tasks(user_id, name, xp_reward, completed) VALUES(?,?,?,?)",
+                     [(user_id, f"任务{i}", 10, 1 if i % 3 else 0) for i in range(1000)])
+    conn.executemany("INSERT INTO rewards(user_id, name, price, completed) VALUES(?,?,?,?)",
+                     [(user_id, f"奖励{i}", 100, i % 2) for i in range(230)])
+    conn.commit()
+
+    cases = [(db.get_tasks_page, db.get_tasks), (db.get_rewards_page, db.get_rewards),
+             (repeat_tasks.get_repeat_tasks_page, repeat_tasks.get_repeat_tasks)]
+    for fetch_page, get_all in cases:
+        expected = [tuple(row) for row in get_all(user_id)]
+        for limit in (1, 7, 50, len(expected), len(expected) + 1):
+            rows, pages = read_all_pages(fetch_page, user_id, limit)
+            assert rows == expected, (fetch_page.__name__, limit)
+        print(f"{fetch_page.__name__}: {len(expected)} 行")
+
+    # 未完成的任务排在前面
+    first, cursor = db.get_tasks_page(user_id, limit=10)
+    assert all(row["completed"] == 0 for row in first) and cursor == (0, first[-1]["id"])
+    print("✅ 分页一致性测试完成！\n")
+
+
+def test_deep_page_cost():
+    """已完成的任务很多时，读取靠后的页与读取第一页的开销相当"""
+    print("=== 分页开销测试 ===")
+    user_id = testing.use_temp_database()
+    conn = db.get_db_connection()
+    conn.executemany("INSERT INTO tasks(user_id, name, xp_reward, completed) VALUES(?,?,?,?)",
+                     [(user_id, f"历史任务{i}", 10, 1) for i in range(100000)])
+    conn.commit()
+    last_id = conn.execute("SELECT MAX(id) FROM tasks").fetchone()[0]
+
+    def timed(after):
+        start = time.perf_counter()
+        for _ in range(20):
+            db.get_tasks_page(user_id, after)
+        return (time.perf_counter() - start) / 20 * 1000
+
+    first = timed(None)
+    deep = timed((1, last_id - 100))
+    start = time.perf_counter()
+    db.get_tasks(user_id)
+    everything = (time.perf_counter() - start) * 1000
+    print(f"第一页 {first:.3f} ms，末尾附近 {deep:.3f} ms，全部读取 {everything:.2f} ms")
+    assert deep < first * 10 + 1
+    print("✅ 分页开销测试完成！\n")
+
+
+if __name__ == "__main__":
+    test_pages_match_full_list()
+    test_deep_page_cost()
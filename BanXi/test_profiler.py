@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+查询耗时统计测试脚本
+验证开启后记录函数、SQL 语句和事务的耗时，关闭后还原原函数
+"""
+
+import json
+import os
+import sys
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import db
+import gacha_fixed
+import profiler
+import testing
+
+
+def test_profile_hot_paths():
+    """get_tasks、draw_gacha_10 等调用被记录，结果可以导出为 JSON"""
+    print("=== 查询耗时统计测试 ===")
+    testing.use_temp_database(storage=None)
+    original_get_tasks = db.get_tasks
+
+    profiler.reset()
+    profiler.enable()
+    try:
+        user_id = db.get_users()[0].id
+        db.update_user(user_id, coins=60000)
+        for i in range(5):
+            db.add_task(user_id, f"任务{i}", 10)
+        for _ in range(3):
+            db.get_tasks(user_id)
+        gacha_fixed.draw_gacha_10(user_id)
+
+        report = profiler.get_report()
+    finally:
+        profiler.disable()
+
+    functions = report["functions"]
+    assert functions["db.get_tasks"]["count"] == 3
+    assert functions["db.get_tasks"]["rows"] == 15
+    assert functions["gacha_fixed.draw_gacha_10"]["count"] == 1
+    assert sum(functions["db.get_tasks"]["histogram"].values()) == 3
+
+    statements = report["statements"]
+    select_tasks = next(s for sql, s in statements.items() if sql.startswith("SELECT") and "FROM tasks" in sql)
+    assert select_tasks["count"] == 3 and select_tasks["rows"] == 15
+    insert_tasks = next(s for sql, s in statements.items() if sql.startswith("INSERT INTO tasks"))
+    assert insert_tasks["rows"] == 5
+
+    # draw_gacha_10 用 BEGIN IMMEDIATE 持有写锁
+    assert report["transactions"]["BEGIN IMMEDIATE -> COMMIT"]["count"] == 1
+
+    path = os.path.join(testing.temp_dir(), "profile.json")
+    profiler.dump(path)
+    with open(path, encoding="utf-8") as f:
+        assert "db.get_tasks" in json.load(f)["functions"]
+
+    # 关闭后函数和连接都恢复原样
+    assert db.get_tasks is original_get_tasks
+    assert type(db.get_db_connection()) is db.PooledConnection
+    print(profiler.format_report(limit=5))
+    print("✅ 查询耗时统计测试完成！\n")
+
+
+if __name__ == "__main__":
+    test_profile_hot_paths()
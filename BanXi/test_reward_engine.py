@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+升级奖励引擎测试脚本
+对比闭式解与原先逐级循环的结算结果，并检查大额经验的结算耗时
+"""
+
+import os
+import sys
+import time
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import reward_engine
+
+
+def walk_levels(level, xp, xp_gained):
+    """原先 complete_task 中的逐级循环，只保留确定性部分用于对照"""
+    new_xp = xp + xp_gained
+    leveled = 0
+    platinum = 0
+    bases = []
+    xp_needed = reward_engine.xp_required_for_level(level)
+    while new_xp >= xp_needed:
+        new_xp -= xp_needed
+        level += 1
+        leveled += 1
+        bases.append(xp_needed)
+        if level % 2 == 0:
+            platinum += 1
+        xp_needed = reward_engine.xp_required_for_level(level)
+    return level, new_xp, leveled, platinum, bases
+
+
+def test_matches_level_walk():
+    """各种等级和经验组合下，闭式解与逐级循环结果一致"""
+    print("=== 闭式解与逐级循环对照测试 ===")
+    cases = 0
+    for level in list(range(1, 40)) + [99, 100, 1000]:
+        for xp in (0, 1, 50):
+            for gained in list(range(0, 600, 7)) + [5000, 12345, 99999]:
+                outcome = reward_engine.apply_xp(level, xp, gained)
+                expected_level, expected_xp, leveled, platinum, bases = walk_levels(level, xp, gained)
+                assert outcome["level"] == expected_level, (level, xp, gained)
+                assert outcome["xp"] == expected_xp, (level, xp, gained)
+                assert outcome["leveled"] == leveled
+                assert outcome["platinum_gained"] == platinum
+                shown = bases[:reward_engine.MAX_LEVEL_UP_DETAILS]
+                assert [d["base_reward"] for d in outcome["level_up_details"]] == shown
+                assert outcome["level_up_details_omitted"] == leveled - len(shown)
+                cases += 1
+    print(f"共对照 {cases} 组输入")
+    print("✅ 对照测试完成！\n")
+
+
+def test_coin_rewards_within_multiplier_range():
+    """每级金币奖励落在 [0.8, 1.5] 倍基础奖励之间，总额等于各级之和"""
+    print("=== 升级金币范围测试 ===")
+    outcome = reward_engine.apply_xp(1, 0, 3000)
+    total = 0
+    for detail in outcome["level_up_details"]:
+        base = detail["base_reward"]
+        assert int(base * reward_engine.MIN_COIN_MULTIPLIER) <= detail["actual_reward"]
+        assert detail["actual_reward"] <= int(base * reward_engine.MAX_COIN_MULTIPLIER)
+        total += detail["actual_reward"]
+    assert outcome["level_up_details_omitted"] == 0
+    assert total == outcome["coins_gained"]
+    print(f"升级 {outcome['leveled']} 次，获得 {outcome['coins_gained']} coins")
+    print("✅ 升级金币范围测试完成！\n")
+
+
+def test_bulk_xp_is_fast():
+    """一次获得大量经验时结算耗时与升级次数基本无关"""
+    print("=== 大额经验结算耗时测试 ===")
+    start = time.perf_counter()
+    outcome = reward_engine.apply_xp(1, 0, 50_000_000)
+    elapsed = (time.perf_counter() - start) * 1000
+    assert outcome["leveled"] > 2000
+    assert len(outcome["level_up_details"]) == reward_engine.MAX_LEVEL_UP_DETAILS
+    print(f"升级 {outcome['leveled']} 次，耗时 {elapsed:.2f} ms")
+    print("✅ 大额经验结算耗时测试完成！\n")
+
+
+if __name__ == "__main__":
+    test_matches_level_walk()
+    test_coin_rewards_within_multiplier_range()
+    test_bulk_xp_is_fast()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+名称搜索测试脚本
+验证全文索引随增删改和归档同步，中文子串和短查询都能搜到，大量记录时仍然很快
+"""
+
+import os
+import sys
+import time
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import archive
+import db
+import repeat_tasks
+import search
+import testing
+
+
+def names(rows):
+    return sorted(row["name"] for row in rows)
+
+
+def test_index_follows_changes():
+    """新增、改名、删除、归档后搜索结果随之变化，其他用户的记录搜不到"""
+    print("=== 搜索同步测试 ===")
+    user_id = testing.use_temp_database()
+    other_id = db.get_users()[1].id
+    db.add_task(user_id, "背英语单词", 10)
+    db.add_task(user_id, "复习数学笔记", 10)
+    db.add_task(other_id, "背英语单词", 10)
+    repeat_tasks.add_repeat_task(user_id, "每天背英语单词", 5, 30)
+    db.add_reward(user_id, "英语原版小说", 100)
+
+    results = search.search(user_id, "英语单")
+    assert names(results["tasks"]) == ["背英语单词"]
+    assert names(results["repeat_tasks"]) == ["每天背英语单词"]
+    assert results["rewards"] == []
+
+    # 两个字符时退回 LIKE 查询
+    results = search.search(user_id, "英语")
+    assert names(results["tasks"]) == ["背英语单词"]
+    assert names(results["rewards"]) == ["英语原版小说"]
+
+    task_id = results["tasks"][0]["id"]
+    conn = db.get_db_connection()
+    conn.execute("UPDATE tasks SET name='背日语单词' WHERE id=?", (task_id,))
+    conn.commit()
+    assert search.search(user_id, "背英语")["tasks"] == []
+    assert names(search.search(user_id, "日语单词")["tasks"]) == ["背日语单词"]
+
+    db.complete_task(task_id)
+    assert names(search.search(user_id, "日语单词")["tasks"]) == ["背日语单词"]
+    archive.archive_completed(older_than_days=-1)
+    assert search.search(user_id, "日语单词")["tasks"] == []
+
+    math_id = search.search(user_id, "数学笔")["tasks"][0]["id"]
+    db.delete_task(math_id)
+    assert search.search(user_id, "数学笔")["tasks"] == []
+
+    # 奖池物品同时匹配名称和描述，不区分用户
+    conn.execute("INSERT INTO gacha_items(name, star, description) VALUES('星光徽章', 6, '限定的纪念品')")
+    conn.commit()
+    assert names(search.search(other_id, "纪念品")["gacha_items"]) == ["星光徽章"]
+    assert names(search.search(other_id, "星光")["gacha_items"]) == ["星光徽章"]
+
+    # 引号、通配符按普通字符处理
+    db.add_task(user_id, 'say "hi" 100%_done', 10)
+    assert len(search.search(user_id, '"hi" 100%')["tasks"]) == 1
+    assert search.search(user_id, "%_")["tasks"][0]["name"] == 'say "hi" 100%_done'
+    assert search.search(user_id, "   ") == {kind: [] for kind in search.SEARCH_SOURCES}
+    print("✅ 搜索同步测试完成！\n")
+
+
+def test_search_speed():
+    """几十万条任务时，索引查询在几毫秒内返回"""
+    print("=== 搜索速度测试 ===")
+    user_id = testing.use_temp_database()
+    words = ["背单词", "跑步", "读书笔记", "整理房间", "写周报", "练习吉他", "复习数学", "做饭"]
+    conn = db.get_db_connection()
+    conn.executemany("INSERT INTO tasks(user_id, name, xp_reward) VALUES(?,?,10)",
+                     [(user_id, f"{words[i % len(words)]}第{i}次") for i in range(300000)])
+    conn.commit()
+
+    start = time.perf_counter()
+    for _ in range(20):
+        results = search.search(user_id, "读书笔记")
+    elapsed = (time.perf_counter() - start) / 20 * 1000
+    assert len(results["tasks"]) == search.SEARCH_LIMIT
+
+    start = time.perf_counter()
+    rare = search.search(user_id, "第123456次")
+    rare_elapsed = (time.perf_counter() - start) * 1000
+    assert names(rare["tasks"]) == [f"{words[123456 % len(words)]}第123456次"]
+    print(f"30 万条任务：常见词 {elapsed:.2f} ms，罕见词 {rare_elapsed:.2f} ms")
+    assert elapsed < 100 and rare_elapsed < 100
+    print("✅ 搜索速度测试完成！\n")
+
+
+if __name__ == "__main__":
+    test_index_follows_changes()
+    test_search_speed()
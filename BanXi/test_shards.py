@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按用户分库测试脚本
+验证单文件数据库拆分后每个用户的数据在各自的文件中，切换用户后各线程的连接 ATTACH 对应的文件
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import archive
+import backup
+import db
+import gacha_fixed
+import ledger
+import search
+import shards
+import sweeper
+import testing
+
+
+def table_names(path):
+    conn = sqlite3.connect(path)
+    names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    conn.close()
+    return names
+
+
+def test_split_and_switch_users():
+    """拆分后公共库只有用户和奖池，任务、抽卡记录、账本按用户保存在各自的文件中"""
+    print("=== 分库测试 ===")
+    first = testing.use_temp_database("file")  # 分库从数据库文件拆分
+    second = db.get_users()[1].id
+    conn = db.get_db_connection()
+    conn.executemany("INSERT INTO tasks(user_id, name, xp_reward) VALUES(?,?,10)",
+                     [(second, f"乙的任务{i}") for i in range(20000)])
+    conn.commit()
+    db.add_task(first, "甲的任务", 10)
+    source_tasks = conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+
+    shard_dir = shards.enable()
+    try:
+        files = shards.list_shard_files()
+        assert sorted(files) == [first, second]
+        catalog = table_names(db.DB_FILE)
+        assert {"users", "gacha_items"} <= catalog and "tasks" not in catalog and "gacha_records" not in catalog
+        assert "users" not in table_names(files[first]) and "tasks" in table_names(files[first])
+        assert "gacha_pool_version" in catalog and "gacha_pool_version" not in table_names(files[first])
+
+        db.use_user_shard(first)
+        assert [t["name"] for t in db.get_tasks(first)] == ["甲的任务"]
+        db.add_task(first, "切换后新增", 10)
+        assert len(search.search(first, "切换后")["tasks"]) == 1
+        db.update_user(first, coins=20000)
+        assert gacha_fixed.draw_gacha_10(first)["success"]
+        assert ledger.verify_user(first)
+        # 两个文件都用回滚日志，改余额和记账跨文件的事务才能一起提交
+        conn = db.get_db_connection()
+        assert [conn.execute(f"PRAGMA {schema}.journal_mode").fetchone()[0]
+                for schema in ("main", db.SHARD_SCHEMA)] == ["delete", "delete"]
+        # 第一个用户的文件不受第二个用户两万条任务的影响
+        assert os.path.getsize(files[first]) * 5 < os.path.getsize(files[second])
+
+        db.use_user_shard(second)
+        assert len(db.get_tasks(second)) == source_tasks - 1
+
+        # 后台线程的连接在下一次取用时切换到当前用户的文件
+        seen = []
+        worker = threading.Thread(target=lambda: seen.append(len(db.get_tasks(second))))
+        worker.start()
+        worker.join()
+        db.use_user_shard(first)
+        worker = threading.Thread(target=lambda: seen.append(len(db.get_tasks(first))))
+        worker.start()
+        worker.join()
+        assert seen == [source_tasks - 1, 2]
+
+        # 每个用户库单独备份
+        backup.run_scheduled_backup(interval=0)
+        names = os.listdir(backup.get_backup_dir())
+        assert any(n.startswith("catalog-") for n in names) and any(n.startswith(f"user-{first}-") for n in names)
+        # 公共库和用户库的备份不是同一时刻的快照，分库布局下不能恢复
+        assert backup.restore_backup(backup.list_backups()[0])["reason"] == "shards_enabled"
+        print(f"拆分到 {shard_dir}：{sorted(os.path.basename(p) for p in files.values())}")
+    finally:
+        shards.disable()
+    print("✅ 分库测试完成！\n")
+
+
+def test_new_and_deleted_users():
+    """新用户第一次切换时从模板创建文件，删除用户时删除文件"""
+    print("=== 分库增删用户测试 ===")
+    testing.use_temp_database("file")
+    shards.enable()
+    try:
+        user_id = db.add_user("新用户")["id"]
+        db.use_user_shard(user_id)
+        assert db.get_tasks(user_id) == []
+        db.add_task(user_id, "第一个任务", 10)
+        path = shards.shard_path(user_id)
+        assert os.path.exists(path)
+
+        assert db.delete_user(user_id)
+        assert not os.path.exists(path) and db.get_active_shard() is None
+        assert user_id not in [u["id"] for u in db.get_users()]
+
+        # 当时删不掉（文件被占用）的用户库在下次开启分库时清理
+        shards.ensure_shard(user_id)
+        shards.disable()
+        shards.enable(os.path.dirname(path))
+        assert not os.path.exists(path)
+    finally:
+        shards.disable()
+    print("✅ 分库增删用户测试完成！\n")
+
+
+def test_balance_of_other_user():
+    """改余额只能改当前用户的：改其他用户会被拒绝，账本不会写进当前用户的文件"""
+    print("=== 分库改其他用户余额测试 ===")
+    first = testing.use_temp_database("file")
+    second = db.get_users()[1].id
+    shards.enable()
+    try:
+        db.use_user_shard(first)
+        before = db.get_user(second).coins
+        history = ledger.get_history(first)
+        conn = db.get_db_connection()
+        try:
+            db.change_balance(conn, second, coins=500, reason="platinum_grant")
+        except ValueError:
+            conn.rollback()
+        else:
+            raise AssertionError("改其他用户的余额应当被拒绝")
+        try:
+            db.update_user(second, coins=before + 1)
+        except ValueError:
+            db.get_db_connection().rollback()
+        else:
+            raise AssertionError("改写其他用户的余额应当被拒绝")
+        assert db.get_user(second).coins == before
+        assert ledger.get_history(first) == history
+
+        # 切换到该用户后可以正常改余额，账本写在该用户自己的文件中
+        db.use_user_shard(second)
+        conn = db.get_db_connection()
+        assert db.change_balance(conn, second, coins=500, reason="platinum_grant").coins == before + 500
+        conn.commit()
+        assert ledger.verify_user(second)
+        assert ledger.get_history(second)[0]["coins_delta"] == 500
+        ledger_file = sqlite3.connect(shards.shard_path(first))
+        assert ledger_file.execute("SELECT COUNT(*) FROM currency_ledger WHERE user_id=?", (second,)).fetchone()[0] == 0
+        ledger_file.close()
+    finally:
+        shards.disable()
+    print("✅ 分库改其他用户余额测试完成！\n")
+
+
+def test_maintenance_covers_every_shard():
+    """定时清理和归档处理每个用户库，不依赖当前 ATTACH 的用户"""
+    print("=== 分库维护测试 ===")
+    first = testing.use_temp_database("file")
+    second = db.get_users()[1].id
+    shards.enable()
+    try:
+        db.use_user_shard(second)
+        conn = db.get_db_connection()
+        conn.executemany("INSERT INTO tasks(user_id, name, xp_reward, completed, completed_at) "
+                         "VALUES(?, ?, 10, 1, datetime('now', '-60 days'))",
+                         [(second, f"旧任务{i}") for i in range(300)])
+        conn.commit()
+
+        # 没有切换到任何用户时公共库中没有任务表，也要能执行
+        db.use_user_shard(None)
+        assert sweeper.run_scheduled_sweep()["freed_pages"] >= 0
+        assert archive.run_scheduled_archive() == {"tasks": 300, "rewards": 0}
+
+        db.use_user_shard(first)
+        assert archive.run_scheduled_archive() == {"tasks": 0, "rewards": 0}
+        db.use_user_shard(second)
+        assert archive.get_archive_counts(second)["tasks"] == 300
+        assert sweeper.run_scheduled_sweep()["freed_pages"] > 0  # 归档后用户库中空出的页
+    finally:
+        shards.disable()
+    print("✅ 分库维护测试完成！\n")
+
+
+def test_clear_data():
+    """分库布局下清空数据会重建公共库和默认用户的用户库，不会把 DB_FILE 重新拆分过来"""
+    print("=== 分库清空数据测试 ===")
+    testing.use_temp_database("file")
+    shard_dir = shards.enable()
+    try:
+        user_id = db.add_user("清空前的用户")["id"]
+        db.use_user_shard(user_id)
+        db.add_task(user_id, "清空前的任务", 10)
+        path = shards.shard_path(user_id)
+
+        assert db.clear_data_file_and_reinit()
+        assert db.SHARD_DIR == shard_dir and os.path.exists(db.DB_FILE)
+        users = db.get_users()
+        assert len(users) == 2 and "清空前的用户" not in [u.name for u in users]
+        assert not os.path.exists(path) and sorted(shards.list_shard_files()) == [u.id for u in users]
+        db.use_user_shard(users[0].id)
+        assert "清空前的任务" not in [t["name"] for t in db.get_tasks(users[0].id)]
+    finally:
+        shards.disable()
+    print("✅ 分库清空数据测试完成！\n")
+
+
+if __name__ == "__main__":
+    test_split_and_switch_users()
+    test_new_and_deleted_users()
+    test_balance_of_other_user()
+    test_maintenance_covers_every_shard()
+    test_clear_data()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+级联删除与孤立记录清理测试脚本
+验证删除用户会删除其所有数据并归还空间，旧数据库升级后遗留的孤立记录可以分批清理
+"""
+
+import os
+import sqlite3
+import sys
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import archive
+import db
+import gacha_fixed
+import migrations
+import repeat_tasks
+import search
+import sweeper
+import testing
+
+
+def rows_of(conn, user_id):
+    return {table: conn.execute(f"SELECT COUNT(*) FROM {table} WHERE user_id=?", (user_id,)).fetchone()[0]
+            for table in migrations.CASCADE_FOREIGN_KEYS}
+
+
+def test_delete_user_cascades():
+    """删除用户后其所有表中的数据都被删除，数据库页数不超过创建该用户之前"""
+    print("=== 级联删除测试 ===")
+    testing.use_temp_database(storage=None)
+    conn = db.get_db_connection()
+    pages_before = conn.execute("PRAGMA page_count").fetchone()[0]
+
+    db.add_user("临时账号")
+    user_id = [u.id for u in db.get_users() if u.name == "临时账号"][0]
+    conn.executemany("INSERT INTO tasks(user_id, name, xp_reward) VALUES(?,?,10)",
+                     [(user_id, f"临时任务{i}") for i in range(20000)])
+    conn.commit()
+    db.complete_tasks([t["id"] for t in db.get_tasks(user_id)][:500])
+    archive.archive_completed(older_than_days=-1)
+    repeat_tasks.add_repeat_task(user_id, "每天跑步", 5, 30)
+    db.add_reward(user_id, "电影票", 100)
+    db.update_user(user_id, coins=100000)
+    for _ in range(3):
+        gacha_fixed.draw_gacha_10(user_id)
+
+    counts = rows_of(conn, user_id)
+    assert all(counts[t] for t in ("tasks", "tasks_archive", "repeat_tasks", "rewards",
+                                   "gacha_records", "gacha_stats", "currency_ledger")), counts
+    assert db.delete_user(user_id)
+
+    assert not any(rows_of(conn, user_id).values())
+    assert sweeper.count_orphans() == {table: 0 for table in migrations.CASCADE_FOREIGN_KEYS}
+    assert search.search(db.get_users()[0].id, "临时任务")["tasks"] == []
+    pages_after = conn.execute("PRAGMA page_count").fetchone()[0]
+    print(f"创建用户前 {pages_before} 页，删除后 {pages_after} 页")
+    assert pages_after <= pages_before
+    print("✅ 级联删除测试完成！\n")
+
+
+def test_upgrade_and_sweep_orphans():
+    """v6 的数据库升级后外键带 ON DELETE CASCADE，遗留的孤立记录分批清理，空间被归还"""
+    print("=== 孤立记录清理测试 ===")
+    path = testing.temp_db_path()
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("BEGIN")
+    for version, _, func in migrations.MIGRATIONS[:6]:
+        func(conn)
+    conn.execute("PRAGMA user_version=6")
+    conn.execute("COMMIT")
+    user_id = conn.execute("SELECT MIN(id) FROM users").fetchone()[0]
+    # 旧版本的 delete_user 只删除 tasks 和 users，留下其他表的数据
+    conn.executemany("INSERT INTO rewards(user_id, name, price) VALUES(?,?,100)",
+                     [(999, f"孤立奖励{i}") for i in range(2500)])
+    conn.executemany("INSERT INTO gacha_records(user_id, item_id) VALUES(?, 1)", [(999,)] * 1200)
+    conn.execute("INSERT INTO ledger_checkpoints VALUES(999, 100, '2020-01-01', 0, 0, 0, 0, 0)")
+    conn.execute("INSERT INTO tasks(user_id, name, xp_reward) VALUES(?, '保留的任务', 10)", (user_id,))
+    conn.execute("DELETE FROM tasks")  # AUTOINCREMENT 计数应在重建后保留
+    conn.close()
+
+    db.DB_FILE = path
+    db.init_db(storage="file")
+    conn = db.get_db_connection()
+    assert migrations.get_schema_version(conn) == migrations.SCHEMA_VERSION
+    assert conn.execute("PRAGMA foreign_key_list(rewards)").fetchone()["on_delete"] == "CASCADE"
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+
+    # 重建后ID继续递增，全文索引触发器仍然有效
+    db.add_task(user_id, "升级后的任务", 10)
+    assert db.get_tasks(user_id)[0]["id"] == 2
+    assert len(search.search(user_id, "升级后")["tasks"]) == 1
+
+    assert sweeper.count_orphans()["rewards"] == 2500
+    batches = []
+    deleted = sweeper.sweep_orphans(batch_size=1000, progress=lambda table, n: batches.append((table, n)))
+    assert deleted["rewards"] == 2500 and deleted["gacha_records"] == 1200
+    assert deleted["ledger_checkpoints"] == 1
+    assert ("rewards", 1000) in batches and ("rewards", 2000) in batches
+    assert not any(sweeper.count_orphans().values())
+
+    pages = conn.execute("PRAGMA page_count").fetchone()[0]
+    freed = sweeper.reclaim_free_pages()
+    assert freed > 0 and conn.execute("PRAGMA page_count").fetchone()[0] == pages - freed
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    print(f"清理 {deleted}，归还 {freed} 页")
+    print("✅ 孤立记录清理测试完成！\n")
+
+
+if __name__ == "__main__":
+    test_delete_user_cascades()
+    test_upgrade_and_sweep_orphans()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+用户快照缓存测试脚本
+验证本进程写入时缓存同步更新、回滚时不更新，以及其他连接改动数据库后缓存失效
+"""
+
+import os
+import sqlite3
+import sys
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import db
+import gacha_fixed
+import testing
+
+
+def test_write_through():
+    """写入路径提交后缓存中的快照直接是新值，不需要重新查询"""
+    print("=== 缓存写入测试 ===")
+    user_id = testing.use_temp_database("file")  # 外部修改测试用另一个连接打开同一个文件
+    first = db.get_user(user_id)
+    assert db.get_user(user_id) is first  # 第二次读取命中缓存
+
+    db.update_user(user_id, coins=7000)
+    assert db.get_user(user_id).coins == 7000
+
+    db.add_task(user_id, "任务", 150)
+    result = db.complete_task(db.get_tasks(user_id)[0]["id"])
+    cached = db.get_user(user_id)
+    assert (cached.level, cached.xp) == (result["new_level"], result["new_xp"])
+
+    draw = gacha_fixed.draw_gacha(user_id)
+    assert draw["success"]
+    assert db.get_user(user_id).coins == draw["remaining_coins"]
+
+    # 余额不足导致回滚时，暂存的快照不会进入缓存
+    db.add_reward(user_id, "太贵了", 10 ** 9)
+    before = db.get_user(user_id)
+    assert db.redeem_reward(db.get_rewards(user_id)[0]["id"])["reason"] == "not_enough_coins"
+    assert db.get_user(user_id) == before
+
+    # 缓存内容与数据库一致
+    row = db.get_db_connection().execute(
+        "SELECT id, name, xp, level, coins, platinum_coins FROM users WHERE id=?", (user_id,)).fetchone()
+    assert tuple(row) == tuple(db.get_user(user_id))
+    print(f"缓存中的用户: {tuple(db.get_user(user_id))}")
+    print("✅ 缓存写入测试完成！\n")
+
+
+def test_external_change_invalidates():
+    """其他连接（例如另一个进程）修改数据库后，通过 data_version 发现并重新读取"""
+    print("=== 外部修改失效测试 ===")
+    user_id = testing.use_temp_database("file")
+    assert db.get_user(user_id).coins == 0
+    users_before = db.get_users()
+
+    other = sqlite3.connect(db.DB_FILE)
+    other.execute("UPDATE users SET coins=4321 WHERE id=?", (user_id,))
+    other.execute("INSERT INTO users(name) VALUES('外部用户')")
+    other.commit()
+    other.close()
+
+    assert db.get_user(user_id).coins == 4321
+    users_after = db.get_users()
+    assert len(users_after) == len(users_before) + 1
+    assert users_after[-1]["name"] == "外部用户"
+    print("✅ 外部修改失效测试完成！\n")
+
+
+if __name__ == "__main__":
+    test_write_through()
+    test_external_change_invalidates()
@@ -0,0 +1,65 @@
+"""
+测试脚本共用的临时数据库
+
+每个测试开始时调用 use_temp_database()，得到一个已初始化的新数据库；需要临时文件时用
+temp_dir() / temp_db_path()。下一次调用、pytest 中每个测试结束后（见 conftest.py）、
+或直接运行测试脚本退出时，之前的内存数据库和临时目录都会被清理，DB_FILE 恢复原值。
+"""
+
+import atexit
+import os
+import shutil
+import tempfile
+
+import db
+
+_original_db_file = db.DB_FILE
+_temp_dirs = []
+
+
+def temp_dir():
+    """创建一个临时目录，cleanup() 时删除"""
+    path = tempfile.mkdtemp(prefix="banxi_test_")
+    _temp_dirs.append(path)
+    return path
+
+
+def temp_db_path():
+    """新临时目录中的 data.db 路径（文件还不存在），用于先手工构造旧版本数据库的测试"""
+    return os.path.join(temp_dir(), "data.db")
+
+
+def use_temp_database(storage="memory"):
+    """
+    清理之前的临时数据库，让 db 模块使用一个新的数据库并初始化
+
+    参数:
+        storage (str, optional): "memory" 使用新的内存数据库；"file" 使用临时目录中的数据库文件
+            （备份、分库、其他连接打开同一个文件等测试）；None 时使用临时文件，
+            但由 init_db() 按环境变量 BANXI_STORAGE 决定
+
+    返回:
+        int: 第一个用户的ID
+    """
+    cleanup()
+    if storage == "memory":
+        db.use_memory_database()
+    else:
+        db.DB_FILE = temp_db_path()
+    db.init_db(storage=storage)
+    return db.get_users()[0]["id"]
+
+
+def cleanup():
+    """关闭连接池，丢弃内存数据库，删除临时目录，DB_FILE 恢复为测试之前的值"""
+    if db.SHARD_DIR is not None:
+        import shards
+        shards.disable()
+    db.close_memory_database(flush=False)
+    db.close_db_connections()
+    db.DB_FILE = _original_db_file
+    while _temp_dirs:
+        shutil.rmtree(_temp_dirs.pop(), ignore_errors=True)
+
+
+atexit.register(cleanup)
@@ -1,20 +1,30 @@
+import os
+import threading
 
 from PySide6 import QtWidgets, QtCore, QtGui
 
+import archive
+import backup
 import db
+import db_worker
+import profiler
+import search
+import sweeper
 from db import *
-from gacha_fixed import init_gacha_system
 from gacha_window import GachaTab
 from hud import TopHUD
 from dialogs import AddTaskDialog, AddRewardDialog
 from widgets import LeftUserCard
-from repeat_tasks import init_repeat_tasks, add_repeat_task, get_repeat_tasks, complete_repeat_task, delete_repeat_task
+from repeat_tasks import (add_repeat_task, get_repeat_tasks, get_repeat_tasks_page, get_repeat_task,
+                          complete_repeat_task, delete_repeat_task)
 from repeat_task_dialog import AddRepeatTaskDialog
 
 
 class MainWindow(QtWidgets.QMainWindow):
     def __init__(self):
         super().__init__()
+        # 所有数据库操作都交给后台线程执行，结果通过信号回到界面线程
+        self.db_worker = db_worker.get_worker()
         self.setWindowTitle("伴习 v1.1.0 新增铂金币")  # 更新版本号
         self.resize(1000, 680)
         main = QtWidgets.QWidget()
@@ -22,10 +32,6 @@ class MainWindow(QtWidgets.QMainWindow):
         main.setLayout(main_layout)
         self.setCentralWidget(main)
 
-        # 初始化重复任务表和抽卡系统
-        init_repeat_tasks()
-        init_gacha_system()
-
         # Left sidebar (保持不变)
         self.left = QtWidgets.QFrame()
         self.left.setFixedWidth(180)
@@ -53,6 +59,24 @@ class MainWindow(QtWidgets.QMainWindow):
         self.top_hud = TopHUD(None)
         right_layout.addWidget(self.top_hud)
 
+        # 搜索框：输入停顿后在后台按名称搜索，结果显示在下方，点击跳转到对应的标签页
+        self.search_box = QtWidgets.QLineEdit()
+        self.search_box.setObjectName("searchBox")
+        self.search_box.setPlaceholderText("搜索任务、奖励和奖池物品")
+        self.search_box.setClearButtonEnabled(True)
+        right_layout.addWidget(self.search_box)
+        self.search_results = QtWidgets.QListWidget()
+        self.search_results.setObjectName("searchResults")
+        self.search_results.setMaximumHeight(180)
+        self.search_results.itemClicked.connect(self.open_search_result)
+        self.search_results.hide()
+        right_layout.addWidget(self.search_results)
+        self.search_timer = QtCore.QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(200)
+        self.search_timer.timeout.connect(self.run_search)
+        self.search_box.textChanged.connect(self.search_timer.start)
+
         # top: header with tabs - 添加抽卡标签页
         self.tab_widget = QtWidgets.QTabWidget()
         self.tab_widget.setObjectName("mainTabs")
@@ -77,7 +101,17 @@ class MainWindow(QtWidgets.QMainWindow):
         t_layout.setContentsMargins(8, 8, 8, 8)
         self.task_list = QtWidgets.QListWidget()
         self.task_list.setObjectName("taskList")
+        # 支持 Ctrl/Shift 多选，配合“完成选中”一次完成多个任务
+        self.task_list.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.ExtendedSelection)
         t_layout.addWidget(self.task_list)
+
+        task_actions = QtWidgets.QHBoxLayout()
+        task_actions.addStretch()
+        self.btn_complete_selected = QtWidgets.QPushButton("完成选中")
+        self.btn_complete_selected.setEnabled(False)
+        self.btn_complete_selected.clicked.connect(self.on_complete_selected_tasks)
+        task_actions.addWidget(self.btn_complete_selected)
+        t_layout.addLayout(task_actions)
         self.task_tab.setLayout(t_layout)
 
         # 重复任务标签页布局
@@ -111,6 +145,10 @@ class MainWindow(QtWidgets.QMainWindow):
         self.btn_exchange = QtWidgets.QPushButton("货币兑换")
         self.btn_exchange.clicked.connect(self.open_exchange_dialog)
         exchange_btn_layout.addWidget(self.btn_exchange)
+        # 已归档的任务和奖励
+        self.btn_history = QtWidgets.QPushButton("历史记录")
+        self.btn_history.clicked.connect(self.open_history_dialog)
+        exchange_btn_layout.addWidget(self.btn_history)
         exchange_btn_layout.addStretch()
 
         m_layout.addWidget(self.lbl_level)
@@ -157,35 +195,74 @@ class MainWindow(QtWidgets.QMainWindow):
 
         # connections
         self.task_list.itemDoubleClicked.connect(self.on_task_double_click)
+        self.task_list.itemSelectionChanged.connect(self.on_task_selection_changed)
         self.repeat_task_list.itemDoubleClicked.connect(self.on_repeat_task_double_click)
         self.shop_list.itemDoubleClicked.connect(self.on_shop_double_click)
         self.tab_widget.currentChanged.connect(self.on_tab_changed)
 
+        # 列表分页：先显示第一页，滚动到接近底部时再读取下一页
+        self._pages = {}
+        self._setup_paging("tasks", self.task_list, get_tasks_page, self._append_task_items)
+        self._setup_paging("repeat_tasks", self.repeat_task_list, get_repeat_tasks_page,
+                           self._append_repeat_task_items)
+        self._setup_paging("rewards", self.shop_list, get_rewards_page, self._append_reward_items)
+
         # initialize DB and UI content
-        users = get_users()
-        first_user = users[0][0] if users else None
-        self.current_user_id = first_user
-        # populate left user cards
-        self.reload_user_cards()
-        # tell HUD about the user and initialize display
-        self.top_hud.set_user(self.current_user_id)
-
-        # 设置抽卡标签页的用户
-        if hasattr(self, 'gacha_tab'):
-            self.gacha_tab.set_user(self.current_user_id)
+        # 用户列表在后台读取，读完后生成左侧卡片、选中第一个用户（见 reload_user_cards），
+        # 再在后台读取 HUD 和各标签页的数据，读完后一起显示
+        self.current_user_id = None
+        self.reload_users_and_refresh()
+
+        # 定时在线备份和归档：在维护线程中执行，不占用日常数据库操作的队列
+        self.maintenance_worker = db_worker.get_maintenance_worker()
+        self.maintenance_paused = False  # 恢复备份、清空数据期间暂停
+        self.maintenance_timer = QtCore.QTimer(self)
+        self.maintenance_timer.timeout.connect(self.run_scheduled_maintenance)
+        self.maintenance_timer.start(10 * 60 * 1000)  # 每10分钟检查一次是否到了备份时间
+        QtCore.QTimer.singleShot(30 * 1000, self.run_scheduled_maintenance)
+
+    def run_scheduled_maintenance(self):
+        if self.maintenance_paused or self.maintenance_worker.is_busy():
+            return
 
-        self.highlight_selected_user()
-        self.refresh_all()
+        def archived(moved):
+            # 归档的是列表末尾已完成的记录，移走后重新读取列表
+            if any(moved.values()):
+                self.refresh_tasks()
+                self.refresh_rewards()
 
-    def reload_user_cards(self):
+        # 先清理已删除用户留下的记录，之后的备份和归档都不再带上它们
+        self.maintenance_worker.submit(sweeper.run_scheduled_sweep)
+        self.maintenance_worker.submit(backup.run_scheduled_backup)
+        self.maintenance_worker.submit(archive.run_scheduled_archive, on_done=archived)
+
+    def pause_maintenance(self, then):
+        """
+        替换数据库文件之前调用：停止定时维护，等维护线程做完手上的清理、备份、归档
+        并关闭它的数据库连接后，在界面线程中关闭本线程的连接，再调用 then()
+        """
+        self.maintenance_paused = True
+        self.maintenance_timer.stop()
+
+        def released(_):
+            db.release_thread_connection()
+            then()
+
+        # 维护线程按提交顺序执行，这个任务一定排在正在进行的维护之后
+        self.maintenance_worker.submit(db.release_thread_connection, on_done=released, on_error=released)
+
+    def resume_maintenance(self):
+        self.maintenance_paused = False
+        self.maintenance_timer.start()
+
+    def reload_user_cards(self, users):
+        """用后台读取的用户列表重建左侧卡片（读取见 reload_users_and_refresh）"""
         # 清除现有卡片（但保留底部的弹性空间）
         for i in reversed(range(self.left_layout_inner.count())):
             item = self.left_layout_inner.itemAt(i)
             if item and item.widget():
                 item.widget().setParent(None)
 
-        # 重新加载用户
-        users = get_users()
         self.user_cards = {}
         for uid, name, xp, level, coins, platinum_coins in users:
             card = LeftUserCard(uid, name)
@@ -194,11 +271,27 @@ class MainWindow(QtWidgets.QMainWindow):
             self.left_layout_inner.insertWidget(self.left_layout_inner.count() - 1, card)
             self.user_cards[uid] = card
 
-        # 如果当前用户被删除或为None，选择备用用户
+        # 如果当前用户被删除或为None，选择备用用户（HUD 在下一次 refresh_all 时更新）
         if self.current_user_id not in self.user_cards:
             all_uids = list(self.user_cards.keys())
             self.current_user_id = all_uids[0] if all_uids else None
-            self.top_hud.set_user(self.current_user_id)
+            if hasattr(self, 'gacha_tab'):
+                self.gacha_tab.set_user(self.current_user_id, refresh=False)
+
+    def _select_user_shard(self):
+        """分库布局下，让之后提交的数据库操作使用当前用户的文件（排在已提交的操作之后）"""
+        if db.SHARD_DIR is not None:
+            self.db_worker.submit(db.use_user_shard, self.current_user_id)
+
+    def reload_users_and_refresh(self):
+        """后台重新读取用户列表，然后重建左侧卡片并刷新当前用户的全部数据"""
+        def done(users):
+            self.reload_user_cards(users)
+            self._select_user_shard()
+            self.highlight_selected_user()
+            self.refresh_all(switch_user=True)
+
+        self.db_worker.submit(get_users, on_done=done)
 
     def highlight_selected_user(self):
         for uid, card in self.user_cards.items():
@@ -247,34 +340,199 @@ class MainWindow(QtWidgets.QMainWindow):
             self.top_hud.reset_coin_animation()
 
         self.current_user_id = user_id
+        self._select_user_shard()
 
-        # 更新HUD显示
-        self.top_hud.set_user(user_id)
-
-        # 设置抽卡标签页的用户
+        # 设置抽卡标签页的用户，抽卡记录随下面的 refresh_all 一起读取
         if hasattr(self, 'gacha_tab'):
-            self.gacha_tab.set_user(self.current_user_id)
+            self.gacha_tab.set_user(self.current_user_id, refresh=False)
 
         self.highlight_selected_user()
-        self.refresh_all()
+        self.refresh_all(switch_user=True)
+        if self.search_box.text().strip():
+            self.run_search()
 
-    def refresh_all(self):
+    def refresh_all(self, switch_user=False):
+        """
+        后台一次读取当前用户的全部数据，读完后刷新 HUD 和各标签页
+
+        参数:
+            switch_user (bool): 刚切换用户时为 True，HUD 直接显示新数值而不播放变化动画
+        """
+        user_id = self.current_user_id
+        if user_id is None:
+            self.refresh_tasks()
+            self.refresh_repeat_tasks()
+            self.refresh_rewards()
+            self.refresh_me()
+            self.on_tab_changed(self.tab_widget.currentIndex())
+            return
+
+        limits = {name: self._page_limit(name, switch_user) for name in self._pages}
+        self.db_worker.submit(db_worker.load_user_snapshot, user_id, limits,
+                              on_done=lambda snapshot: self.apply_snapshot(snapshot, switch_user))
+
+    def apply_snapshot(self, snapshot, switch_user=False):
+        """用 db_worker.load_user_snapshot 读到的数据刷新界面"""
+        if snapshot["user_id"] != self.current_user_id:
+            return  # 读取期间已经切换了用户，丢弃旧数据
+
+        user = snapshot["user"]
+        if switch_user:
+            self.top_hud.set_user(self.current_user_id, user=user)
         # 正常刷新，触发所有动画
-        if self.current_user_id is not None:
-            self.top_hud.update_display(self.current_user_id)
-
-        self.refresh_tasks()
-        self.refresh_repeat_tasks()
-        self.refresh_gacha_tab()
-        self.refresh_rewards()
-        self.refresh_me()
+        self.top_hud.update_display(self.current_user_id, user=user)
+
+        self.refresh_tasks(snapshot["tasks"])
+        self.refresh_repeat_tasks(snapshot["repeat_tasks"])
+        if hasattr(self, 'gacha_tab'):
+            self.gacha_tab.refresh_display(snapshot["gacha_records"])
+        self.refresh_rewards(snapshot["rewards"])
+        self.refresh_me(user)
         self.on_tab_changed(self.tab_widget.currentIndex())
 
-    def refresh_tasks(self):
-        self.task_list.clear()
+    def _load_for_current_user(self, func, render, *args):
+        """在后台执行 func(当前用户ID, *args)，完成后如果用户没有切换，就把结果交给 render 显示"""
+        user_id = self.current_user_id
+
+        def deliver(result):
+            if user_id == self.current_user_id and result is not None:
+                render(result)
+
+        self.db_worker.submit(func, user_id, *args, on_done=deliver)
+
+    # 搜索结果类别 -> (标签页序号, 显示的类别名, 对应的列表控件属性名)
+    SEARCH_RESULT_KINDS = {
+        "tasks": (0, "单次任务", "task_list"),
+        "repeat_tasks": (1, "重复任务", "repeat_task_list"),
+        "gacha_items": (2, "奖池", None),
+        "rewards": (3, "奖励", "shop_list"),
+    }
+
+    def run_search(self):
+        """在后台搜索搜索框中的内容，输入已经变化时丢弃过期的结果"""
+        text = self.search_box.text().strip()
+        if not text or self.current_user_id is None:
+            self.search_results.clear()
+            self.search_results.hide()
+            return
+
+        def show(results):
+            if text == self.search_box.text().strip():
+                self._show_search_results(results)
+
+        self._load_for_current_user(search.search, show, text)
+
+    def _show_search_results(self, results):
+        self.search_results.clear()
+        for kind, (_, label, _) in self.SEARCH_RESULT_KINDS.items():
+            for row in results[kind]:
+                if kind == "gacha_items":
+                    text = f"[{label}] {row['name']}（{row['star']}星）"
+                else:
+                    text = f"[{label}] {row['name']}" + ("（已完成）" if row["completed"] else "")
+                list_item = QtWidgets.QListWidgetItem(text)
+                list_item.setData(QtCore.Qt.ItemDataRole.UserRole, (kind, row["id"]))
+                self.search_results.addItem(list_item)
+        if self.search_results.count() == 0:
+            list_item = QtWidgets.QListWidgetItem("没有找到匹配的记录")
+            list_item.setFlags(QtCore.Qt.ItemFlag.NoItemFlags)
+            self.search_results.addItem(list_item)
+        self.search_results.show()
+
+    def open_search_result(self, item):
+        """切换到搜索结果所在的标签页，列表中已加载该条记录时选中它"""
+        data = item.data(QtCore.Qt.ItemDataRole.UserRole)
+        if not data:
+            return
+        kind, item_id = data
+        tab_index, _, list_name = self.SEARCH_RESULT_KINDS[kind]
+        self.tab_widget.setCurrentIndex(tab_index)
+        if list_name is None:
+            return
+        list_widget = getattr(self, list_name)
+        for i in range(list_widget.count()):
+            list_item = list_widget.item(i)
+            if list_item.data(QtCore.Qt.ItemDataRole.UserRole) == item_id:
+                list_widget.setCurrentItem(list_item)
+                list_widget.scrollToItem(list_item)
+                return
+
+    def _setup_paging(self, name, list_widget, fetch_page, append):
+        """
+        为列表启用分页
+
+        参数:
+            name (str): 列表名，与 load_user_snapshot 返回的键一致
+            list_widget (QListWidget): 列表控件
+            fetch_page (callable): fetch_page(user_id, 游标, 条数) -> (行, 下一页的游标)
+            append (callable): 把读到的行追加到列表控件中
+        """
+        self._pages[name] = {"list": list_widget, "fetch": fetch_page, "append": append,
+                             "cursor": None, "loading": False, "generation": 0}
+        list_widget.verticalScrollBar().valueChanged.connect(lambda value: self._maybe_load_more(name))
+
+    def _page_limit(self, name, switch_user=False):
+        """刷新时从头读取的条数：至少一页，已经滚动加载的部分也一起重新读取，列表位置不变"""
+        if switch_user:
+            return PAGE_SIZE
+        return max(PAGE_SIZE, self._pages[name]["list"].count())
+
+    def _show_page(self, name, page):
+        """清空列表，显示从头读取的 (行, 下一页的游标)"""
+        rows, cursor = page
+        state = self._pages[name]
+        list_widget = state["list"]
+        scroll = list_widget.verticalScrollBar().value()
+
+        state["generation"] += 1  # 正在读取的下一页属于旧列表，读完后丢弃
+        state["loading"] = False
+        state["cursor"] = cursor
+        list_widget.clear()
+        state["append"](rows)
+        list_widget.verticalScrollBar().setValue(scroll)
+        self._maybe_load_more(name)
+
+    def _maybe_load_more(self, name):
+        """滚动到距底部不足一屏，或内容还不满一屏时，在后台读取下一页"""
+        state = self._pages[name]
+        if state["cursor"] is None or state["loading"] or self.current_user_id is None:
+            return
+        list_widget = state["list"]
+        list_widget.doItemsLayout()  # 立即排版，让滚动条范围反映刚追加的行
+        bar = list_widget.verticalScrollBar()
+        if bar.value() + bar.pageStep() < bar.maximum():
+            return
+
+        state["loading"] = True
+        generation = state["generation"]
+
+        def append_page(page):
+            if generation != state["generation"]:
+                return
+            rows, cursor = page
+            state["loading"] = False
+            state["cursor"] = cursor
+            state["append"](rows)
+            self._maybe_load_more(name)
+
+        self._load_for_current_user(state["fetch"], append_page, state["cursor"], PAGE_SIZE)
+
+    def refresh_tasks(self, page=None):
+        """
+        刷新任务列表
+
+        参数:
+            page (tuple, optional): (任务列表, 下一页的游标)，为None时在后台读取
+        """
         if self.current_user_id is None:
+            self.task_list.clear()
             return
-        tasks = get_tasks(self.current_user_id)
+        if page is None:
+            self._load_for_current_user(get_tasks_page, self.refresh_tasks, None, self._page_limit("tasks"))
+            return
+        self._show_page("tasks", page)
+
+    def _append_task_items(self, tasks):
         for tid, name, xp_reward, platinum_reward, completed in tasks:
             # 创建自定义的列表项控件
             item_widget = QtWidgets.QWidget()
@@ -315,20 +573,26 @@ class MainWindow(QtWidgets.QMainWindow):
             list_item.setSizeHint(QtCore.QSize(0, 60))
             list_item.setData(QtCore.Qt.ItemDataRole.UserRole, tid)
 
-            # 如果任务已完成，设置不同的背景
+            # 如果任务已完成，设置不同的背景，并且不参与多选
             if completed:
                 list_item.setBackground(QtGui.QColor(255, 255, 255, 10))  # 轻微的背景色
+                list_item.setFlags(list_item.flags() & ~QtCore.Qt.ItemFlag.ItemIsSelectable)
 
             self.task_list.addItem(list_item)
             self.task_list.setItemWidget(list_item, item_widget)
 
     # 新增：刷新重复任务列表
-    def refresh_repeat_tasks(self):
-        self.repeat_task_list.clear()
+    def refresh_repeat_tasks(self, page=None):
         if self.current_user_id is None:
+            self.repeat_task_list.clear()
             return
+        if page is None:
+            self._load_for_current_user(get_repeat_tasks_page, self.refresh_repeat_tasks, None,
+                                        self._page_limit("repeat_tasks"))
+            return
+        self._show_page("repeat_tasks", page)
 
-        tasks = get_repeat_tasks(self.current_user_id)
+    def _append_repeat_task_items(self, tasks):
         for tid, name, xp_reward, platinum_reward, max_completions, current_completions, completed in tasks:
             # 创建自定义的列表项控件
             item_widget = QtWidgets.QWidget()
@@ -386,12 +650,16 @@ class MainWindow(QtWidgets.QMainWindow):
             self.repeat_task_list.addItem(list_item)
             self.repeat_task_list.setItemWidget(list_item, item_widget)
 
-    def refresh_rewards(self):
-        self.shop_list.clear()
+    def refresh_rewards(self, page=None):
         if self.current_user_id is None:
+            self.shop_list.clear()
+            return
+        if page is None:
+            self._load_for_current_user(get_rewards_page, self.refresh_rewards, None, self._page_limit("rewards"))
             return
+        self._show_page("rewards", page)
 
-        rewards = get_rewards(self.current_user_id)
+    def _append_reward_items(self, rewards):
         for rid, name, price, currency_type, completed in rewards:
             # 创建自定义的列表项控件
             item_widget = QtWidgets.QWidget()
@@ -445,7 +713,7 @@ class MainWindow(QtWidgets.QMainWindow):
             self.shop_list.addItem(list_item)
             self.shop_list.setItemWidget(list_item, item_widget)
 
-    def refresh_me(self):
+    def refresh_me(self, u=None):
         if self.current_user_id is None:
             self.lbl_level.setText("等级：-")
             self.lbl_xp.setText("经验：-")
@@ -453,8 +721,8 @@ class MainWindow(QtWidgets.QMainWindow):
             self.lbl_platinum.setText("铂金币：-")
             self.lbl_coins.setText("金币：-")
             return
-        u = get_user(self.current_user_id)
         if u is None:
+            self._load_for_current_user(get_user, self.refresh_me)
             return
         uid, name, xp, level, coins, platinum_coins = u
         self.lbl_level.setText(f"等级：{level}")
@@ -474,8 +742,8 @@ class MainWindow(QtWidgets.QMainWindow):
         if dialog.exec():
             name, xp, platinum = dialog.get_data()
             if name:
-                add_task(self.current_user_id, name, xp, platinum)
-                self.refresh_tasks()
+                self.db_worker.submit(add_task, self.current_user_id, name, xp, platinum,
+                                      on_done=lambda _: self.refresh_tasks())
                 # no need to update HUD here (no XP change)
 
     # 新增：添加重复任务
@@ -486,8 +754,8 @@ class MainWindow(QtWidgets.QMainWindow):
         if dialog.exec():
             name, xp, max_completions, platinum = dialog.get_data()
             if name:
-                add_repeat_task(self.current_user_id, name, xp, max_completions, platinum)
-                self.refresh_repeat_tasks()
+                self.db_worker.submit(add_repeat_task, self.current_user_id, name, xp, max_completions, platinum,
+                                      on_done=lambda _: self.refresh_repeat_tasks())
 
     def on_add_shop(self):
         if self.current_user_id is None:
@@ -496,8 +764,9 @@ class MainWindow(QtWidgets.QMainWindow):
         if dialog.exec():
             name, price, currency_type = dialog.get_data()
             if name:
-                add_reward(self.current_user_id, name, price, currency_type)  # 添加个人奖励
-                self.refresh_rewards()
+                # 添加个人奖励
+                self.db_worker.submit(add_reward, self.current_user_id, name, price, currency_type,
+                                      on_done=lambda _: self.refresh_rewards())
 
     # 修改 on_shop_double_click 函数为删除奖励
     def on_shop_double_click(self, item):
@@ -511,12 +780,14 @@ class MainWindow(QtWidgets.QMainWindow):
         )
 
         if reply == QtWidgets.QMessageBox.StandardButton.Yes:
-            success = delete_reward(reward_id)
-            if success:
-                self.refresh_rewards()
-                QtWidgets.QMessageBox.information(self, "成功", "奖励已删除")
-            else:
-                QtWidgets.QMessageBox.warning(self, "失败", "删除奖励失败")
+            def done(success):
+                if success:
+                    self.refresh_rewards()
+                    QtWidgets.QMessageBox.information(self, "成功", "奖励已删除")
+                else:
+                    QtWidgets.QMessageBox.warning(self, "失败", "删除奖励失败")
+
+            self.db_worker.submit(delete_reward, reward_id, on_done=done)
 
     # 新增：删除重复任务
     def on_repeat_task_double_click(self, item):
@@ -530,12 +801,14 @@ class MainWindow(QtWidgets.QMainWindow):
         )
 
         if reply == QtWidgets.QMessageBox.StandardButton.Yes:
-            success = delete_repeat_task(task_id)
-            if success:
-                self.refresh_repeat_tasks()
-                QtWidgets.QMessageBox.information(self, "成功", "重复任务已删除")
-            else:
-                QtWidgets.QMessageBox.warning(self, "失败", "删除重复任务失败")
+            def done(success):
+                if success:
+                    self.refresh_repeat_tasks()
+                    QtWidgets.QMessageBox.information(self, "成功", "重复任务已删除")
+                else:
+                    QtWidgets.QMessageBox.warning(self, "失败", "删除重复任务失败")
+
+            self.db_worker.submit(delete_repeat_task, task_id, on_done=done)
 
 
 
@@ -550,12 +823,14 @@ class MainWindow(QtWidgets.QMainWindow):
         )
 
         if reply == QtWidgets.QMessageBox.StandardButton.Yes:
-            success = delete_task(task_id)
-            if success:
-                self.refresh_tasks()
-                QtWidgets.QMessageBox.information(self, "成功", "任务已删除")
-            else:
-                QtWidgets.QMessageBox.warning(self, "失败", "删除任务失败")
+            def done(success):
+                if success:
+                    self.refresh_tasks()
+                    QtWidgets.QMessageBox.information(self, "成功", "任务已删除")
+                else:
+                    QtWidgets.QMessageBox.warning(self, "失败", "删除任务失败")
+
+            self.db_worker.submit(delete_task, task_id, on_done=done)
 
     def on_complete_task(self, task_id):
         """完成任务的逻辑"""
@@ -567,53 +842,100 @@ class MainWindow(QtWidgets.QMainWindow):
         )
 
         if reply == QtWidgets.QMessageBox.StandardButton.Yes:
-            res = complete_task(task_id)
-            if res is None:
-                QtWidgets.QMessageBox.information(self, "提示", "无法完成此任务（可能已完成或不存在）。")
-            else:
-                gained = res["xp"]
-                leveled = res["leveled"]
-                coins_g = res["coins_gained"]
-                platinum_g = res.get("platinum_gained", 0)
-                level_up_details = res.get("level_up_details", [])
-
-                msg = f"获得 {gained} XP"
-                if platinum_g > 0 and not leveled:
-                    msg += f" 和 {platinum_g} 铂金币"
-                if leveled:
-                    msg += f"\n升级了 {leveled} 次，总共获得 {coins_g} coins"
-                    if platinum_g > 0:
-                        msg += f" 和 {platinum_g} 铂金币"
-
-                    if len(level_up_details) > 0:
-                        msg += "\n\n升级详情："
-                        for detail in level_up_details:
-                            from_lv = detail["from_level"]
-                            to_lv = detail["to_level"]
-                            base = detail["base_reward"]
-                            multiplier = detail["random_multiplier"]
-                            actual = detail["actual_reward"]
-                            platinum_reward = detail.get("platinum_reward", 0)
-                            msg += f"\nLv{from_lv}→Lv{to_lv}: {base} × {multiplier} = {actual} coins"
-                            if platinum_reward > 0:
-                                msg += f" + {platinum_reward} 铂金币"
+            def done(res):
+                if res is None:
+                    QtWidgets.QMessageBox.information(self, "提示", "无法完成此任务（可能已完成或不存在）。")
+                else:
+                    QtWidgets.QMessageBox.information(self, "奖励", self._format_task_reward_message(res))
+                    # 正常刷新，触发动画
+                    self.refresh_all()
+
+            self.db_worker.submit(complete_task, task_id, on_done=done)
+
+    def on_task_selection_changed(self):
+        """根据选中的任务数量更新“完成选中”按钮"""
+        count = len(self.task_list.selectedItems())
+        self.btn_complete_selected.setEnabled(count > 0)
+        self.btn_complete_selected.setText(f"完成选中 ({count})" if count else "完成选中")
+
+    def on_complete_selected_tasks(self):
+        """批量完成选中的任务：只确认一次、在一个事务中结算、最后刷新一次"""
+        task_ids = [item.data(QtCore.Qt.ItemDataRole.UserRole) for item in self.task_list.selectedItems()]
+        if not task_ids:
+            return
+
+        reply = QtWidgets.QMessageBox.question(
+            self,
+            "完成任务",
+            f"确认将选中的 {len(task_ids)} 个任务标记为完成并领取奖励？",
+            QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No
+        )
+
+        if reply == QtWidgets.QMessageBox.StandardButton.Yes:
+            def done(summary):
+                if not summary["results"]:
+                    QtWidgets.QMessageBox.information(self, "提示", "选中的任务都无法完成（可能已完成或不存在）。")
+                    return
+
+                msg = f"成功完成 {len(summary['completed_ids'])} 个任务"
+                if summary["skipped"]:
+                    msg += f"（跳过 {summary['skipped']} 个已完成或不存在的任务）"
+                for res in summary["results"]:
+                    msg += "\n" + self._format_task_reward_message(res)
 
                 QtWidgets.QMessageBox.information(self, "奖励", msg)
-                # 正常刷新，触发动画
                 self.refresh_all()
 
+            self.db_worker.submit(complete_tasks, task_ids, on_done=done)
+
+    def _format_task_reward_message(self, res):
+        """
+        单次任务奖励通知（单个完成和批量完成共用）
+
+        参数:
+            res: complete_task 的结果字典，或 complete_tasks 结果中的一项
+
+        返回:
+            str: 格式化的通知消息
+        """
+        gained = res["xp"]
+        leveled = res["leveled"]
+        coins_g = res["coins_gained"]
+        platinum_g = res.get("platinum_gained", 0)
+        level_up_details = res.get("level_up_details", [])
+
+        msg = f"获得 {gained} XP"
+        if platinum_g > 0 and not leveled:
+            msg += f" 和 {platinum_g} 铂金币"
+        if leveled:
+            msg += f"\n升级了 {leveled} 次，总共获得 {coins_g} coins"
+            if platinum_g > 0:
+                msg += f" 和 {platinum_g} 铂金币"
+
+            if len(level_up_details) > 0:
+                msg += "\n\n升级详情："
+                for detail in level_up_details:
+                    from_lv = detail["from_level"]
+                    to_lv = detail["to_level"]
+                    base = detail["base_reward"]
+                    multiplier = detail["random_multiplier"]
+                    actual = detail["actual_reward"]
+                    platinum_reward = detail.get("platinum_reward", 0)
+                    msg += f"\nLv{from_lv}→Lv{to_lv}: {base} × {multiplier} = {actual} coins"
+                    if platinum_reward > 0:
+                        msg += f" + {platinum_reward} 铂金币"
+                omitted = res.get("level_up_details_omitted", 0)
+                if omitted > 0:
+                    msg += f"\n……另有 {omitted} 次升级"
+        return msg
+
     def on_complete_repeat_task(self, task_id):
         """完成重复任务的逻辑"""
-        # 先获取任务信息（包含铂金币奖励）
-        conn = get_db_connection()
-        c = conn.cursor()
-        c.execute("""
-            SELECT name, xp_reward, platinum_reward, max_completions, current_completions, completed
-            FROM repeat_tasks WHERE id=?
-        """, (task_id,))
-        task_info = c.fetchone()
-        conn.close()
+        # 先在后台获取任务信息（包含铂金币奖励）
+        self.db_worker.submit(get_repeat_task, task_id,
+                              on_done=lambda task_info: self._confirm_complete_repeat_task(task_id, task_info))
 
+    def _confirm_complete_repeat_task(self, task_id, task_info):
         if not task_info:
             QtWidgets.QMessageBox.information(self, "提示", "任务不存在。")
             return
@@ -646,25 +968,20 @@ class MainWindow(QtWidgets.QMainWindow):
 
             if reply == QtWidgets.QMessageBox.StandardButton.Yes:
                 from repeat_tasks import complete_repeat_task_multiple_times
-                res = complete_repeat_task_multiple_times(task_id, times)
 
-                if res is None:
-                    QtWidgets.QMessageBox.information(self, "提示", "无法完成任务（可能已完成或不存在）。")
-                else:
-                    times_completed = res["times_completed"]
-                    total_xp = res["total_xp"]
-                    leveled = res["leveled"]
-                    coins_g = res["coins_gained"]
-                    platinum_g = res.get("platinum_gained", 0)
-                    completion_count = res["completion_count"]
-                    is_fully_completed = res["is_fully_completed"]
-
-                    # 使用优化的批量任务完成通知函数
-                    msg = self._format_batch_completion_message(res, name, max_completions, is_fully_completed)
-
-                    QtWidgets.QMessageBox.information(self, "完成结果", msg)
-                    # 刷新显示
-                    self.refresh_all()
+                def done(res):
+                    if res is None:
+                        QtWidgets.QMessageBox.information(self, "提示", "无法完成任务（可能已完成或不存在）。")
+                    else:
+                        # 使用优化的批量任务完成通知函数
+                        msg = self._format_batch_completion_message(res, name, max_completions,
+                                                                    res["is_fully_completed"])
+
+                        QtWidgets.QMessageBox.information(self, "完成结果", msg)
+                        # 刷新显示
+                        self.refresh_all()
+
+                self.db_worker.submit(complete_repeat_task_multiple_times, task_id, times, on_done=done)
 
     def on_redeem_reward(self, reward_id):
         """兑换奖励"""
@@ -676,26 +993,30 @@ class MainWindow(QtWidgets.QMainWindow):
         )
 
         if reply == QtWidgets.QMessageBox.StandardButton.Yes:
-            res = redeem_reward(reward_id)
-            if not res["success"]:
-                if res["reason"] == "not_enough_coins":
-                    QtWidgets.QMessageBox.warning(self, "失败", "金币不足。")
-                elif res["reason"] == "not_enough_platinum":
-                    QtWidgets.QMessageBox.warning(self, "失败", "铂金币不足。")
-                elif res["reason"] == "already_redeemed":
-                    QtWidgets.QMessageBox.warning(self, "失败", "奖励已兑换。")
-                else:
-                    QtWidgets.QMessageBox.warning(self, "失败", "兑换失败。")
+            self.db_worker.submit(redeem_reward, reward_id, on_done=self._on_reward_redeemed)
+
+    def _on_reward_redeemed(self, res):
+        """兑换奖励的结果"""
+        if not res["success"]:
+            if res["reason"] == "not_enough_coins":
+                QtWidgets.QMessageBox.warning(self, "失败", "金币不足。")
+            elif res["reason"] == "not_enough_platinum":
+                QtWidgets.QMessageBox.warning(self, "失败", "铂金币不足。")
+            elif res["reason"] == "already_redeemed":
+                QtWidgets.QMessageBox.warning(self, "失败", "奖励已兑换。")
             else:
-                # 根据货币类型显示不同的成功消息
-                if res["currency_type"] == "platinum":
-                    message = f"兑换成功！\n剩余铂金币：{res['remaining_platinum']}\n剩余金币：{res['remaining_coins']}"
-                else:
-                    message = f"兑换成功！\n剩余金币：{res['remaining_coins']}\n剩余铂金币：{res['remaining_platinum']}"
+                QtWidgets.QMessageBox.warning(self, "失败", "兑换失败。")
+        else:
+            # 根据货币类型显示不同的成功消息
+            if res["currency_type"] == "platinum":
+                message = f"兑换成功！\n剩余铂金币：{res['remaining_platinum']}\n剩余金币：{res['remaining_coins']}"
+            else:
+                message = f"兑换成功！\n剩余金币：{res['remaining_coins']}\n剩余铂金币：{res['remaining_platinum']}"
+
+            QtWidgets.QMessageBox.information(self, "成功", message)
+            # 使用带动画的刷新
+            self.refresh_all()
 
-                QtWidgets.QMessageBox.information(self, "成功", message)
-                # 使用带动画的刷新
-                self.refresh_all()
 
 
     # -------------------------
@@ -704,7 +1025,7 @@ class MainWindow(QtWidgets.QMainWindow):
     def open_dev_dialog(self):
         dlg = QtWidgets.QDialog(self)
         dlg.setWindowTitle("开发者模式")
-        dlg.setFixedSize(360, 200)
+        dlg.setFixedSize(360, 340)
         layout = QtWidgets.QVBoxLayout()
         layout.setContentsMargins(12, 12, 12, 12)
 
@@ -714,9 +1035,17 @@ class MainWindow(QtWidgets.QMainWindow):
         btn_clear = QtWidgets.QPushButton("清空当前数据")
         btn_add = QtWidgets.QPushButton("添加账户")
         btn_del = QtWidgets.QPushButton("删除账户")
+        btn_import = QtWidgets.QPushButton("批量导入（CSV / JSON Lines）")
+        btn_backup = QtWidgets.QPushButton("立即备份")
+        btn_restore = QtWidgets.QPushButton("从备份恢复")
+        btn_profile = QtWidgets.QPushButton("性能统计")
         layout.addWidget(btn_clear)
         layout.addWidget(btn_add)
         layout.addWidget(btn_del)
+        layout.addWidget(btn_import)
+        layout.addWidget(btn_backup)
+        layout.addWidget(btn_restore)
+        layout.addWidget(btn_profile)
 
         btn_close = QtWidgets.QPushButton("关闭")
         layout.addStretch()
@@ -727,6 +1056,10 @@ class MainWindow(QtWidgets.QMainWindow):
         btn_clear.clicked.connect(lambda: self.handle_clear_data(dlg))
         btn_add.clicked.connect(lambda: self.handle_add_account(dlg))
         btn_del.clicked.connect(lambda: self.handle_delete_account(dlg))
+        btn_import.clicked.connect(lambda: self.handle_bulk_import(dlg))
+        btn_backup.clicked.connect(self.handle_backup_now)
+        btn_restore.clicked.connect(lambda: self.handle_restore_backup(dlg))
+        btn_profile.clicked.connect(self.open_profiler_panel)
         btn_close.clicked.connect(dlg.accept)
 
         dlg.exec()
@@ -736,17 +1069,156 @@ class MainWindow(QtWidgets.QMainWindow):
                                                "此操作将删除整个数据库并重建（会重置为初始用户 玖/未）。确定继续？",
                                                QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No)
         if reply == QtWidgets.QMessageBox.StandardButton.Yes:
-            ok = clear_data_file_and_reinit()
-            if ok:
-                QtWidgets.QMessageBox.information(self, "完成", "数据已清空并重建。")
-                # reload UI
-                self.reload_user_cards()
-                self.highlight_selected_user()
-                self.refresh_all()
+            def done(ok):
+                self.resume_maintenance()
+                if ok:
+                    QtWidgets.QMessageBox.information(self, "完成", "数据已清空并重建。")
+                    # reload UI
+                    self.reload_users_and_refresh()
+                    if parent_dialog:
+                        parent_dialog.accept()
+                else:
+                    QtWidgets.QMessageBox.warning(self, "失败", "清空数据失败。")
+
+            # 在后台线程中执行，与其他数据库操作排队，不会和正在进行的写入冲突；
+            # 维护线程的连接要先关闭，否则旧文件不能删除
+            self.pause_maintenance(lambda: self.db_worker.submit(clear_data_file_and_reinit, on_done=done))
+
+    def handle_bulk_import(self, parent_dialog=None):
+        """从 CSV / JSON Lines 文件批量导入任务、奖励或奖池物品"""
+        import importer
+
+        kinds = list(importer.IMPORT_KINDS)
+        labels = [importer.IMPORT_KINDS[k]["label"] for k in kinds]
+        label, ok = QtWidgets.QInputDialog.getItem(self, "批量导入", "选择导入的数据类型：", labels, 0, False)
+        if not ok:
+            return
+        kind = kinds[labels.index(label)]
+        if importer.IMPORT_KINDS[kind]["per_user"] and self.current_user_id is None:
+            QtWidgets.QMessageBox.warning(self, "提示", "请先选择用户。")
+            return
+
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(
+            self, "选择导入文件", "", "CSV / JSON Lines (*.csv *.jsonl *.ndjson);;所有文件 (*)")
+        if not path:
+            return
+
+        progress_dlg = QtWidgets.QProgressDialog("正在导入...", "取消", 0, 1000, self)
+        progress_dlg.setWindowTitle("批量导入")
+        progress_dlg.setWindowModality(QtCore.Qt.WindowModality.WindowModal)
+        progress_dlg.setMinimumDuration(300)
+        cancelled = threading.Event()
+        progress_dlg.canceled.connect(cancelled.set)
+
+        def show_progress(value):
+            done_bytes, total_bytes, imported = value
+            if total_bytes:
+                progress_dlg.setValue(min(999, done_bytes * 1000 // total_bytes))
+            progress_dlg.setLabelText(f"已导入 {imported} 条{label}...")
+
+        # 导入在后台线程执行：进度通过 report_progress 发回界面线程，取消通过 Event 通知后台
+        def on_progress(done_bytes, total_bytes, imported):
+            self.db_worker.report_progress((done_bytes, total_bytes, imported))
+            return not cancelled.is_set()
+
+        def done(res):
+            self.db_worker.progress.disconnect(show_progress)
+            progress_dlg.close()
+
+            if not res["success"]:
+                if res["reason"] == "cancelled":
+                    QtWidgets.QMessageBox.information(self, "已取消", "导入已取消，没有写入任何数据。")
+                else:
+                    QtWidgets.QMessageBox.warning(self, "失败", f"导入失败：{res['reason']}")
+                return
+
+            msg = f"已导入 {res['imported']} 条{label}。"
+            if res["error_count"]:
+                msg += f"\n跳过 {res['error_count']} 行不合法的数据："
+                for line_no, reason in res["errors"][:10]:
+                    msg += f"\n第 {line_no} 行：{reason}"
+                if res["error_count"] > 10:
+                    msg += "\n……"
+            QtWidgets.QMessageBox.information(self, "导入完成", msg)
+            self.refresh_all()
+            if parent_dialog:
+                parent_dialog.accept()
+
+        self.db_worker.progress.connect(show_progress)
+        self.db_worker.submit(importer.import_file, kind, path, user_id=self.current_user_id,
+                              progress=on_progress, on_done=done)
+
+    def handle_backup_now(self):
+        """立即在线备份，备份在维护线程中分步复制，进度显示在进度框中"""
+        if self.maintenance_worker.is_busy():
+            QtWidgets.QMessageBox.information(self, "提示", "正在备份，请稍候。")
+            return
+
+        progress_dlg = QtWidgets.QProgressDialog("正在备份...", None, 0, 1000, self)
+        progress_dlg.setWindowTitle("备份")
+        progress_dlg.setMinimumDuration(300)
+
+        def show_progress(value):
+            copied, total = value
+            if total:
+                progress_dlg.setValue(min(999, copied * 1000 // total))
+
+        def done(res):
+            self.maintenance_worker.progress.disconnect(show_progress)
+            progress_dlg.close()
+            if res["success"]:
+                QtWidgets.QMessageBox.information(self, "备份完成", f"已备份到：\n{res['path']}")
+            else:
+                QtWidgets.QMessageBox.warning(self, "失败", f"备份失败：{res['reason']}")
+
+        self.maintenance_worker.progress.connect(show_progress)
+        self.maintenance_worker.submit(
+            backup.create_backup,
+            progress=lambda copied, total: self.maintenance_worker.report_progress((copied, total)),
+            on_done=done)
+
+    def handle_restore_backup(self, parent_dialog=None):
+        """选择一个备份替换当前数据库，替换前会自动备份当前数据"""
+        backups = backup.list_backups()
+        if not backups:
+            QtWidgets.QMessageBox.information(self, "提示", "还没有备份。")
+            return
+
+        names = [os.path.basename(path) for path in backups]
+        name, ok = QtWidgets.QInputDialog.getItem(self, "从备份恢复", "选择要恢复的备份：", names, 0, False)
+        if not ok:
+            return
+        reply = QtWidgets.QMessageBox.question(self, "恢复确认",
+                                               f"当前数据将被替换为 {name}（替换前会先备份当前数据）。确定继续？",
+                                               QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No)
+        if reply != QtWidgets.QMessageBox.StandardButton.Yes:
+            return
+
+        def done(res):
+            self.resume_maintenance()
+            if res["success"]:
+                QtWidgets.QMessageBox.information(self, "完成", "已从备份恢复数据。")
+                self.reload_users_and_refresh()
                 if parent_dialog:
                     parent_dialog.accept()
             else:
-                QtWidgets.QMessageBox.warning(self, "失败", "清空数据失败。")
+                QtWidgets.QMessageBox.warning(self, "失败", f"恢复失败：{res['reason']}")
+
+        # 与其他数据库操作排队执行，替换文件时不会有写入进行到一半；
+        # 先等维护线程做完手上的任务并关闭连接，它不会在恢复进行时读写旧文件
+        path = backups[names.index(name)]
+        self.pause_maintenance(lambda: self.db_worker.submit(
+            backup.restore_backup, path, on_done=done,
+            on_error=lambda error: done({"success": False, "reason": str(error)})))
+
+    def open_profiler_panel(self):
+        if not profiler.is_enabled():
+            QtWidgets.QMessageBox.information(self, "性能统计",
+                                              "性能统计未开启。\n请设置环境变量 BANXI_PROFILE=1 后重新启动程序。")
+            return
+        from dialogs import ProfilerDialog
+        self.profiler_dialog = ProfilerDialog(self)
+        self.profiler_dialog.show()
 
     def handle_add_account(self, parent_dialog=None):
         text, ok = QtWidgets.QInputDialog.getText(self, "添加账户", "输入新账户名称：")
@@ -755,23 +1227,26 @@ class MainWindow(QtWidgets.QMainWindow):
             if not name:
                 QtWidgets.QMessageBox.warning(self, "错误", "名称不能为空。")
                 return
-            res = add_user(name)
-            if res.get("success"):
-                QtWidgets.QMessageBox.information(self, "完成", f"已添加账户：{name}")
-                # reload UI & keep current user unchanged
-                self.reload_user_cards()
-                self.highlight_selected_user()
-                self.refresh_all()
-                if parent_dialog:
-                    parent_dialog.accept()
-            else:
-                if res.get("reason") == "user_exists":
-                    QtWidgets.QMessageBox.warning(self, "失败", "该用户名已存在。")
+
+            def done(res):
+                if res.get("success"):
+                    QtWidgets.QMessageBox.information(self, "完成", f"已添加账户：{name}")
+                    # reload UI & keep current user unchanged
+                    self.reload_users_and_refresh()
+                    if parent_dialog:
+                        parent_dialog.accept()
                 else:
-                    QtWidgets.QMessageBox.warning(self, "失败", "添加失败。")
+                    if res.get("reason") == "user_exists":
+                        QtWidgets.QMessageBox.warning(self, "失败", "该用户名已存在。")
+                    else:
+                        QtWidgets.QMessageBox.warning(self, "失败", "添加失败。")
+
+            self.db_worker.submit(add_user, name, on_done=done)
 
     def handle_delete_account(self, parent_dialog=None):
-        users = get_users()
+        self.db_worker.submit(get_users, on_done=lambda users: self._choose_account_to_delete(users, parent_dialog))
+
+    def _choose_account_to_delete(self, users, parent_dialog=None):
         if not users:
             QtWidgets.QMessageBox.warning(self, "提示", "当前没有用户可删除。")
             return
@@ -792,21 +1267,24 @@ class MainWindow(QtWidgets.QMainWindow):
                                                    f"确定删除账户 id={selected_id}？该用户的任务也会被删除。",
                                                    QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No)
             if reply == QtWidgets.QMessageBox.StandardButton.Yes:
-                ok_del = delete_user(selected_id)
-                if ok_del:
-                    QtWidgets.QMessageBox.information(self, "完成", "删除成功。")
-                    # if deleted current user, pick fallback
-                    if self.current_user_id == selected_id:
-                        users_after = get_users()
-                        self.current_user_id = users_after[0][0] if users_after else None
-                        self.top_hud.set_user(self.current_user_id)
-                    self.reload_user_cards()
-                    self.highlight_selected_user()
-                    self.refresh_all()
-                    if parent_dialog:
-                        parent_dialog.accept()
-                else:
-                    QtWidgets.QMessageBox.warning(self, "失败", "删除失败或用户不存在.")
+                def done(ok_del):
+                    if ok_del:
+                        QtWidgets.QMessageBox.information(self, "完成", "删除成功。")
+                        # 删除的是当前用户时，reload_user_cards 会选择备用用户
+                        self.reload_users_and_refresh()
+                        if parent_dialog:
+                            parent_dialog.accept()
+                    else:
+                        QtWidgets.QMessageBox.warning(self, "失败", "删除失败或用户不存在.")
+
+                self.db_worker.submit(delete_user, selected_id, on_done=done)
+
+    def open_history_dialog(self):
+        if self.current_user_id is None:
+            QtWidgets.QMessageBox.warning(self, "提示", "请先选择用户。")
+            return
+        from dialogs import HistoryDialog
+        HistoryDialog(self.current_user_id, self).exec()
 
     def open_exchange_dialog(self):
         """打开货币兑换对话框"""
@@ -814,7 +1292,14 @@ class MainWindow(QtWidgets.QMainWindow):
             QtWidgets.QMessageBox.warning(self, "提示", "请先选择用户")
             return
 
-        from db import exchange_platinum_to_gold, PLATINUM_TO_GOLD_RATE
+        # 先在后台读取当前余额
+        self.db_worker.submit(get_user, self.current_user_id, on_done=self._show_exchange_dialog)
+
+    def _show_exchange_dialog(self, u):
+        from db import PLATINUM_TO_GOLD_RATE
+
+        if u is None:
+            return
 
         dlg = QtWidgets.QDialog(self)
         dlg.setWindowTitle("货币兑换")
@@ -823,9 +1308,6 @@ class MainWindow(QtWidgets.QMainWindow):
         layout.setContentsMargins(12, 12, 12, 12)
 
         # 显示当前余额
-        u = get_user(self.current_user_id)
-        if u is None:
-            return
         uid, name, xp, level, coins, platinum_coins = u
 
         info_label = QtWidgets.QLabel(f"当前余额：\n铂金币: {platinum_coins}\n金币: {coins}\n\n兑换比例: 1 铂金币 = {PLATINUM_TO_GOLD_RATE} 金币\n\n注意：只能将铂金币兑换为金币（单向兑换）")
@@ -873,23 +1355,25 @@ class MainWindow(QtWidgets.QMainWindow):
         )
 
         if reply == QtWidgets.QMessageBox.StandardButton.Yes:
-            res = exchange_platinum_to_gold(self.current_user_id, amount)
-            if res["success"]:
-                QtWidgets.QMessageBox.information(
-                    self,
-                    "兑换成功",
-                    f"成功兑换 {res['platinum_spent']} 铂金币为 {res['gold_gained']} 金币\n"
-                    f"剩余铂金币: {res['remaining_platinum']}\n"
-                    f"当前金币: {res['new_gold']}"
-                )
-                self.refresh_all()
-                dialog.accept()
-            else:
-                reason = res.get("reason", "unknown")
-                if reason == "not_enough_platinum":
-                    QtWidgets.QMessageBox.warning(self, "失败", "铂金币不足")
+            def done(res):
+                if res["success"]:
+                    QtWidgets.QMessageBox.information(
+                        self,
+                        "兑换成功",
+                        f"成功兑换 {res['platinum_spent']} 铂金币为 {res['gold_gained']} 金币\n"
+                        f"剩余铂金币: {res['remaining_platinum']}\n"
+                        f"当前金币: {res['new_gold']}"
+                    )
+                    self.refresh_all()
+                    dialog.accept()
                 else:
-                    QtWidgets.QMessageBox.warning(self, "失败", f"兑换失败: {reason}")
+                    reason = res.get("reason", "unknown")
+                    if reason == "not_enough_platinum":
+                        QtWidgets.QMessageBox.warning(self, "失败", "铂金币不足")
+                    else:
+                        QtWidgets.QMessageBox.warning(self, "失败", f"兑换失败: {reason}")
+
+            self.db_worker.submit(exchange_platinum_to_gold, self.current_user_id, amount, on_done=done)
 
     def _format_batch_completion_message(self, res, task_name, max_completions, is_fully_completed):
         """
@@ -949,6 +1433,9 @@ class MainWindow(QtWidgets.QMainWindow):
                     msg += f"\nLv{from_lv}→Lv{to_lv}: {base} × {multiplier} = {actual} coins"
                     if platinum_reward > 0:
                         msg += f" + {platinum_reward} 铂金币"
+                omitted = res.get("level_up_details_omitted", 0)
+                if omitted > 0:
+                    msg += f"\n……另有 {omitted} 次升级"
 
         return msg
 